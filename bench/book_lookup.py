@@ -0,0 +1,118 @@
+"""
+OpeningBook lookup latency.
+
+Writes a temporary Polyglot book holding the positions of random games
+plus filler entries with random keys, then times lookups of book
+positions (hits) and of positions from other games (misses). Pass
+--book to time a real book instead.
+
+    python -m bench.book_lookup --entries 1000000 --lookups 20000
+    python -m bench.book_lookup --book /path/to/performance.bin
+"""
+
+import argparse
+import os
+import random
+import struct
+import tempfile
+import time
+
+import chess
+
+from server.book import OpeningBook
+from server.cache import position_key
+
+ENTRY = struct.Struct(">QHHI")
+
+
+def random_positions(rng, games, plies):
+    boards = []
+    for _ in range(games):
+        board = chess.Board()
+        for _ in range(plies):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+            boards.append(board.copy(stack=False))
+    return boards
+
+
+def write_book(path, boards, entries, rng):
+    rows = []
+    for board in boards:
+        move = next(iter(board.legal_moves), None)
+        if move is not None:
+            rows.append((position_key(board), move.to_square | move.from_square << 6, 1, 0))
+    while len(rows) < entries:
+        rows.append((rng.getrandbits(64), 0, 1, 0))
+    rows.sort()
+    with open(path, "wb") as f:
+        for row in rows:
+            f.write(ENTRY.pack(*row))
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    idx = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+    return samples[idx]
+
+
+def timed(fn, boards):
+    samples = []
+    for board in boards:
+        t0 = time.perf_counter()
+        fn(board)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def report(name, samples):
+    print(
+        f"{name:18s} p50={percentile(samples, 50) * 1e6:7.1f}us "
+        f"p99={percentile(samples, 99) * 1e6:7.1f}us"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--book", help="existing Polyglot .bin (default: synthetic)")
+    ap.add_argument("--entries", type=int, default=1_000_000)
+    ap.add_argument("--lookups", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    games = max(1, args.lookups // 12)
+    covered = random_positions(rng, games, 12)
+    keys = {position_key(b) for b in covered}
+    uncovered = [b for b in random_positions(rng, games, 12) if position_key(b) not in keys]
+
+    tmp = None
+    path = args.book
+    if path is None:
+        fd, tmp = tempfile.mkstemp(suffix=".bin")
+        os.close(fd)
+        path = tmp
+        t0 = time.perf_counter()
+        write_book(path, covered, args.entries, rng)
+        print(f"wrote {args.entries} entries in {time.perf_counter() - t0:.1f}s")
+
+    try:
+        t0 = time.perf_counter()
+        book = OpeningBook(path)
+        print(f"open (mmap)        {(time.perf_counter() - t0) * 1e6:7.1f}us")
+
+        report("position_key", timed(position_key, uncovered[: args.lookups]))
+        if args.book is None:
+            report("lookup hit", timed(book.lookup, covered[: args.lookups]))
+        report("lookup miss", timed(book.lookup, uncovered[: args.lookups]))
+        print(book.stats())
+        book.close()
+    finally:
+        if tmp is not None:
+            os.unlink(tmp)
+
+
+if __name__ == "__main__":
+    main()
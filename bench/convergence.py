@@ -0,0 +1,80 @@
+"""
+Engine CPU per position: linear budget growth vs the convergence controller.
+
+Polls each position for --seconds (a client leaving the board on one
+position) with converge_iterations=0 (keep deepening, the old behaviour)
+and with --iterations, and reports the search seconds and engine process
+CPU seconds per position, plus the final depth and best move so the
+answers can be compared.
+
+    python -m bench.convergence --engine /opt/homebrew/bin/stockfish
+    python -m bench.convergence --engine "python tests/fake_uci.py" --seconds 3
+"""
+
+import argparse
+import resource
+import shlex
+import time
+
+import chess
+
+from server.analysis import StockfishAnalysisEngine
+
+POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10",
+    "8/5pk1/6p1/8/3R4/6P1/5PK1/2r5 w - - 0 40",
+]
+
+
+def child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(engine_cmd, iterations, target_depth, seconds):
+    engine = StockfishAnalysisEngine(
+        engine_cmd, interval=0.25, converge_iterations=iterations, target_depth=target_depth
+    )
+    cpu0 = child_cpu()
+    rows = []
+    for fen in POSITIONS:
+        board = chess.Board(fen)
+        spent = engine.search_seconds
+        t0 = time.monotonic()
+        converged_at = None
+        while time.monotonic() - t0 < seconds:
+            result = engine.analyse(board)
+            if converged_at is None and result.converged:
+                converged_at = time.monotonic() - t0
+            time.sleep(0.05)
+        result = engine.analyse(board)
+        best = result.lines[0].move if result.lines else "-"
+        rows.append((engine.search_seconds - spent, result.depth, best, converged_at))
+
+    engine.stop()  # the engine's CPU is counted once the process exits
+    return rows, child_cpu() - cpu0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--engine", default="/opt/homebrew/bin/stockfish")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--iterations", type=int, default=4)
+    ap.add_argument("--target-depth", type=int, default=0)
+    args = ap.parse_args()
+
+    cmd = shlex.split(args.engine)
+    modes = [("linear", 0, 0), ("adaptive", args.iterations, args.target_depth)]
+    for name, iterations, target_depth in modes:
+        rows, cpu = run(cmd, iterations, target_depth, args.seconds)
+        print(f"{name} (converge_iterations={iterations}, target_depth={target_depth})")
+        for search, depth, best, converged_at in rows:
+            settled = "   -  " if converged_at is None else f"{converged_at:5.2f}s"
+            print(f"  search {search:5.2f}s  depth {depth:3d}  best {best:6s} converged {settled}")
+        print(f"  engine cpu {cpu:.2f}s total, {cpu / len(POSITIONS):.2f}s per position")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Engine speed across Threads/Hash settings.
+
+Searches each position for --seconds with every combination of --threads
+and --hash and reports nodes per second and the depth reached, plus what
+auto-sizing would pick on this machine, to see where extra threads stop
+paying off.
+
+    python -m bench.engine_nps --engine /opt/homebrew/bin/stockfish --threads 1 2 4 8
+    python -m bench.engine_nps --engine "python tests/fake_uci.py" --seconds 0.5
+"""
+
+import argparse
+import shlex
+
+import chess
+import chess.engine
+
+from server.analysis import uci_options
+from server.config import EngineConfig, auto_size, machine_cores, machine_memory
+
+POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10",
+    "8/5pk1/6p1/8/3R4/6P1/5PK1/2r5 w - - 0 40",
+]
+
+
+def run(engine, threads, hash_mb, multipv, seconds):
+    engine.configure(uci_options(engine, threads, hash_mb))
+    nodes = 0
+    elapsed = 0.0
+    depths = []
+    for fen in POSITIONS:
+        # a new game per search, so no run starts from another's hash
+        info = engine.analyse(
+            chess.Board(fen), chess.engine.Limit(time=seconds), multipv=multipv, game=object()
+        )[0]
+        nodes += info.get("nodes", 0)
+        elapsed += info.get("time", seconds)
+        depths.append(info.get("depth", 0))
+    return nodes / elapsed if elapsed else 0.0, sum(depths) / len(depths)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--engine", default="/opt/homebrew/bin/stockfish")
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--hash", type=int, nargs="+", default=[16, 256])
+    ap.add_argument("--multipv", type=int, default=3)
+    ap.add_argument("--seconds", type=float, default=2.0)
+    args = ap.parse_args()
+
+    auto = auto_size(EngineConfig(engine_path=args.engine))
+    print(
+        f"{machine_cores()} cores, {machine_memory() >> 20} MB: auto-size picks "
+        f"{auto.pool_size} x {auto.threads} threads, {auto.hash_mb} MB hash"
+    )
+
+    engine = chess.engine.SimpleEngine.popen_uci(shlex.split(args.engine))
+    try:
+        base = None
+        for threads in args.threads:
+            for hash_mb in args.hash:
+                nps, depth = run(engine, threads, hash_mb, args.multipv, args.seconds)
+                base = base or nps
+                print(
+                    f"threads {threads:3d}  hash {hash_mb:5d} MB  "
+                    f"{nps / 1000:10.0f} knps  x{nps / base:5.2f}  depth {depth:5.1f}"
+                )
+    finally:
+        engine.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Round-trip time per /state poll: new connection per request (what
+urequests does) vs the Pico's persistent KeepAliveConnection, plus
+pipelined menu requests.
+
+Against loopback the saving is the local connect/accept cost; point
+--host/--port at a real server over Wi-Fi to measure the handshake RTT.
+
+    python -m bench.keepalive_rtt --polls 500
+"""
+
+import argparse
+import sys
+import threading
+import time
+from http.client import HTTPConnection
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "pico"))
+
+from protocol import KeepAliveConnection  # noqa: E402
+
+from server.analysis import StubAnalysisEngine  # noqa: E402
+from server.chess_state import SandboxState  # noqa: E402
+from server.http_server import make_http_server  # noqa: E402
+
+
+def per_request_connection(host, port, polls):
+    t0 = time.perf_counter()
+    for _ in range(polls):
+        conn = HTTPConnection(host, port, timeout=5)
+        conn.request("GET", "/state", headers={"Connection": "close"})
+        conn.getresponse().read()
+        conn.close()
+    return (time.perf_counter() - t0) / polls
+
+
+def persistent_connection(host, port, polls):
+    conn = KeepAliveConnection(host, port, timeout=5)
+    t0 = time.perf_counter()
+    for _ in range(polls):
+        conn.request("GET", "/state")
+    elapsed = time.perf_counter() - t0
+    conn.close()
+    return elapsed / polls
+
+
+def pipelined(host, port, polls):
+    conn = KeepAliveConnection(host, port, timeout=5)
+    batch = [("GET", "/state", None), ("GET", "/piece_list", None)]
+    t0 = time.perf_counter()
+    for _ in range(polls):
+        conn.pipeline(batch)
+    elapsed = time.perf_counter() - t0
+    conn.close()
+    return elapsed / polls
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--polls", type=int, default=500)
+    args = ap.parse_args()
+
+    httpd = None
+    host, port = args.host, args.port
+    if host is None:
+        httpd = make_http_server("127.0.0.1", 0, SandboxState(), StubAnalysisEngine())
+        host, port = httpd.server_address
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    fresh = per_request_connection(host, port, args.polls)
+    kept = persistent_connection(host, port, args.polls)
+    piped = pipelined(host, port, args.polls)
+
+    print(f"new connection / poll  {fresh * 1000:.3f} ms")
+    print(f"keep-alive / poll      {kept * 1000:.3f} ms")
+    print(f"saved / poll           {(fresh - kept) * 1000:.3f} ms")
+    print(f"pipelined state+pieces {piped * 1000:.3f} ms")
+
+    if httpd is not None:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Per-request cost of identifying a position: FEN strings vs Zobrist keys.
+
+The analysis hot path used to call board.fen() to compare positions and
+chess.Board(fen) to hand the position to the worker. It now computes one
+position_key() per request, hands the worker a board copy, and caches the
+key on SandboxState between board changes.
+
+    python -m bench.position_keys --iterations 20000
+"""
+
+import argparse
+import time
+
+import chess
+
+from server.cache import PositionCache, position_key
+from server.chess_state import SandboxState
+from server.sessions import SessionManager
+
+FEN = "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10"
+
+
+def per_call(fn, iterations):
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - t0) / iterations
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=20000)
+    ap.add_argument("--sessions", type=int, default=64)
+    args = ap.parse_args()
+
+    board = chess.Board(FEN)
+    target = board.fen()
+    cache = PositionCache()
+    cache.put(position_key(board), object())
+    fen_cache = {target: object()}
+
+    def fen_path():
+        # compare, look up, and reparse for the worker
+        fen = board.fen()
+        _ = fen == target
+        _ = fen_cache.get(fen)
+        chess.Board(fen)
+
+    def key_path():
+        key = position_key(board)
+        _ = key == 0
+        cache.peek(key)
+        board.copy(stack=False)
+
+    state = SandboxState()
+    state.board = chess.Board(FEN)
+
+    rows = [
+        ("fen compare+lookup+reparse", per_call(fen_path, args.iterations)),
+        ("key compare+lookup+copy", per_call(key_path, args.iterations)),
+        ("board.fen()", per_call(board.fen, args.iterations)),
+        ("position_key(board)", per_call(lambda: position_key(board), args.iterations)),
+        ("SandboxState.position_key()", per_call(state.position_key, args.iterations)),
+    ]
+
+    sessions = SessionManager()
+    for n in range(args.sessions):
+        sessions.get(f"s{n}").play("e2e4")
+    key = position_key(chess.Board())
+    rows.append((
+        f"publish fan-out ({args.sessions} sessions)",
+        per_call(lambda: sessions.position_changed(key), max(1, args.iterations // 100)),
+    ))
+
+    for name, seconds in rows:
+        print(f"{name:34s} {seconds * 1e6:8.2f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+/state requests per second on an unchanged position, with and without
+the pre-serialized response cache.
+
+Several clients poll /state over keep-alive connections as fast as they
+can while nothing changes. The engine stands in for a live one that
+always has a result ready (no analysis cost), so the numbers isolate
+building and encoding the response.
+
+    python -m bench.response_cache --clients 4 --seconds 3
+"""
+
+import argparse
+import threading
+import time
+from http.client import HTTPConnection
+
+from server.analysis import AnalysisLine, AnalysisResult
+from server.chess_state import SandboxState
+from server.http_server import make_http_server
+from server import wire
+
+
+class ReadyEngine:
+    live = True
+
+    def __init__(self):
+        self.result = AnalysisResult(
+            depth=22,
+            lines=[
+                AnalysisLine(move="e2e4", eval=0.31),
+                AnalysisLine(move="d2d4", eval=0.27),
+                AnalysisLine(move="g1f3", eval=0.22),
+            ],
+        )
+
+    def analyse(self, board):
+        return self.result
+
+
+def run(cache_responses, clients, seconds, path, headers):
+    state = SandboxState()
+    for uci in ("e2e4", "e7e5", "g1f3", "b8c6", "f1b5"):
+        state.play(uci)
+    httpd = make_http_server(
+        "127.0.0.1", 0, state, ReadyEngine(), cache_responses=cache_responses
+    )
+    host, port = httpd.server_address
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    counts = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        conn = HTTPConnection(host, port, timeout=10)
+        n = 0
+        while time.perf_counter() < deadline:
+            conn.request("GET", path, headers=headers)
+            conn.getresponse().read()
+            n += 1
+        conn.close()
+        with lock:
+            counts.append(n)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    httpd.shutdown()
+    httpd.server_close()
+    return sum(counts) / seconds
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    args = ap.parse_args()
+
+    for path, headers, name in (
+        ("/state", {}, "state json"),
+        ("/state", {"Accept": wire.CONTENT_TYPE}, "state bin"),
+        ("/snapshot", {}, "snapshot json"),
+    ):
+        off = run(False, args.clients, args.seconds, path, headers)
+        on = run(True, args.clients, args.seconds, path, headers)
+        print(f"{name:14s} uncached {off:8.0f} req/s   cached {on:8.0f} req/s   x{on / off:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Restart-per-cycle deepening vs continuous streaming search.
+
+For each mode, analyses a few positions for --seconds each and reports
+time to the first result, time to reach --depth, the depth reached, and
+the engine process's CPU seconds (measured when the engine exits).
+
+    python -m bench.search_modes --engine /opt/homebrew/bin/stockfish
+    python -m bench.search_modes --engine "python tests/fake_uci.py"
+"""
+
+import argparse
+import resource
+import shlex
+import threading
+import time
+
+import chess
+
+from server.analysis import StockfishAnalysisEngine
+
+POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10",
+]
+
+
+def child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(engine_cmd, continuous, seconds, target_depth):
+    engine = StockfishAnalysisEngine(
+        engine_cmd, nonblocking=True, continuous=continuous, publish_interval=0.1
+    )
+    published = threading.Event()
+    engine.add_listener(published.set)
+    cpu0 = child_cpu()
+    rows = []
+
+    for fen in POSITIONS:
+        board = chess.Board(fen)
+        first = deep = None
+
+        t0 = time.monotonic()
+        engine.analyse(board)
+        while time.monotonic() - t0 < seconds:
+            published.wait(0.05)
+            published.clear()
+            result = engine.analyse(board)
+            if result.pending:
+                continue
+            now = time.monotonic() - t0
+            if first is None:
+                first = now
+            if deep is None and result.depth >= target_depth:
+                deep = now
+        rows.append((first, deep, engine.analyse(board).depth))
+
+    engine.stop()
+    return rows, child_cpu() - cpu0
+
+
+def fmt(t):
+    return "   -  " if t is None else f"{t:5.2f}s"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--engine", default="/opt/homebrew/bin/stockfish")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--depth", type=int, default=20)
+    args = ap.parse_args()
+
+    cmd = shlex.split(args.engine)
+    for continuous in (False, True):
+        rows, cpu = run(cmd, continuous, args.seconds, args.depth)
+        print("continuous" if continuous else "cycle")
+        for first, deep, depth in rows:
+            print(f"  first {fmt(first)}  depth>={args.depth} {fmt(deep)}  final depth {depth}")
+        total_depth = sum(depth for _, _, depth in rows)
+        print(f"  engine cpu {cpu:.2f}s  depth/cpu-s {total_depth / max(cpu, 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Request latency with many devices playing separate games at once.
+
+Each simulated device has its own session and loops: play a move, fetch
+/state, fetch /piece_list. Reports p50/p95/p99 latency per request type
+and the engine pool's queue depth and utilisation at the end. With
+--max-p95 it exits non-zero if any request type's p95 is above that many
+seconds (e.g. 32 sessions against the fake engine should stay under
+0.25 s).
+
+    python -m bench.sessions_load --sessions 48 --engine "python tests/fake_uci.py"
+    python -m bench.sessions_load --sessions 48 --engine /opt/homebrew/bin/stockfish
+    python -m bench.sessions_load --sessions 32 --pool-size 2 --max-p95 0.25 \
+        --engine "python tests/fake_uci.py --depth-time 0.01"
+"""
+
+import argparse
+import json
+import random
+import shlex
+import sys
+import threading
+import time
+from http.client import HTTPConnection
+
+import chess
+
+from server.http_server import make_http_server
+from server.pool import EnginePool
+from server.sessions import SessionManager
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    if not samples:
+        return 0.0
+    idx = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+    return samples[idx]
+
+
+def device(host, port, session, deadline, samples, lock):
+    rng = random.Random(session)
+    conn = HTTPConnection(host, port, timeout=30)
+    headers = {"X-Session-Id": session, "Content-Type": "application/json"}
+    board = chess.Board()
+    local = {"play_move": [], "state": [], "piece_list": []}
+
+    def timed(name, method, path, body=None):
+        t0 = time.perf_counter()
+        conn.request(method, path, body=body, headers=headers)
+        conn.getresponse().read()
+        local[name].append(time.perf_counter() - t0)
+
+    while time.perf_counter() < deadline:
+        if board.is_game_over():
+            timed("play_move", "POST", "/reset", b"")
+            board.reset()
+            continue
+        move = rng.choice(list(board.legal_moves))
+        timed("play_move", "POST", "/play_move", json.dumps({"move": move.uci()}))
+        board.push(move)
+        timed("state", "GET", "/state")
+        timed("piece_list", "GET", "/piece_list")
+
+    with lock:
+        for name, values in local.items():
+            samples[name].extend(values)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--engine", default="/opt/homebrew/bin/stockfish")
+    ap.add_argument("--sessions", type=int, default=48)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--pool-size", type=int, default=None)
+    ap.add_argument("--max-p95", type=float, default=None)
+    args = ap.parse_args()
+
+    engine = EnginePool(shlex.split(args.engine), size=args.pool_size)
+    sessions = SessionManager()
+    httpd = make_http_server("127.0.0.1", 0, sessions.default, engine, sessions=sessions)
+    host, port = httpd.server_address
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    samples = {"play_move": [], "state": [], "piece_list": []}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(
+            target=device, args=(host, port, f"device-{n}", deadline, samples, lock)
+        )
+        for n in range(args.sessions)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    pool = engine.stats()["pool"]
+    httpd.shutdown()
+    httpd.server_close()
+    engine.stop()
+
+    print(f"sessions={args.sessions} pool={pool['size']}")
+    for name, values in samples.items():
+        print(
+            f"  {name:10s} n={len(values):6d} "
+            f"p50={percentile(values, 50) * 1000:6.1f}ms "
+            f"p95={percentile(values, 95) * 1000:6.1f}ms "
+            f"p99={percentile(values, 99) * 1000:6.1f}ms"
+        )
+    print(
+        f"  queue_depth={pool['queue_depth']} tasks={pool['tasks']} "
+        f"utilisation={pool['utilisation']:.2f}"
+    )
+
+    if args.max_p95 is not None:
+        slow = [n for n, v in samples.items() if percentile(v, 95) > args.max_p95]
+        if slow:
+            print(f"p95 above {args.max_p95 * 1000:.0f}ms: {', '.join(slow)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+p50/p99 /state latency with several clients polling at once.
+
+Simulates the worst case from the live engine: every so often a /state
+falls into a slow synchronous analysis. With a single-threaded server all
+other polls queue behind it; with the threaded server they don't.
+
+    python -m bench.state_latency --clients 8 --seconds 5
+"""
+
+import argparse
+import threading
+import time
+from http.client import HTTPConnection
+
+from server.analysis import AnalysisLine, AnalysisResult
+from server.chess_state import SandboxState
+from server.http_server import make_http_server
+
+
+class SlowEveryNthEngine:
+    live = True
+
+    def __init__(self, every: int, delay: float):
+        self.every = every
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def analyse(self, board) -> AnalysisResult:
+        with self._lock:
+            self.calls += 1
+            slow = self.calls % self.every == 0
+        if slow:
+            time.sleep(self.delay)
+        return AnalysisResult(depth=1, lines=[AnalysisLine(move="e2e4", eval=0.2)])
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    if not samples:
+        return 0.0
+    idx = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+    return samples[idx]
+
+
+def run(threaded: bool, clients: int, seconds: float, every: int, delay: float):
+    engine = SlowEveryNthEngine(every, delay)
+    httpd = make_http_server("127.0.0.1", 0, SandboxState(), engine, threaded=threaded)
+    host, port = httpd.server_address
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    samples = []
+    samples_lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        local = []
+        while time.perf_counter() < deadline:
+            conn = HTTPConnection(host, port, timeout=30)
+            t0 = time.perf_counter()
+            conn.request("GET", "/state")
+            conn.getresponse().read()
+            local.append(time.perf_counter() - t0)
+            conn.close()
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    httpd.shutdown()
+    httpd.server_close()
+    return samples
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--every", type=int, default=20, help="every Nth analyse is slow")
+    ap.add_argument("--delay", type=float, default=0.10, help="slow analyse duration (s)")
+    args = ap.parse_args()
+
+    for threaded in (False, True):
+        samples = run(threaded, args.clients, args.seconds, args.every, args.delay)
+        name = "threaded" if threaded else "single"
+        print(
+            f"{name:8s} clients={args.clients} requests={len(samples)} "
+            f"p50={percentile(samples, 50) * 1000:.1f}ms "
+            f"p99={percentile(samples, 99) * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
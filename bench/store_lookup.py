@@ -0,0 +1,92 @@
+"""
+AnalysisStore lookup latency with a large number of stored positions.
+
+Fills a temporary SQLite store with random Zobrist keys, then times
+random hits and misses through the store and through a cold PositionCache
+in front of it (the path /state takes on a memory miss).
+
+    python -m bench.store_lookup --positions 2000000 --lookups 20000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from server.analysis import AnalysisLine, AnalysisResult
+from server.cache import PositionCache
+from server.store import AnalysisStore
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    idx = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+    return samples[idx]
+
+
+def timed(fn, keys):
+    samples = []
+    for key in keys:
+        t0 = time.perf_counter()
+        fn(key)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def report(name, samples):
+    print(
+        f"{name:18s} p50={percentile(samples, 50) * 1e6:7.1f}us "
+        f"p99={percentile(samples, 99) * 1e6:7.1f}us"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--positions", type=int, default=1_000_000)
+    ap.add_argument("--lookups", type=int, default=20_000)
+    ap.add_argument("--batch", type=int, default=50_000)
+    args = ap.parse_args()
+
+    rng = random.Random(1)
+    result = AnalysisResult(
+        depth=20,
+        lines=[
+            AnalysisLine(move="e2e4", eval=0.31),
+            AnalysisLine(move="d2d4", eval=0.27),
+            AnalysisLine(move="g1f3", eval=0.22),
+        ],
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        store = AnalysisStore(path, max_entries=args.positions * 2, evict_every=args.positions * 4)
+
+        keys = []
+        t0 = time.perf_counter()
+        for start in range(0, args.positions, args.batch):
+            batch = [rng.getrandbits(64) for _ in range(min(args.batch, args.positions - start))]
+            keys.extend(batch)
+            store.put_many((k, result, 1.5) for k in batch)
+        fill = time.perf_counter() - t0
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"filled {len(keys)} positions in {fill:.1f}s ({size_mb:.0f} MB)")
+
+        hits = rng.sample(keys, min(args.lookups, len(keys)))
+        misses = [rng.getrandbits(64) for _ in range(args.lookups)]
+
+        report("store hit", timed(store.get, hits))
+        report("store miss", timed(store.get, misses))
+
+        cache = PositionCache(max_entries=args.lookups * 2, store=store)
+        report("cache cold (store)", timed(cache.get, hits))
+        report("cache warm", timed(cache.get, hits))
+
+        t0 = time.perf_counter()
+        store.compact()
+        print(f"compact {time.perf_counter() - t0:.1f}s")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
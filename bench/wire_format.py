@@ -0,0 +1,150 @@
+"""
+JSON vs the binary wire format (server/wire.py), on both ends.
+
+Server side: encode time and payload size for /state and /snapshot.
+Client side: decode time and bytes allocated per response for json.loads
+against BinaryState.decode() from pico/protocol.py (tracemalloc on
+CPython, as a stand-in for the MicroPython heap). Then /state round-trip
+latency over one keep-alive connection for each format.
+
+    python -m bench.wire_format --iterations 5000
+"""
+
+import argparse
+import importlib.util
+import json
+import threading
+import time
+import tracemalloc
+from http.client import HTTPConnection
+from pathlib import Path
+
+import chess
+
+from server import wire
+from server.analysis import AnalysisLine, AnalysisResult, StubAnalysisEngine
+from server.chess_state import SandboxState
+from server.http_server import make_http_server
+from server.move_index import MoveIndex
+
+_spec = importlib.util.spec_from_file_location(
+    "pico_protocol", Path(__file__).resolve().parents[1] / "pico" / "protocol.py"
+)
+protocol = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(protocol)
+
+FEN = "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10"
+
+
+def per_call(fn, iterations):
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - t0) / iterations
+
+
+def allocated(fn, iterations=200):
+    """
+    Bytes allocated per call (peak over the call, averaged).
+    """
+    fn()
+    tracemalloc.start()
+    total = 0
+    for _ in range(iterations):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return total / iterations
+
+
+def json_state(version, board, analysis, index=None):
+    out = {
+        "type": "state",
+        "version": version,
+        "turn": "white" if board.turn else "black",
+        "move_number": board.fullmove_number,
+        "last_move": board.peek().uci() if board.move_stack else None,
+        "game_over": board.is_game_over(),
+        "checkmate": board.is_checkmate(),
+        "stalemate": board.is_stalemate(),
+        "winner": None,
+        "analysis": {
+            "depth": analysis.depth,
+            "lines": [{"move": l.move, "eval": l.eval} for l in analysis.lines],
+            "pending": analysis.pending,
+            "stale": analysis.stale,
+        },
+    }
+    if index is not None:
+        out["type"] = "snapshot"
+        out["moves"] = {sq: "".join(to) for sq, to in index.targets.items()}
+        out["promotions"] = {sq: "".join(to) for sq, to in index.promotions.items()}
+    return json.dumps(out).encode()
+
+
+def codec_rows(iterations):
+    board = chess.Board(FEN)
+    board.push_uci("c3b5")
+    analysis = AnalysisResult(
+        depth=24,
+        lines=[AnalysisLine("a7a6", 0.31), AnalysisLine("f6e4", 0.22), AnalysisLine("e7b4", 0.18)],
+    )
+    index = MoveIndex.build(board)
+
+    for name, with_tree in (("state", False), ("snapshot", True)):
+        as_json = json_state(7, board, analysis, index if with_tree else None)
+        if with_tree:
+            encode_bin = lambda: wire.encode_snapshot(7, board, analysis, index)
+        else:
+            encode_bin = lambda: wire.encode_state(7, board, analysis)
+        as_bin = encode_bin()
+
+        out = protocol.BinaryState()
+        out.buf[: len(as_bin)] = as_bin
+
+        print(f"{name}")
+        print(f"  size        json {len(as_json):5d} B   bin {len(as_bin):5d} B")
+        print(
+            f"  encode      json {per_call(lambda: json_state(7, board, analysis, index if with_tree else None), iterations) * 1e6:7.1f}us"
+            f"   bin {per_call(encode_bin, iterations) * 1e6:7.1f}us"
+        )
+        print(
+            f"  decode      json {per_call(lambda: json.loads(as_json), iterations) * 1e6:7.1f}us"
+            f"   bin {per_call(lambda: out.decode(len(as_bin)), iterations) * 1e6:7.1f}us"
+        )
+        print(
+            f"  alloc/decode json {allocated(lambda: json.loads(as_json)):6.0f} B"
+            f"   bin {allocated(lambda: out.decode(len(as_bin))):6.0f} B"
+        )
+
+
+def latency_rows(iterations):
+    httpd = make_http_server("127.0.0.1", 0, SandboxState(), StubAnalysisEngine())
+    host, port = httpd.server_address
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    conn = HTTPConnection(host, port, timeout=5)
+    for name, headers in (("json", {}), ("bin", {"Accept": wire.CONTENT_TYPE})):
+        def once():
+            conn.request("GET", "/snapshot", headers=headers)
+            conn.getresponse().read()
+
+        print(f"  /snapshot round trip {name:4s} {per_call(once, iterations) * 1e6:7.1f}us")
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=5000)
+    args = ap.parse_args()
+
+    codec_rows(args.iterations)
+    latency_rows(max(1, args.iterations // 10))
+
+
+if __name__ == "__main__":
+    main()
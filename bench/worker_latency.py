@@ -0,0 +1,83 @@
+"""
+How quickly the analysis worker reacts to a new position.
+
+Plays --moves random moves against a non-blocking StockfishAnalysisEngine
+with a long --interval and reports the time from each move to the first
+published result for it, p50/p95/max. With --max-p95 it exits non-zero
+above that many seconds (the fake engine should stay well under 0.5 s;
+a sleep-polling worker would take up to a full interval).
+
+    python -m bench.worker_latency --engine "python tests/fake_uci.py"
+    python -m bench.worker_latency --engine /opt/homebrew/bin/stockfish --base-time 1.0
+"""
+
+import argparse
+import random
+import shlex
+import sys
+import threading
+import time
+
+import chess
+
+from server.analysis import StockfishAnalysisEngine
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    if not samples:
+        return 0.0
+    idx = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+    return samples[idx]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--engine", default="/opt/homebrew/bin/stockfish")
+    ap.add_argument("--moves", type=int, default=20)
+    ap.add_argument("--base-time", type=float, default=0.05)
+    ap.add_argument("--interval", type=float, default=2.0)
+    ap.add_argument("--max-p95", type=float, help="fail if p95 is above this (seconds)")
+    args = ap.parse_args()
+
+    engine = StockfishAnalysisEngine(
+        shlex.split(args.engine), base_time=args.base_time, step_time=args.base_time,
+        max_time=1.0, interval=args.interval, nonblocking=True,
+    )
+    published = threading.Event()
+    engine.add_listener(published.set)
+    rng = random.Random(1)
+    board = chess.Board()
+    samples = []
+    try:
+        engine.analyse(board)
+        published.wait(10.0)
+        for _ in range(args.moves):
+            if board.is_game_over():
+                board.reset()
+            board.push(rng.choice(list(board.legal_moves)))
+            # the move lands in the middle of the previous position's search
+            time.sleep(args.base_time / 2)
+            published.clear()
+            t0 = time.perf_counter()
+            engine.analyse(board)
+            if not published.wait(10.0):
+                print("no result within 10 s")
+                sys.exit(1)
+            samples.append(time.perf_counter() - t0)
+    finally:
+        engine.stop()
+
+    p95 = percentile(samples, 95)
+    print(
+        f"move -> first result over {len(samples)} moves: "
+        f"p50 {percentile(samples, 50) * 1000:.0f} ms  p95 {p95 * 1000:.0f} ms  "
+        f"max {max(samples) * 1000:.0f} ms"
+    )
+    if args.max_p95 is not None and p95 > args.max_p95:
+        print(f"p95 above {args.max_p95 * 1000:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
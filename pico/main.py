@@ -1,8 +1,10 @@
 import time
+import binascii
+import machine
 
 from wifi import connect
 from display import Display
-from protocol import ServerClient
+from protocol import STALE, BinaryState, ServerClient, move_uci
 from input import (
     Input,
     UP, DOWN, SELECT, BACK, UNDO,
@@ -11,6 +13,16 @@ from input import (
 )
 
 SERVER_IP = "192.168.1.114"  # CHANGE THIS
+# each board gets its own game on the server
+SESSION_ID = binascii.hexlify(machine.unique_id()).decode()
+# fetch /snapshot (state + legal-move tree) and walk the piece and move
+# menus locally, without a request per menu step
+LOCAL_MENUS = True
+# poll in the binary wire format: responses are decoded into one
+# preallocated BinaryState instead of json.loads() building new objects,
+# so the keypad loop doesn't stall on garbage collection. Commands still
+# go as JSON, and their /batch answers with the new state in binary.
+BINARY = True
 
 MODE_ROOT = 0
 MODE_PIECES = 1
@@ -30,7 +42,7 @@ def main():
     connect()
 
     display = Display()
-    client = ServerClient(SERVER_IP)
+    client = ServerClient(SERVER_IP, session=SESSION_ID, snapshot=LOCAL_MENUS)
     inp = Input(debounce_ms=40)
 
     mode = MODE_ROOT
@@ -38,12 +50,11 @@ def main():
 
     pieces = []
     moves = []
+    promotions = []  # to-squares in `moves` that promote
     selected_from = None
 
-    last_state_poll = time.ticks_ms()
-    poll_ms = 500
-
     analysis_lines = []  # latest /state analysis.lines for BEST1/2/3
+    bst = BinaryState() if BINARY else None
 
     fast_mode = False  # False=Slow(S), True=Fast(F)
     need_enter_pieces = False  # used to auto-enter pieces after commands
@@ -51,11 +62,10 @@ def main():
     def mode_char():
         return "F" if fast_mode else "S"
 
-    def refresh_state(update_state_oled: bool):
+    def show_state(st, update_state_oled: bool):
         nonlocal analysis_lines
 
-        st = client.get_state(fresh=False)
-        if not st or st.get("type") != "state":
+        if not st or st.get("type") not in ("state", "snapshot"):
             return
 
         if update_state_oled:
@@ -68,15 +78,74 @@ def main():
 
         analysis = st.get("analysis")
         if isinstance(analysis, dict):
-            analysis_lines = analysis.get("lines", []) or []
+            lines = analysis.get("lines", []) or []
+            # stale lines are the previous position's moves: show, don't play
+            analysis_lines = [] if analysis.get("stale") else lines
             display.show_analysis(
                 depth=analysis.get("depth", 0),
-                lines=analysis_lines,
+                lines=lines,
+            )
+
+    def show_bin_state(b, update_state_oled: bool):
+        nonlocal analysis_lines
+
+        if update_state_oled:
+            display.show_state(
+                turn="black" if b.black_to_move() else "white",
+                move_number=b.move_number,
+                last_move=move_uci(b.last_move),
+                mode_char=mode_char(),
             )
 
+        # only the few displayed lines become objects, once per change
+        lines = [
+            {"move": move_uci(b.line_moves[i]), "eval": b.line_evals[i] / 100.0}
+            for i in range(b.n_lines)
+        ]
+        analysis_lines = [] if b.flags & STALE else lines
+        display.show_analysis(depth=b.depth, lines=lines)
+
+    def refresh_state(update_state_oled: bool):
+        if BINARY:
+            # None: unchanged (304) or failed; redraw what we have
+            client.get_state_bin(bst)
+            if bst.version >= 0:
+                show_bin_state(bst, update_state_oled)
+            return
+        show_state(client.get_state(fresh=False), update_state_oled)
+
+    def run(command, update_state_oled: bool):
+        if BINARY:
+            st = client.run_bin(command, bst)
+            if st is None:
+                refresh_state(update_state_oled)
+            else:
+                show_bin_state(st, update_state_oled)
+            return
+        # command + new state in a single request
+        st = client.run(command)
+        if st is None:
+            refresh_state(update_state_oled)
+        else:
+            show_state(st, update_state_oled)
+
+    def local_pieces():
+        if not LOCAL_MENUS:
+            return None
+        return bst.from_squares() if BINARY else client.local_pieces()
+
+    def local_moves(from_sq):
+        if not LOCAL_MENUS:
+            return None
+        return bst.moves_from(from_sq) if BINARY else client.local_moves(from_sq)
+
     def enter_pieces():
         nonlocal mode, cursor, pieces, moves, selected_from
-        r = client.piece_list()
+        local = local_pieces()
+        if local is not None:
+            r = {"type": "piece_list", "pieces": local}
+        else:
+            r = client.piece_list()
         if r and r.get("type") == "piece_list":
             pieces = r.get("pieces", [])
             moves = []
@@ -89,12 +158,16 @@ def main():
     refresh_state(update_state_oled=True)
 
     while True:
-        now = time.ticks_ms()
-
-        # polling: keep analysis fresh always; state OLED only in ROOT+slow
-        if time.ticks_diff(now, last_state_poll) >= poll_ms:
-            refresh_state(update_state_oled=(mode == MODE_ROOT and not fast_mode))
-            last_state_poll = now
+        # long-poll: the server answers as soon as the board or analysis
+        # changes; keep analysis fresh always, state OLED only in ROOT+slow
+        update = mode == MODE_ROOT and not fast_mode
+        if BINARY:
+            if client.poll_watch_bin(bst):
+                show_bin_state(bst, update_state_oled=update)
+        else:
+            st = client.poll_watch()
+            if st:
+                show_state(st, update_state_oled=update)
 
         # fast-mode: after any command returning to ROOT, auto-enter pieces once
         if mode == MODE_ROOT and fast_mode and need_enter_pieces:
@@ -129,7 +202,6 @@ def main():
             continue
 
         if key == UNDO:
-            client.undo()
             mode = MODE_ROOT
             cursor = 0
             pieces = []
@@ -137,11 +209,10 @@ def main():
             selected_from = None
 
             need_enter_pieces = fast_mode
-            refresh_state(update_state_oled=not fast_mode)
+            run({"type": "undo"}, update_state_oled=not fast_mode)
             continue
 
         if key == RESET:
-            client.reset()
             mode = MODE_ROOT
             cursor = 0
             pieces = []
@@ -149,7 +220,7 @@ def main():
             selected_from = None
 
             need_enter_pieces = fast_mode
-            refresh_state(update_state_oled=not fast_mode)
+            run({"type": "reset"}, update_state_oled=not fast_mode)
             continue
 
         if key in (BEST1, BEST2, BEST3):
@@ -157,8 +228,6 @@ def main():
             if idx < len(analysis_lines):
                 mv = analysis_lines[idx].get("move")
                 if mv:
-                    client.play_move(mv)
-
                     mode = MODE_ROOT
                     cursor = 0
                     pieces = []
@@ -166,7 +235,7 @@ def main():
                     selected_from = None
 
                     need_enter_pieces = fast_mode
-                    refresh_state(update_state_oled=not fast_mode)
+                    run({"type": "play_move", "move": mv}, update_state_oled=not fast_mode)
             continue
 
         # ----- UI state machine -----
@@ -211,9 +280,14 @@ def main():
                 if not selected_from:
                     continue
 
-                r = client.move_list(selected_from)
+                local = local_moves(selected_from)
+                if local is not None:
+                    r = {"type": "move_list", "moves": local[0], "promotions": local[1]}
+                else:
+                    r = client.move_list(selected_from)
                 if r and r.get("type") == "move_list":
                     moves = r.get("moves", [])
+                    promotions = r.get("promotions", [])
                     cursor = 0
                     mode = MODE_MOVES
                     display.show_move_list(selected_from, moves, cursor, mode_char=mode_char())
@@ -241,7 +315,9 @@ def main():
                     continue
 
                 to_sq = moves[cursor]
-                client.play_move(selected_from + to_sq)
+                # always promote to a queen
+                suffix = "q" if to_sq in promotions else ""
+                move = selected_from + to_sq + suffix
 
                 mode = MODE_ROOT
                 cursor = 0
@@ -250,7 +326,7 @@ def main():
                 selected_from = None
 
                 need_enter_pieces = fast_mode
-                refresh_state(update_state_oled=not fast_mode)
+                run({"type": "play_move", "move": move}, update_state_oled=not fast_mode)
 
             continue
 
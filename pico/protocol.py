@@ -1,78 +1,691 @@
-import urequests
+import errno
+import json
+import select
+import socket
+import time
+from array import array
 
 
-class ServerClient:
-    def __init__(self, host, port=8000, timeout=2):
-        self.base_url = f"http://{host}:{port}"
+def split_squares(packed):
+    # "e3e4" -> ["e3", "e4"]
+    return [packed[i:i + 2] for i in range(0, len(packed), 2)]
+
+
+# the server dropped an idle keep-alive connection (MicroPython's errno
+# lacks some of these)
+STALE_ERRNOS = tuple(
+    getattr(errno, name)
+    for name in ("ECONNRESET", "ECONNABORTED", "EPIPE", "ENOTCONN")
+    if hasattr(errno, name)
+)
+
+
+class ConnectionClosed(OSError):
+    pass
+
+
+def session_headers(session):
+    return {"X-Session-Id": session} if session else None
+
+
+class KeepAliveConnection:
+    """
+    Persistent HTTP/1.1 connection over a raw socket.
+
+    - One TCP connection reused for every request (no handshake per poll).
+    - Reconnects transparently if the server dropped an idle connection
+      before answering; a request that may have reached the server (e.g.
+      a timeout while waiting) is never resent.
+    - pipeline() writes several requests back to back, then reads the
+      responses in order.
+    - send() / ready() / read_response() split a request so the caller
+      can keep scanning keys while the server holds it (long-poll).
+    - `headers` are sent with every request (e.g. X-Session-Id).
+    """
+
+    def __init__(self, host, port=8000, timeout=2, headers=None):
+        self.host = host
+        self.port = port
         self.timeout = timeout
+        self.headers = headers or {}
+        self.sock = None
+        self.f = None
+        self.poller = None
+
+    def connect(self):
+        self.close()
+        addr = socket.getaddrinfo(self.host, self.port)[0][-1]
+        s = socket.socket()
+        s.settimeout(self.timeout)
+        s.connect(addr)
+        self.sock = s
+        self.f = s.makefile("rb")
+        self.poller = select.poll()
+        self.poller.register(s, select.POLLIN)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+        self.sock = None
+        self.f = None
+        self.poller = None
+
+    def _encode(self, method, path, body=None, headers=None):
+        req = "%s %s HTTP/1.1\r\nHost: %s\r\n" % (method, path, self.host)
+        for k in self.headers:
+            req += "%s: %s\r\n" % (k, self.headers[k])
+        if headers:
+            for k in headers:
+                req += "%s: %s\r\n" % (k, headers[k])
+        if body is None:
+            body = b""
+        if body or method == "POST":
+            req += "Content-Type: application/json\r\n"
+            req += "Content-Length: %d\r\n" % len(body)
+        return req.encode() + b"\r\n" + body
+
+    def read_status(self):
+        line = self.f.readline()
+        if not line:
+            raise ConnectionClosed("connection closed")
+        return int(line.split()[1])
+
+    def read_head(self, status=None):
+        """
+        Read status line and headers; returns (status, headers, length, close).
+        """
+        if status is None:
+            status = self.read_status()
+
+        length = 0
+        close = False
+        headers = {}
+        while True:
+            line = self.f.readline()
+            if not line or line == b"\r\n":
+                break
+            k, _, v = line.decode().partition(":")
+            k = k.strip().lower()
+            v = v.strip()
+            if k == "content-length":
+                length = int(v)
+            elif k == "connection":
+                close = v.lower() == "close"
+            headers[k] = v
+        return status, headers, length, close
+
+    def read_response(self, into=None, status=None):
+        """
+        Returns (status, headers, body). With `into` (a bytearray) the body
+        is read into it instead and body is its length.
+        """
+        status, headers, length, close = self.read_head(status)
+        if into is None:
+            body = self.f.read(length) if length else b""
+        else:
+            if length > len(into):
+                self.close()
+                raise OSError("response larger than buffer")
+            mv = memoryview(into)
+            body = 0
+            while body < length:
+                n = self.f.readinto(mv[body:length])
+                if not n:
+                    raise OSError("connection closed")
+                body += n
+        if close:
+            self.close()
+        return status, headers, body
+
+    def request(self, method, path, body=None, headers=None, into=None):
+        """
+        Send one request and return (status, headers, body).
+        """
+        data = self._encode(method, path, body, headers)
+        reused = self.sock is not None
+        if not reused:
+            self.connect()
+        try:
+            try:
+                self.sock.sendall(data)
+                status = self.read_status()
+            except OSError as e:
+                if not reused or not self._stale(e):
+                    raise
+                # stale keep-alive connection: the server closed it without
+                # answering, so it never ran the request; retry once
+                self.connect()
+                self.sock.sendall(data)
+                status = self.read_status()
+            return self.read_response(into, status)
+        except OSError:
+            self.close()
+            raise
+
+    def _stale(self, e):
+        # EOF or reset before the status line, not a timeout: a timed-out
+        # request may still be running on the server
+        return isinstance(e, ConnectionClosed) or (bool(e.args) and e.args[0] in STALE_ERRNOS)
+
+    def send(self, method, path, body=None, headers=None):
+        """
+        Write a request without waiting for the response.
+        """
+        if self.sock is None:
+            self.connect()
+        try:
+            self.sock.sendall(self._encode(method, path, body, headers))
+        except OSError:
+            self.close()
+            raise
+
+    def ready(self):
+        """
+        True once a response (or EOF) is waiting to be read.
+        """
+        return self.poller is not None and bool(self.poller.poll(0))
+
+    def pipeline(self, requests):
+        """
+        Send (method, path, body) requests back to back on one connection
+        and return their responses in order.
+        """
+        if self.sock is None:
+            self.connect()
+        try:
+            self.sock.sendall(b"".join(self._encode(m, p, b) for m, p, b in requests))
+            return [self.read_response() for _ in requests]
+        except OSError:
+            self.close()
+            raise
+
+
+# ---------- binary wire format (server/wire.py) ----------
+
+WIRE_TYPE = "application/x-chess-bin"
+BIN_HEADERS = {"Accept": WIRE_TYPE}
+
+KIND_STATE = 1
+KIND_PIECE_LIST = 2
+KIND_MOVE_LIST = 3
+KIND_SNAPSHOT = 4
+
+BLACK_TO_MOVE = 0x01
+GAME_OVER = 0x02
+CHECKMATE = 0x04
+STALEMATE = 0x08
+PENDING = 0x10
+STALE = 0x20
+BOOK = 0x40
+TABLEBASE = 0x80
 
-    def get_state(self, fresh=False):
+NO_MOVE = 0xFFFF
+PROMOTES = 0x80
+
+# built once; square names are looked up, never formatted per poll
+SQUARES = [f + r for r in "12345678" for f in "abcdefgh"]
+PROMOTION = ("", "n", "b", "r", "q")
+
+
+def move_uci(packed):
+    """
+    UCI string for a 16-bit move (allocates; use for display only).
+    """
+    if packed == NO_MOVE:
+        return None
+    return SQUARES[packed & 0x3F] + SQUARES[packed >> 6 & 0x3F] + PROMOTION[packed >> 12]
+
+
+def _u16(b, i):
+    return b[i] | b[i + 1] << 8
+
+
+def _i16(b, i):
+    v = b[i] | b[i + 1] << 8
+    return v - 0x10000 if v & 0x8000 else v
+
+
+class BinaryState:
+    """
+    Decoded binary /state or /snapshot. All storage is allocated once:
+    responses are read straight into `buf`, and decode() only writes
+    small ints into fields and preallocated arrays, so polling does not
+    create garbage.
+
+    - line_moves / line_evals: first n_lines entries are the analysis
+      (16-bit moves, centipawns).
+    - snapshot only: tree_off[sq] / tree_len[sq] locate the to-squares of
+      from-square `sq` inside `buf` (tree_len 0 = no legal move);
+      targets_into() copies them out.
+    """
+
+    def __init__(self, size=1024, max_lines=8):
+        self.buf = bytearray(size)
+        self.length = 0
+        self.kind = 0
+        self.flags = 0
+        self.version = -1
+        self.move_number = 0
+        self.last_move = NO_MOVE
+        self.depth = 0
+        self.n_lines = 0
+        self.line_moves = array("H", [0] * max_lines)
+        self.line_evals = array("h", [0] * max_lines)
+        self.tree_off = array("H", [0] * 64)
+        self.tree_len = bytearray(64)
+        self.n_from = 0
+
+    def decode(self, length):
+        b = self.buf
+        self.length = length
+        self.kind = b[0]
+        self.flags = b[1]
+        self.version = b[2] | b[3] << 8 | b[4] << 16 | b[5] << 24
+        self.move_number = _u16(b, 6)
+        self.last_move = _u16(b, 8)
+        self.depth = b[10]
+        n = b[11]
+        if n > len(self.line_moves):
+            n = len(self.line_moves)
+        self.n_lines = n
+        i = 12
+        for k in range(b[11]):
+            if k < n:
+                self.line_moves[k] = _u16(b, i)
+                self.line_evals[k] = _i16(b, i + 2)
+            i += 4
+
+        self.n_from = 0
+        for sq in range(64):
+            self.tree_len[sq] = 0
+        if self.kind == KIND_SNAPSHOT:
+            self.n_from = b[i]
+            i += 1
+            for _ in range(self.n_from):
+                sq = b[i]
+                self.tree_len[sq] = b[i + 1]
+                self.tree_off[sq] = i + 2
+                i += 2 + b[i + 1]
+        return self
+
+    def black_to_move(self):
+        return bool(self.flags & BLACK_TO_MOVE)
+
+    def from_squares(self):
+        """
+        Sorted names of the snapshot's from-squares (like
+        ServerClient.local_pieces()), or None if this isn't a snapshot.
+        Allocates; call on entering the menu, not per poll.
+        """
+        if self.kind != KIND_SNAPSHOT:
+            return None
+        return sorted(SQUARES[sq] for sq in range(64) if self.tree_len[sq])
+
+    def moves_from(self, from_sq):
+        """
+        (to-squares, promoting to-squares) of square name `from_sq`, like
+        ServerClient.local_moves(), or None if this isn't a snapshot.
+        """
+        if self.kind != KIND_SNAPSHOT:
+            return None
+        sq = SQUARES.index(from_sq)
+        off = self.tree_off[sq]
+        to, promo = [], []
+        for k in range(self.tree_len[sq]):
+            t = self.buf[off + k]
+            to.append(SQUARES[t & 0x3F])
+            if t & PROMOTES:
+                promo.append(SQUARES[t & 0x3F])
+        return to, promo
+
+    def targets_into(self, from_sq, out):
+        """
+        Copy from-square `from_sq`'s to-squares (bit 7 = promotes) into
+        bytearray `out`; returns how many.
+        """
+        n = self.tree_len[from_sq]
+        off = self.tree_off[from_sq]
+        for k in range(n):
+            out[k] = self.buf[off + k]
+        return n
+
+
+class BinarySquares:
+    """
+    Decoded binary /piece_list (squares) or /move_list (from + to-squares,
+    bit 7 = promotes), into preallocated buffers.
+    """
+
+    def __init__(self, size=72):
+        self.buf = bytearray(size)
+        self.kind = 0
+        self.from_sq = -1
+        self.n = 0
+        self.squares = bytearray(64)
+
+    def decode(self, length):
+        b = self.buf
+        self.kind = b[0]
+        i = 1
+        if self.kind == KIND_MOVE_LIST:
+            self.from_sq = b[1]
+            i = 2
+        else:
+            self.from_sq = -1
+        self.n = b[i]
+        for k in range(self.n):
+            self.squares[k] = b[i + 1 + k]
+        return self
+
+
+class StateStream:
+    """
+    Subscriber for the server's /stream endpoint (server-sent events).
+
+    poll() never blocks: it returns the newest state dict once an event
+    has arrived, otherwise None. A dropped stream is reopened on the next
+    poll() and resumes from the last version seen.
+    """
+
+    def __init__(self, host, port=8000, timeout=2, session=None):
+        self.conn = KeepAliveConnection(host, port, timeout, session_headers(session))
+        self.open = False
+        self.version = None
+
+    def _start(self):
+        headers = {"Last-Event-ID": self.version} if self.version is not None else None
+        self.conn.send("GET", "/stream", headers=headers)
+        status = self.conn.read_head()[0]
+        if status != 200:
+            raise OSError("stream refused: %d" % status)
+        self.open = True
+
+    def close(self):
+        self.conn.close()
+        self.open = False
+
+    def poll(self):
         try:
-            url = self.base_url + "/state"
+            if not self.open:
+                self._start()
+            if not self.conn.ready():
+                return None
+
+            data = None
+            while True:
+                line = self.conn.f.readline()
+                if not line:
+                    raise OSError("stream closed")
+                if line == b"\n":
+                    break
+                if line.startswith(b"id: "):
+                    self.version = int(line[4:])
+                elif line.startswith(b"data: "):
+                    data = line[6:]
+
+            # heartbeat comments carry no data
+            return json.loads(data) if data else None
+        except Exception as e:
+            print("Protocol error (stream):", e)
+            self.close()
+            return None
+
+
+class ServerClient:
+    """
+    `session` identifies this device's game on a multi-session server;
+    without one the device shares the server's default board.
+
+    With snapshot=True, state fetches and the long-poll use /snapshot, so
+    `state` also carries the legal-move tree (see local_pieces() and
+    local_moves()).
+    """
+
+    def __init__(
+        self, host, port=8000, timeout=2, watch_timeout=20, session=None, snapshot=False
+    ):
+        headers = session_headers(session)
+        self.state_path = "/snapshot" if snapshot else "/state"
+        self.conn = KeepAliveConnection(host, port, timeout, headers)
+        self.state = None  # last full /state response
+        self.etag = None
+
+        # second connection for the parked long-poll, so commands never
+        # queue behind it
+        self.watch = KeepAliveConnection(host, port, timeout, headers)
+        self.watch_timeout = watch_timeout
+        self.watch_started = None
+
+    def _apply_state(self, headers, body):
+        self.state = json.loads(body)
+        self.etag = headers.get("etag")
+        return self.state
+
+    def _get(self, path):
+        _, _, body = self.conn.request("GET", path)
+        return json.loads(body)
+
+    def _post(self, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        _, _, body = self.conn.request("POST", path, body)
+        return json.loads(body)
+
+    def get_state(self, fresh=False, changed_only=False):
+        """
+        Fetch /state, sending the last ETag. If the server answers 304 the
+        cached state is returned, or None when changed_only is set so
+        polling callers can skip parsing and redrawing.
+        """
+        try:
+            path = self.state_path
             if fresh:
-                url += "?fresh=1"
-            r = urequests.get(url, timeout=self.timeout)
-            data = r.json()
-            r.close()
-            return data
+                path += "?fresh=1"
+            headers = {"If-None-Match": self.etag} if self.etag and self.state else None
+            status, resp_headers, body = self.conn.request("GET", path, headers=headers)
+            if status == 304:
+                return None if changed_only else self.state
+            return self._apply_state(resp_headers, body)
         except Exception as e:
             print("Protocol error (get_state):", e)
             return None
 
+    def _watch(self, since, headers=None, into=None):
+        """
+        One step of the non-blocking long-poll of <state_path>?since=.
+        Returns (status, headers, body) once the server answered,
+        otherwise None; re-arms itself on the next call.
+        """
+        if self.watch_started is None:
+            self.watch.send(
+                "GET",
+                "%s?since=%d&timeout=%d" % (self.state_path, since, self.watch_timeout),
+                headers=headers,
+            )
+            self.watch_started = time.time()
+            return None
+
+        if not self.watch.ready():
+            # server should always answer by watch_timeout; give up on
+            # a silently dead connection
+            if time.time() - self.watch_started > self.watch_timeout + 5:
+                self.watch.close()
+                self.watch_started = None
+            return None
+
+        self.watch_started = None
+        return self.watch.read_response(into)
+
+    def poll_watch(self):
+        """
+        Non-blocking long-poll of /state?since=<version>. Returns the new
+        state once the server reports a change, otherwise None. Call it
+        every loop iteration; it re-arms itself.
+        """
+        try:
+            since = self.state.get("version", -1) if self.state else -1
+            answer = self._watch(since)
+            if answer is None or answer[0] != 200:
+                return None
+            return self._apply_state(answer[1], answer[2])
+        except Exception as e:
+            print("Protocol error (poll_watch):", e)
+            self.watch.close()
+            self.watch_started = None
+            return None
+
+    def poll_watch_bin(self, out):
+        """
+        poll_watch() in the binary format: the response is read straight
+        into BinaryState `out` and decoded there, with no json.loads()
+        per change. Returns out once the state changed, else None.
+        """
+        try:
+            answer = self._watch(out.version, BIN_HEADERS, out.buf)
+            if answer is None or answer[0] != 200:
+                return None
+            self.etag = answer[1].get("etag")
+            return out.decode(answer[2])
+        except Exception as e:
+            print("Protocol error (poll_watch_bin):", e)
+            self.watch.close()
+            self.watch_started = None
+            return None
+
+    def local_pieces(self):
+        """
+        Sorted from-squares from the last snapshot, or None without one.
+        """
+        if not self.state or "moves" not in self.state:
+            return None
+        return sorted(self.state["moves"])
+
+    def local_moves(self, from_sq):
+        """
+        (to-squares, promoting to-squares) from the last snapshot, or None.
+        """
+        if not self.state or "moves" not in self.state:
+            return None
+        packed = self.state["moves"].get(from_sq, "")
+        promo = self.state.get("promotions", {}).get(from_sq, "")
+        return split_squares(packed), split_squares(promo)
+
+    def get_state_bin(self, out, fresh=False):
+        """
+        Binary /state (or /snapshot) decoded into BinaryState `out`.
+        Returns out, or None if unchanged (304) or on error.
+        """
+        try:
+            path = self.state_path + ("?fresh=1" if fresh else "")
+            headers = BIN_HEADERS
+            if self.etag and out.version >= 0:
+                headers = {"Accept": WIRE_TYPE, "If-None-Match": self.etag}
+            status, resp_headers, n = self.conn.request(
+                "GET", path, headers=headers, into=out.buf
+            )
+            if status != 200:
+                return None
+            self.etag = resp_headers.get("etag")
+            return out.decode(n)
+        except Exception as e:
+            print("Protocol error (get_state_bin):", e)
+            return None
+
+    def run_bin(self, command, out):
+        """
+        run() for binary clients: one /batch round trip whose answer is
+        the resulting state in the binary format, read into BinaryState
+        `out`. Returns out, or None on error.
+        """
+        try:
+            body = json.dumps({"commands": [command, {"type": self.state_path[1:]}]}).encode()
+            status, _, n = self.conn.request(
+                "POST", "/batch", body, headers=BIN_HEADERS, into=out.buf
+            )
+            if status != 200:
+                return None
+            self.etag = None  # batch results carry no ETag
+            return out.decode(n)
+        except Exception as e:
+            print("Protocol error (run_bin):", e)
+            return None
+
+    def piece_list_bin(self, out):
+        try:
+            status, _, n = self.conn.request("GET", "/piece_list", headers=BIN_HEADERS, into=out.buf)
+            return out.decode(n) if status == 200 else None
+        except Exception as e:
+            print("Protocol error (piece_list_bin):", e)
+            return None
+
+    def move_list_bin(self, from_sq: str, out):
+        try:
+            body = json.dumps({"from": from_sq}).encode()
+            status, _, n = self.conn.request(
+                "POST", "/move_list", body, headers=BIN_HEADERS, into=out.buf
+            )
+            return out.decode(n) if status == 200 else None
+        except Exception as e:
+            print("Protocol error (move_list_bin):", e)
+            return None
+
     def piece_list(self):
         try:
-            r = urequests.get(self.base_url + "/piece_list", timeout=self.timeout)
-            data = r.json()
-            r.close()
-            return data
+            return self._get("/piece_list")
         except Exception as e:
             print("Protocol error (piece_list):", e)
             return None
 
     def move_list(self, from_sq: str):
         try:
-            r = urequests.post(
-                self.base_url + "/move_list",
-                json={"from": from_sq},
-                timeout=self.timeout,
-            )
-            data = r.json()
-            r.close()
-            return data
+            return self._post("/move_list", {"from": from_sq})
         except Exception as e:
             print("Protocol error (move_list):", e)
             return None
 
     def play_move(self, move: str):
         try:
-            r = urequests.post(
-                self.base_url + "/play_move",
-                json={"move": move},
-                timeout=self.timeout,
-            )
-            data = r.json()
-            r.close()
-            return data
+            return self._post("/play_move", {"move": move})
         except Exception as e:
             print("Protocol error (play_move):", e)
             return None
 
     def undo(self):
         try:
-            r = urequests.post(self.base_url + "/undo", timeout=self.timeout)
-            data = r.json()
-            r.close()
-            return data
+            return self._post("/undo")
         except Exception as e:
             print("Protocol error (undo):", e)
             return None
-        
+
     def reset(self):
         try:
-            r = urequests.post(self.base_url + "/reset", timeout=self.timeout)
-            data = r.json()
-            r.close()
-            return data
+            return self._post("/reset")
         except Exception as e:
             print("Protocol error (reset):", e)
-            return None
\ No newline at end of file
+            return None
+
+    def batch(self, commands):
+        """
+        Run `commands` (e.g. [{"type": "undo"}, {"type": "state"}]) in one
+        /batch round trip. Returns the list of results, or None on error.
+        """
+        try:
+            r = self._post("/batch", {"commands": commands})
+            return r.get("results") if r else None
+        except Exception as e:
+            print("Protocol error (batch):", e)
+            return None
+
+    def run(self, command):
+        """
+        Run one command and fetch the resulting state in the same batch.
+        Returns the new state (also kept as `state`), or None.
+        """
+        results = self.batch([command, {"type": self.state_path[1:]}])
+        if not results or len(results) < 2:
+            return None
+        self.state = results[1]
+        self.etag = None  # batch results carry no ETag
+        return self.state
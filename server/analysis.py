@@ -1,20 +1,95 @@
 import chess
 import chess.engine
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import threading
 import time
 
+from server.cache import PositionCache, position_key
+from server.convergence import Convergence
+from server.single_flight import SingleFlight
+
 
 @dataclass
 class AnalysisLine:
     move: str
     eval: float
+    weight: float | None = None  # share of the book weight, for book moves
 
 
 @dataclass
 class AnalysisResult:
     depth: int
     lines: list[AnalysisLine]
+    pending: bool = False  # placeholder; the real result is still being searched
+    stale: bool = False    # lines belong to the previous position
+    book: bool = False     # opening-book moves, not an engine search
+    tablebase: bool = False  # exact endgame result; never searched
+    converged: bool = False  # stable enough that searching on is pointless
+    error: str | None = None  # why no engine is running (pending until one is)
+
+
+def info_to_result(info) -> AnalysisResult:
+    # python-chess returns list when multipv>1
+    entries = info if isinstance(info, list) else [info]
+    lines: list[AnalysisLine] = []
+
+    for entry in entries:
+        pv = entry.get("pv")
+        if not pv:
+            continue
+        score = entry["score"].white().score(mate_score=10000)
+        if score is None:
+            continue
+        lines.append(AnalysisLine(move=pv[0].uci(), eval=score / 100.0))
+
+    depth = 0
+    if entries and isinstance(entries[0], dict):
+        depth = entries[0].get("depth", 0) or 0
+
+    return AnalysisResult(depth=depth, lines=lines)
+
+
+def placeholder(cache: PositionCache, board: chess.Board) -> AnalysisResult:
+    """
+    Pending result for a position not analysed yet: the parent position's
+    cached lines marked stale, or an empty depth-0 result.
+    """
+    if board.move_stack:
+        parent = board.copy()
+        parent.pop()
+        entry = cache.get(position_key(parent))
+        if entry is not None:
+            return AnalysisResult(
+                depth=entry.result.depth,
+                lines=entry.result.lines,
+                pending=True,
+                stale=True,
+            )
+    return AnalysisResult(depth=0, lines=[], pending=True)
+
+
+def uci_options(engine, threads: int = 0, hash_mb: int = 0, options=None) -> dict:
+    """
+    configure() settings for `engine`: Threads and Hash (0 = engine
+    default) plus extra `options` such as EvalFile. Options the engine
+    doesn't declare, and those python-chess manages itself (MultiPV), are
+    left out. Raises ValueError for a value the engine would reject.
+    """
+    wanted = dict(options or {})
+    if threads:
+        wanted["Threads"] = threads
+    if hash_mb:
+        wanted["Hash"] = hash_mb
+    settings = {}
+    for name, value in wanted.items():
+        option = engine.options.get(name)
+        if option is None or option.is_managed():
+            continue
+        try:
+            settings[name] = option.parse(value)
+        except chess.engine.EngineError as e:
+            raise ValueError(str(e)) from None
+    return settings
 
 
 class StubAnalysisEngine:
@@ -32,9 +107,45 @@ class StubAnalysisEngine:
 class StockfishAnalysisEngine:
     """
     Live deepening Stockfish analysis.
-    - Keeps analysing current FEN in a background thread.
-    - Each cycle increases time budget up to max_time.
+    - Keeps analysing current FEN in a background thread. The worker is
+      event-driven: a position change wakes it immediately and cancels
+      any search still running for the old position.
+    - Each cycle increases time budget up to max_time (by twice
+      step_time while the best line keeps changing).
+    - converge_iterations=N: once the best move and eval have held for N
+      iterations (or the result reaches target_depth), the result is
+      published as `converged` and the position isn't searched again
+      until it comes back.
     - analyse(board) returns latest stored result quickly.
+    - Listeners registered with add_listener() are called whenever a new
+      result is published.
+    - Every position's deepest result and budget are kept in an LRU
+      cache, so returning to a position (undo, transposition) resumes
+      deepening where it left off. With a `store` (AnalysisStore) the
+      cache also persists across restarts.
+    - nonblocking=True never searches on the caller's thread: until the
+      worker has a result, analyse() returns a pending placeholder (the
+      previous position's cached lines marked stale, or an empty depth-0
+      result).
+    - continuous=True replaces the restart-per-cycle deepening with one
+      infinite search per position, publishing its info updates at most
+      every publish_interval and stopping only when the position changes.
+    - speculate=N: once the position reaches speculate_depth, the engine
+      pre-analyses the positions after the top N moves for
+      speculate_time each, so playing one of them finds a cached result.
+      A real position change cancels speculative work immediately.
+    - With a `book` (OpeningBook), a position the engine has no result
+      for yet is answered from the book while the worker searches it.
+    - With a `tablebase` (EndgameTablebase), covered endgames are answered
+      exactly and the worker doesn't search them at all.
+    - idle_after=S: with no analyse() or touch() for S seconds the worker
+      stops searching, leaving the engine process idle, and resumes on
+      the next call with the result and budget it had.
+    - Concurrent blocking analyse() calls for a position without a result
+      share one one-shot search (see SingleFlight).
+    - threads, hash_mb and options are sent to the engine as UCI options
+      (0 keeps the engine's default); reconfigure() changes them and the
+      time controls while running.
     """
 
     live = True  # used by http_server to decide caching behavior
@@ -47,6 +158,23 @@ class StockfishAnalysisEngine:
         max_time: float = 1.50,
         interval: float = 1.0,
         multipv: int = 3,
+        cache_size: int = 4096,
+        store=None,
+        nonblocking: bool = False,
+        continuous: bool = False,
+        publish_interval: float = 0.25,
+        speculate: int = 0,
+        speculate_depth: int = 18,
+        speculate_time: float = 0.5,
+        book=None,
+        tablebase=None,
+        converge_iterations: int = 0,
+        eval_margin: float = 0.15,
+        target_depth: int = 0,
+        idle_after: float = 0.0,
+        threads: int = 0,
+        hash_mb: int = 0,
+        options=None,
     ):
         self.engine_path = engine_path
         self.base_time = base_time
@@ -54,23 +182,69 @@ class StockfishAnalysisEngine:
         self.max_time = max_time
         self.interval = interval
         self.multipv = multipv
+        self.cache = PositionCache(cache_size, store=store)
+        self.nonblocking = nonblocking
+        self.continuous = continuous
+        self.publish_interval = publish_interval
+        self.speculate = speculate
+        self.speculate_depth = speculate_depth
+        self.speculate_time = speculate_time
+        self.book = book
+        self.tablebase = tablebase
+        self.converge_iterations = converge_iterations
+        self.eval_margin = eval_margin
+        self.target_depth = target_depth
+        self.search_seconds = 0.0  # engine time spent searching
+        self.idle_after = idle_after
+        self.threads = threads
+        self.hash_mb = hash_mb
+        self.options = dict(options or {})
+        self.suspensions = 0
+        self.speculations = 0
+        self.speculative_hits = 0
+        self._one_shots = SingleFlight()
 
         self.engine = None
+        self._start_lock = threading.Lock()
+        # python-chess cancels an in-flight command when another thread
+        # starts one, so worker and one-shot searches take turns
+        self._engine_lock = threading.Lock()
 
         self._lock = threading.Lock()
-        self._target_fen = None
+        self._result_ready = threading.Condition(self._lock)
+        self._wake = threading.Condition(self._lock)  # target changed / stop
+        self._target_key = None    # position_key() of the position to analyse
+        self._target_board = None  # snapshot of it, handed to the worker
         self._latest = None
         self._budget = self.base_time
+        self._convergence = self._new_convergence()
+        self._search = None  # in-flight search, stopped on position change
+        self._last_activity = time.monotonic()
+        self._suspended = False
+        self._options_changed = False  # UCI options to send before the next search
 
         self._stop = threading.Event()
         self._thread = None
+        self._listeners = []
 
     def start(self):
-        if self.engine is None:
-            self.engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+        # HTTP handler threads and the worker may race to start the engine.
+        with self._start_lock:
+            if self.engine is None:
+                engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+                with self._lock:
+                    settings = uci_options(engine, self.threads, self.hash_mb, self.options)
+                    self._options_changed = False
+                if settings:
+                    engine.configure(settings)
+                self.engine = engine
 
     def stop(self):
         self._stop.set()
+        with self._lock:
+            self._wake.notify_all()
+            if self._search is not None:
+                self._search.stop()
         t = self._thread
         if t is not None:
             t.join(timeout=2.0)
@@ -80,93 +254,451 @@ class StockfishAnalysisEngine:
             self.engine.quit()
             self.engine = None
 
-    def _ensure_worker(self):
-        if self._thread is not None:
-            return
-        self._thread = threading.Thread(target=self._worker, daemon=True)
-        self._thread.start()
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def settings(self) -> dict:
+        with self._lock:
+            return {
+                "engine_path": self.engine_path,
+                "threads": self.threads,
+                "hash_mb": self.hash_mb,
+                "multipv": self.multipv,
+                "base_time": self.base_time,
+                "step_time": self.step_time,
+                "max_time": self.max_time,
+                "options": dict(self.options),
+            }
+
+    def reconfigure(self, **changes):
+        """
+        Change threads, hash_mb, options (merged), multipv or the time
+        controls while running. Time controls and multipv apply from the
+        next search; UCI options are sent to the engine between searches,
+        so a continuous search is restarted for them. Published and cached
+        results are kept. Raises ValueError for option values the engine
+        rejects (the engine is started to check them).
+        """
+        self.start()
+        with self._lock:
+            if "options" in changes:
+                changes["options"] = {**self.options, **changes["options"]}
+            uci_options(
+                self.engine,
+                changes.get("threads", self.threads),
+                changes.get("hash_mb", self.hash_mb),
+                changes.get("options", self.options),
+            )
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self._budget = min(max(self._budget, self.base_time), self.max_time)
+            if changes.keys() & {"threads", "hash_mb", "options"}:
+                self._options_changed = True
+                if self.continuous and self._search is not None:
+                    self._search.stop()
+
+    def _apply_options(self):
+        with self._lock:
+            if not self._options_changed:
+                return
+            self._options_changed = False
+            settings = uci_options(self.engine, self.threads, self.hash_mb, self.options)
+        with self._engine_lock:
+            self.engine.configure(settings)
+
+    def stats(self) -> dict:
+        stats = {
+            "analysis_cache": self.cache.stats(),
+            "speculation": {
+                "searches": self.speculations,
+                "hits": self.speculative_hits,
+            },
+            "coalescing": self._one_shots.stats(),
+            "search_seconds": self.search_seconds,
+            "idle": {
+                "idle_after": self.idle_after,
+                "suspended": self._suspended,
+                "suspensions": self.suspensions,
+            },
+        }
+        if self.book is not None:
+            stats["book"] = self.book.stats()
+        if self.tablebase is not None:
+            stats["tablebase"] = self.tablebase.stats()
+        return stats
+
+    def _notify(self):
+        for fn in self._listeners:
+            fn()
+
+    def touch(self, key=None):
+        """
+        A client is still watching (e.g. a parked long-poll or a cached
+        /state answer): keep searching, or resume a suspended worker.
+        """
+        with self._lock:
+            self._last_activity = time.monotonic()
+            if self._suspended:
+                self._wake.notify_all()
+
+    def _idle(self) -> bool:
+        return (
+            self.idle_after > 0
+            and time.monotonic() - self._last_activity > self.idle_after
+        )
 
-    def _set_position(self, board: chess.Board):
-        fen = board.fen()
+    def _suspend(self):
+        """
+        Park the worker until the next analyse()/touch() or stop().
+        """
+        with self._wake:
+            self._suspended = True
+            self.suspensions += 1
+            self._wake.wait_for(lambda: self._stop.is_set() or not self._idle())
+            self._suspended = False
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._worker, daemon=True)
+            self._thread.start()
+
+    def _set_position(self, board: chess.Board) -> int:
+        key = position_key(board)
+        # a new position may be read from the store: not under the lock
+        entry = self.cache.get(key) if key != self._target_key else None
         with self._lock:
-            if fen != self._target_fen:
-                self._target_fen = fen
-                self._latest = None
-                self._budget = self.base_time
+            if key != self._target_key:
+                if entry is None:
+                    entry = self.cache.peek(key)
+                self._target_key = key
+                self._target_board = board.copy(stack=False)
+                # wake an idle worker, cancel a search for the old position
+                self._wake.notify_all()
+                if self._search is not None:
+                    self._search.stop()
+                self._convergence = self._new_convergence()
+                if entry is not None:
+                    if entry.speculative:
+                        entry.speculative = False
+                        self.speculative_hits += 1
+                    self._latest = entry.result
+                    self._budget = entry.budget
+                else:
+                    self._latest = None
+                    self._budget = self.base_time
+        return key
+
+    def _new_convergence(self) -> Convergence:
+        return Convergence(self.converge_iterations, self.eval_margin, self.target_depth)
+
+    def _converge(self, key: int, result: AnalysisResult):
+        """
+        Feed a completed iteration for `key` to its Convergence and flag
+        the result if it settled. Returns the Convergence, or None if the
+        target has moved on.
+        """
+        with self._lock:
+            if key != self._target_key:
+                return None
+            convergence = self._convergence
+            if convergence.update(result):
+                result.converged = True
+            return convergence
+
+    def _is_converged(self, key: int) -> bool:
+        with self._lock:
+            return (
+                key == self._target_key
+                and self._latest is not None
+                and self._latest.converged
+            )
 
     def _info_to_result(self, info) -> AnalysisResult:
-        # python-chess returns list when multipv>1
-        entries = info if isinstance(info, list) else [info]
-        lines: list[AnalysisLine] = []
+        return info_to_result(info)
+
+    def _publish(self, key: int, result: AnalysisResult, budget: float):
+        # still valid for that position even if the board moved on
+        self.cache.put(key, result, budget)
 
-        for entry in entries:
-            pv = entry.get("pv")
-            if not pv:
+        settled = None
+        with self._lock:
+            # only publish if position didn’t change mid-think, and
+            # never replace a deeper (e.g. cached) result
+            published = key == self._target_key and (
+                self._latest is None or result.depth >= self._latest.depth
+            )
+            if key == self._target_key:
+                self._budget = budget
+            if published:
+                self._latest = result
+                self._result_ready.notify_all()
+            elif key == self._target_key and result.converged:
+                # settled below a deeper cached result: keep that, stop searching
+                settled = self._latest = replace(self._latest, converged=True)
+                published = True
+
+        if settled is not None:
+            # the store may write to disk: not under the lock
+            self.cache.put(key, settled, budget)
+        if published:
+            self._notify()
+        return published
+
+    def _limited_search(self, key: int, board: chess.Board, seconds: float):
+        """
+        Search `board` for `seconds`, through analysis() so
+        _set_position() can cancel it when the target moves away from
+        `key`. Returns (multipv infos, cancelled).
+        """
+        started = time.monotonic()
+        with self._engine_lock:
+            with self.engine.analysis(
+                board, chess.engine.Limit(time=seconds), multipv=self.multipv
+            ) as search:
+                with self._lock:
+                    self._search = search
+                    if key != self._target_key:
+                        search.stop()
+                try:
+                    search.wait()
+                finally:
+                    with self._lock:
+                        self._search = None
+                info = search.multipv
+
+        with self._lock:
+            self.search_seconds += time.monotonic() - started
+            cancelled = key != self._target_key
+        return info, cancelled
+
+    def _search_cycle(self, key: int, board: chess.Board, budget: float):
+        info, cancelled = self._limited_search(key, board, budget)
+
+        # a cancelled search didn't use its budget; don't grow it, and
+        # don't judge convergence by it
+        result = self._info_to_result(info)
+        if result.lines:
+            convergence = None if cancelled else self._converge(key, result)
+            if convergence is None:
+                next_budget = budget
+            else:
+                next_budget = convergence.next_budget(budget, self.step_time, self.max_time)
+            self._publish(key, result, next_budget)
+
+        # spare time goes to speculation first, if there's any to do
+        if self._next_speculation(key) is None:
+            self._wait_for_change(key, self.interval)
+
+    def _next_speculation(self, key: int):
+        """
+        Child position of one of the current top moves that still needs
+        pre-analysis, or None. Only once the current position itself has
+        reached speculate_depth.
+        """
+        if not self.speculate:
+            return None
+
+        with self._lock:
+            latest = self._latest
+            board = self._target_board
+            if key != self._target_key or latest is None or latest.depth < self.speculate_depth:
+                return None
+
+        for line in latest.lines[: self.speculate]:
+            child = board.copy()
+            try:
+                child.push_uci(line.move)
+            except ValueError:
                 continue
-            score = entry["score"].white().score(mate_score=10000)
-            if score is None:
+            if child.is_game_over() or self._exact(child) is not None:
+                # mate or stalemate has no lines to cache: never "done"
                 continue
-            lines.append(AnalysisLine(move=pv[0].uci(), eval=score / 100.0))
-
-        depth = 0
-        if entries and isinstance(entries[0], dict):
-            depth = entries[0].get("depth", 0) or 0
+            entry = self.cache.peek(position_key(child))
+            if entry is None or entry.budget < self.speculate_time:
+                return child
+        return None
+
+    def _search_speculative(self, key: int, child: chess.Board):
+        info, cancelled = self._limited_search(key, child, self.speculate_time)
+        result = self._info_to_result(info)
+        if result.lines and not cancelled:
+            self.cache.put(position_key(child), result, self.speculate_time, speculative=True)
+            with self._lock:
+                self.speculations += 1
+
+    def _wait_for_change(self, key, timeout):
+        """
+        Sleep until the target position differs from `key`, the engine is
+        stopped, or timeout expires.
+        """
+        with self._wake:
+            self._wake.wait_for(
+                lambda: self._stop.is_set() or self._target_key != key, timeout
+            )
 
-        return AnalysisResult(depth=depth, lines=lines)
+    def _search_continuous(self, key: int, board: chess.Board, budget: float):
+        """
+        One infinite search for the position, publishing its info updates
+        at most every publish_interval. _set_position() stops it as soon
+        as the target changes.
+        """
+        last = None
+        last_publish = 0.0
+        speculating = False
+        # don't publish until every MultiPV line has been reported
+        want = min(self.multipv, board.legal_moves.count())
+
+        started = time.monotonic()
+        with self._engine_lock:
+            with self.engine.analysis(board, multipv=self.multipv) as search:
+                with self._lock:
+                    self._search = search
+                    if key != self._target_key:
+                        search.stop()
+
+                try:
+                    for _ in search:
+                        if self._idle():
+                            # nobody is watching; the worker suspends next
+                            search.stop()
+                        now = time.monotonic()
+                        if now - last_publish < self.publish_interval:
+                            continue
+                        result = self._info_to_result(search.multipv)
+                        if len(result.lines) >= want and result != last:
+                            # each new depth is one iteration
+                            if last is None or result.depth > last.depth:
+                                self._converge(key, result)
+                            self._publish(key, result, budget)
+                            last = result
+                            last_publish = now
+                            if result.converged:
+                                search.stop()
+                            elif self._next_speculation(key) is not None:
+                                # deep enough: lend the engine to the
+                                # children, resume afterwards
+                                speculating = True
+                                search.stop()
+                finally:
+                    with self._lock:
+                        self._search = None
+                        self.search_seconds += time.monotonic() - started
+
+                result = self._info_to_result(search.multipv)
+                if result.lines and result != last and not (last and last.converged):
+                    self._publish(key, result, budget)
+
+        # if the engine ended on its own (mate, stalemate, depth cap),
+        # don't restart the same search in a tight loop
+        if not speculating and not self._options_changed:
+            self._wait_for_change(key, self.interval)
 
     def _worker(self):
         self.start()
 
         while not self._stop.is_set():
             with self._lock:
-                fen = self._target_fen
+                key = self._target_key
+                board = self._target_board
                 budget = self._budget
 
-            if not fen:
-                time.sleep(0.05)
+            if key is None or board.is_game_over() or self._exact(board) is not None:
+                # nothing to search, or the result or tablebase already says it all
+                self._wait_for_change(key, None)
                 continue
 
-            board = chess.Board(fen)
+            if self._idle():
+                self._suspend()
+                continue
 
             try:
-                info = self.engine.analyse(
-                    board,
-                    chess.engine.Limit(time=budget),
-                    multipv=self.multipv,
-                )
-                result = self._info_to_result(info)
-
-                with self._lock:
-                    # only publish if position didn’t change mid-think
-                    if fen == self._target_fen:
-                        self._latest = result
-                        self._budget = min(self._budget + self.step_time, self.max_time)
-
+                self._apply_options()
+                child = self._next_speculation(key)
+                if child is not None:
+                    self._search_speculative(key, child)
+                elif self._is_converged(key):
+                    self._wait_for_change(key, None)
+                elif self.continuous:
+                    self._search_continuous(key, board, budget)
+                else:
+                    self._search_cycle(key, board, budget)
             except Exception:
                 # keep server alive even if engine hiccups
-                time.sleep(0.2)
+                self._stop.wait(0.2)
+
+    def _exact(self, board: chess.Board) -> AnalysisResult | None:
+        if self.tablebase is None:
+            return None
+        return self.tablebase.lookup(board)
 
-            time.sleep(self.interval)
+    def _placeholder(self, board: chess.Board) -> AnalysisResult:
+        return placeholder(self.cache, board)
 
     def analyse(self, board: chess.Board) -> AnalysisResult:
-        self.start()
+        self.touch()
+        if not self.nonblocking:
+            self.start()  # otherwise the worker starts the process
         self._ensure_worker()
-        self._set_position(board)
+        key = self._set_position(board)
+        if board.is_game_over():
+            # no lines to find; the worker leaves it alone
+            return AnalysisResult(depth=0, lines=[])
+
+        exact = self._exact(board)
+        if exact is not None:
+            return exact
 
         with self._lock:
             latest = self._latest
 
+        if latest is None and self.book is not None:
+            found = self.book.lookup(board)
+            if found is not None:
+                # the worker searches meanwhile; listeners tell clients
+                return found
+
+        if latest is None and self.nonblocking:
+            # the worker publishes the real result; listeners tell clients
+            return self._placeholder(board)
+
+        if latest is None and self.continuous:
+            # the running search publishes its first lines within moments;
+            # the engine is busy with it, so wait rather than one-shot
+            with self._result_ready:
+                self._result_ready.wait_for(
+                    lambda: self._latest is not None, self.base_time
+                )
+                latest = self._latest
+            return latest if latest is not None else self._placeholder(board)
+
         # First call after position change might not have a background result yet.
         # Return a quick one-shot so UI has something immediately.
         if latest is None:
+            latest = self._one_shots.do(key, lambda: self._one_shot(key, board))
+
+        return latest
+
+    def _one_shot(self, key: int, board: chess.Board) -> AnalysisResult:
+        with self._lock:
+            # the worker (or an earlier one-shot) may have published meanwhile
+            latest = self._latest if key == self._target_key else None
+        if latest is not None:
+            return latest
+
+        with self._engine_lock:
             info = self.engine.analyse(
                 board,
                 chess.engine.Limit(time=self.base_time),
                 multipv=self.multipv,
             )
-            latest = self._info_to_result(info)
-            with self._lock:
-                if board.fen() == self._target_fen:
-                    self._latest = latest
-
-        return latest
\ No newline at end of file
+        latest = self._info_to_result(info)
+        self.cache.put(key, latest, self.base_time)
+        with self._lock:
+            published = key == self._target_key
+            if published:
+                self._latest = latest
+        if published:
+            self._notify()
+        return latest
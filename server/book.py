@@ -0,0 +1,70 @@
+import threading
+
+import chess
+import chess.polyglot
+
+from server.analysis import AnalysisLine, AnalysisResult
+
+
+class OpeningBook:
+    """
+    Local Polyglot (.bin) opening books.
+    - Files are memory-mapped by python-chess and looked up by binary
+      search on the position's Zobrist key, so a lookup costs a hash and
+      a few page reads, not a search.
+    - lookup(board) merges the entries of every book, heaviest first,
+      into an AnalysisResult flagged `book`: depth 0, eval 0.0 (books
+      carry no evaluation) and each move's share of the total weight.
+    - Moves weighted below min_weight are ignored, as Polyglot tools do.
+    """
+
+    def __init__(self, paths, max_lines: int = 3, min_weight: int = 1):
+        if isinstance(paths, (str, bytes)) or hasattr(paths, "__fspath__"):
+            paths = [paths]
+        self.paths = [str(p) for p in paths]
+        self.max_lines = max_lines
+        self.min_weight = min_weight
+        self._readers = [chess.polyglot.open_reader(p) for p in self.paths]
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        for reader in self._readers:
+            reader.close()
+        self._readers = []
+
+    def lookup(self, board: chess.Board) -> AnalysisResult | None:
+        weights = {}
+        for reader in self._readers:
+            for entry in reader.find_all(board, minimum_weight=self.min_weight):
+                uci = entry.move.uci()
+                weights[uci] = weights.get(uci, 0) + entry.weight
+
+        with self._lock:
+            if not weights:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        total = sum(weights.values())
+        best = sorted(weights.items(), key=lambda mw: (-mw[1], mw[0]))[: self.max_lines]
+        return AnalysisResult(
+            depth=0,
+            lines=[
+                AnalysisLine(move=move, eval=0.0, weight=round(weight / total, 3))
+                for move, weight in best
+            ],
+            pending=True,
+            book=True,
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "files": len(self._readers),
+                "entries": sum(len(r) for r in self._readers),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+
+import chess
+import chess.polyglot
+
+
+def position_key(board: chess.Board) -> int:
+    """
+    Zobrist hash of the position (pieces, side to move, castling, en passant).
+    Move counters are ignored, so transpositions share a key.
+    """
+    return chess.polyglot.zobrist_hash(board)
+
+
+@dataclass
+class CacheEntry:
+    result: object  # AnalysisResult
+    budget: float   # search time per cycle reached for this position
+    speculative: bool = False  # filled by pre-analysis, not yet visited
+
+
+class PositionCache:
+    """
+    Size-bounded LRU of analysis results keyed by position_key().
+    - put() keeps the deepest result seen for a position.
+    - get() counts hits and misses.
+    - An optional store (e.g. AnalysisStore) acts as a persistent second
+      level: misses fall through to it and puts are written back.
+    """
+
+    def __init__(self, max_entries: int = 4096, store=None):
+        self.max_entries = max_entries
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        if self.store is not None:
+            found = self.store.get(key)
+            if found is not None:
+                entry = CacheEntry(*found)
+                with self._lock:
+                    self._insert(key, entry)
+                    self.hits += 1
+                return entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def peek(self, key):
+        """
+        In-memory lookup that doesn't count as a hit or miss or refresh
+        the entry's LRU position.
+        """
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, result, budget: float = 0.0, speculative: bool = False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and result.depth < entry.result.depth:
+                # keep the deeper result, but remember the larger budget
+                entry.budget = max(entry.budget, budget)
+                self._entries.move_to_end(key)
+            else:
+                self._insert(key, CacheEntry(result, budget, speculative))
+
+        if self.store is not None:
+            self.store.put(key, result, budget)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+        if self.store is not None:
+            stats["store"] = self.store.stats()
+        return stats
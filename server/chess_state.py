@@ -1,9 +1,24 @@
+import threading
+
 import chess
 
+from server.cache import position_key
+from server.move_index import MoveIndex
+
 
 class SandboxState:
     """
     Sandbox UI state backed by python-chess.
+
+    `lock` guards the board and menu fields when the state is shared
+    between concurrent HTTP handler threads.
+
+    `version` increases on every board change (and whenever the server
+    publishes new analysis for it); clients use it to skip unchanged polls.
+    `changed` is notified on every bump so requests can wait for one.
+
+    position_key() and move_index() are computed once per board change
+    and shared by every endpoint until the next push/pop.
     """
 
     ROOT = "root"
@@ -11,6 +26,10 @@ class SandboxState:
     MOVE_LIST = "move_list"
 
     def __init__(self):
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.version = 0
+
         self.mode = self.ROOT
         self.cursor = 0 
         self.last_key = None
@@ -23,6 +42,49 @@ class SandboxState:
         
         self.update_pieces()
 
+    def mark_changed(self):
+        with self.changed:
+            self.version += 1
+            self.changed.notify_all()
+
+    def wait_for_change(self, since: int, timeout: float) -> int:
+        """
+        Block until version moves past `since` or timeout expires.
+        Returns the current version.
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.version > since, timeout)
+            return self.version
+
+    @property
+    def board(self) -> chess.Board:
+        return self._board
+
+    @board.setter
+    def board(self, board: chess.Board):
+        self._board = board
+        self._board_changed()
+
+    def _board_changed(self):
+        self._cache = {}
+        self._cache_ply = len(self._board.move_stack)
+
+    def _cached(self, name, build):
+        # the ply check also catches pushes made directly on self.board
+        with self.lock:
+            ply = len(self._board.move_stack)
+            if ply != self._cache_ply:
+                self._board_changed()
+            if name not in self._cache:
+                self._cache[name] = build(self._board)
+            return self._cache[name]
+
+    def position_key(self) -> int:
+        return self._cached("key", position_key)
+
+    def move_index(self) -> MoveIndex:
+        return self._cached("moves", MoveIndex.build)
+
     def move_cursor_up(self):
         self.cursor = max(0, self.cursor - 1)
 
@@ -42,7 +104,9 @@ class SandboxState:
 
         elif self.mode == self.MOVE_LIST:
             to_sq = self.moves[self.cursor]
-            self.board.push_uci(self.selected_from + to_sq)
+            self.board.push_uci(self.move_index().uci(self.selected_from, to_sq))
+            self._board_changed()
+            self.mark_changed()
             self.selected_from = None
             self.update_pieces()
             self.mode = self.ROOT
@@ -58,25 +122,30 @@ class SandboxState:
             self.cursor = 0
             
     def update_pieces(self):
-        seen = set()
-        self.pieces = []
-
-        for move in self.board.legal_moves:
-            sq = chess.square_name(move.from_square)
-            if sq not in seen:
-                seen.add(sq)
-                piece = self.board.piece_at(move.from_square)
-                self.pieces.append(f"{sq} {piece.symbol().lower()}")
+        self.pieces = list(self.move_index().labels)
 
-        self.pieces.sort()
-        
     def update_moves(self, from_square: str):
-        sq = chess.parse_square(from_square)
-        self.moves = sorted({
-            chess.square_name(m.to_square)
-            for m in self.board.legal_moves
-            if m.from_square == sq
-        })
+        self.moves = list(self.move_index().moves_from(from_square))
+
+    def play(self, uci: str):
+        """
+        Push a UCI move. Raises ValueError if it is not legal.
+        """
+        with self.lock:
+            self.board.push_uci(uci)
+            self._board_changed()
+            self.mark_changed()
+
+    def reset(self):
+        with self.lock:
+            self.board.reset()
+            self._board_changed()
+            self.mode = self.ROOT
+            self.cursor = 0
+            self.selected_from = None
+            self.moves = []
+            self.update_pieces()
+            self.mark_changed()
 
     def undo(self) -> bool:
         """
@@ -86,6 +155,8 @@ class SandboxState:
             return False
 
         self.board.pop()
+        self._board_changed()
+        self.mark_changed()
         self.selected_from = None
         self.mode = self.ROOT
         self.cursor = 0
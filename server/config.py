@@ -0,0 +1,260 @@
+"""
+Engine configuration: defaults, then a JSON config file, then CHESS_ENGINE_*
+environment variables, then command-line flags (later wins). Unset
+sizes (0) are filled in from the machine's cores and memory.
+
+    python -m server.http_server --threads 4 --hash 512 --option EvalFile=nn.nnue
+    CHESS_ENGINE_PATH=/usr/games/stockfish python -m server.http_server
+"""
+
+import argparse
+from dataclasses import asdict, dataclass, field, fields
+import json
+import os
+import shlex
+import shutil
+
+CONFIG_PATH = "server_config.json"  # read if present; --config / CHESS_ENGINE_CONFIG
+ENV_PREFIX = "CHESS_ENGINE_"
+FALLBACK_ENGINE_PATH = "/opt/homebrew/bin/stockfish"
+
+MIN_HASH_MB = 16
+MAX_HASH_MB = 4096
+MAX_MULTIPV = 10
+MAX_TIME = 60.0
+
+# settings a running engine can change without a restart
+RUNTIME_FIELDS = ("threads", "hash_mb", "multipv", "base_time", "step_time", "max_time", "options")
+# UCI options POST /config may set; anything touching files (EvalFile,
+# Debug Log File, SyzygyPath) is startup-only
+RUNTIME_OPTIONS = (
+    "Skill Level", "UCI_LimitStrength", "UCI_Elo", "UCI_ShowWDL", "Contempt", "Move Overhead",
+)
+
+
+def default_engine_path() -> str:
+    return shutil.which("stockfish") or FALLBACK_ENGINE_PATH
+
+
+@dataclass
+class EngineConfig:
+    """
+    - engine_path: executable, optionally with arguments ("python fake.py")
+    - pool_size: engine processes; threads: UCI Threads per process;
+      hash_mb: UCI Hash per process (0 = auto-size)
+    - multipv, base_time, step_time, max_time: search settings
+    - options: further UCI options, e.g. {"EvalFile": "nn.nnue"}
+    - book_paths / syzygy_paths: opening books and tablebase directories
+    - single_board: one StockfishAnalysisEngine with continuous search and
+      speculation instead of the shared pool (see server/README.md)
+    - config_token: enables POST /config for clients sending it as a
+      bearer token (empty = runtime changes disabled)
+    """
+
+    engine_path: str = field(default_factory=default_engine_path)
+    pool_size: int = 0
+    threads: int = 0
+    hash_mb: int = 0
+    multipv: int = 3
+    base_time: float = 0.10
+    step_time: float = 0.10
+    max_time: float = 1.50
+    options: dict = field(default_factory=dict)
+    book_paths: list = field(default_factory=list)
+    syzygy_paths: list = field(default_factory=list)
+    single_board: bool = False
+    config_token: str = ""
+
+    def command(self) -> list[str]:
+        return shlex.split(self.engine_path)
+
+    def validate(self):
+        for name in ("pool_size", "threads", "hash_mb"):
+            if getattr(self, name) < 0:
+                raise ValueError(f"{name} must be >= 0")
+        if self.multipv < 1:
+            raise ValueError("multipv must be >= 1")
+        if not 0 < self.base_time <= self.max_time:
+            raise ValueError("need 0 < base_time <= max_time")
+        if self.step_time < 0:
+            raise ValueError("step_time must be >= 0")
+        if not isinstance(self.options, dict):
+            raise ValueError("options must be an object")
+        return self
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def machine_memory() -> int:
+    """
+    Physical memory in bytes (1 GiB if unknown).
+    """
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return 1 << 30
+
+
+def machine_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def auto_size(config: EngineConfig, cores: int | None = None, memory: int | None = None):
+    """
+    Fill in pool_size, threads and hash_mb left at 0.
+    - Cores go to separate processes first (one board per core), so
+      pool_size * threads matches the core count.
+    - A quarter of physical memory is split between the processes' hash
+      tables, as a power of two between MIN_HASH_MB and MAX_HASH_MB.
+    """
+    cores = cores or machine_cores()
+    memory = memory or machine_memory()
+
+    if config.single_board:
+        config.pool_size = 1
+
+    if not config.threads:
+        config.threads = max(1, cores // config.pool_size) if config.pool_size else 1
+    if not config.pool_size:
+        config.pool_size = max(1, cores // config.threads)
+    if not config.hash_mb:
+        per_engine = memory // 4 // config.pool_size >> 20
+        hash_mb = MIN_HASH_MB
+        while hash_mb * 2 <= min(per_engine, MAX_HASH_MB):
+            hash_mb *= 2
+        config.hash_mb = hash_mb
+    return config
+
+
+def _coerce(name: str, value):
+    kind = {f.name: f.type for f in fields(EngineConfig)}[name]
+    if kind in (int, "int"):
+        return int(value)
+    if kind in (float, "float"):
+        return float(value)
+    if kind in (bool, "bool") and isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    if kind in (list, "list") and isinstance(value, str):
+        return [p for p in value.split(os.pathsep) if p]
+    return value
+
+
+def parse_option(text: str):
+    """
+    "Name=value" -> (name, value), with numbers and true/false converted.
+    """
+    name, sep, value = text.partition("=")
+    if not sep or not name:
+        raise ValueError(f"expected Name=value, got {text!r}")
+    if value.lower() in ("true", "false"):
+        return name, value.lower() == "true"
+    try:
+        return name, int(value)
+    except ValueError:
+        return name, value
+
+
+def arg_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description="Chess analysis server")
+    ap.add_argument("--config", help=f"JSON config file (default {CONFIG_PATH})")
+    ap.add_argument("--engine", dest="engine_path", help="engine executable")
+    ap.add_argument("--pool-size", type=int, help="engine processes (0 = one per core)")
+    ap.add_argument("--threads", type=int, help="Threads per engine (0 = auto)")
+    ap.add_argument("--hash", dest="hash_mb", type=int, help="Hash MB per engine (0 = auto)")
+    ap.add_argument("--multipv", type=int)
+    ap.add_argument("--base-time", type=float)
+    ap.add_argument("--step-time", type=float)
+    ap.add_argument("--max-time", type=float)
+    ap.add_argument(
+        "--option", dest="options", action="append", type=parse_option, metavar="NAME=VALUE",
+        help="extra UCI option, repeatable",
+    )
+    ap.add_argument("--book", dest="book_paths", action="append", help="Polyglot book, repeatable")
+    ap.add_argument(
+        "--syzygy", dest="syzygy_paths", action="append", help="Syzygy directory, repeatable"
+    )
+    ap.add_argument(
+        "--single-board", action="store_true", default=None,
+        help="one engine with continuous search and speculation instead of a pool",
+    )
+    return ap
+
+
+def load_config(argv=None, env=None, cores=None, memory=None) -> EngineConfig:
+    """
+    Merge defaults, config file, environment and `argv` (sys.argv[1:] if
+    None), then auto-size. Raises ValueError on bad values.
+    """
+    env = os.environ if env is None else env
+    args = arg_parser().parse_args(argv)
+    config = EngineConfig()
+    names = {f.name for f in fields(EngineConfig)}
+
+    path = args.config or env.get(ENV_PREFIX + "CONFIG") or CONFIG_PATH
+    if args.config or os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+        unknown = set(data) - names
+        if unknown:
+            raise ValueError(f"unknown config keys: {', '.join(sorted(unknown))}")
+        for name, value in data.items():
+            setattr(config, name, _coerce(name, value))
+
+    for name in names:
+        key = ENV_PREFIX + ("PATH" if name == "engine_path" else name.upper())
+        if key in env and name != "options":
+            setattr(config, name, _coerce(name, env[key]))
+
+    for name, value in vars(args).items():
+        if name == "config" or value is None:
+            continue
+        if name == "options":
+            config.options = {**config.options, **dict(value)}
+        else:
+            setattr(config, name, value)
+
+    return auto_size(config.validate(), cores, memory)
+
+
+def runtime_changes(data, current: dict) -> dict:
+    """
+    Validated subset of RUNTIME_FIELDS from a /config request body, checked
+    against the engine's `current` settings and bounded by this machine
+    (threads up to its cores, hash up to MAX_HASH_MB). Only RUNTIME_OPTIONS
+    may be set. Raises ValueError.
+    """
+    if not isinstance(data, dict) or not data:
+        raise ValueError("expected a JSON object")
+    unknown = set(data) - set(RUNTIME_FIELDS)
+    if unknown:
+        raise ValueError(f"not changeable at runtime: {', '.join(sorted(unknown))}")
+
+    kinds = {f.name: f.type for f in fields(EngineConfig)}
+    limits = {
+        "threads": machine_cores(), "hash_mb": MAX_HASH_MB, "multipv": MAX_MULTIPV,
+        "base_time": MAX_TIME, "step_time": MAX_TIME, "max_time": MAX_TIME,
+    }
+    for name, value in data.items():
+        if name == "options":
+            if not isinstance(value, dict):
+                raise ValueError("options must be an object")
+            refused = set(value) - set(RUNTIME_OPTIONS)
+            if refused:
+                raise ValueError(f"not settable at runtime: {', '.join(sorted(refused))}")
+            if not all(isinstance(v, (bool, int, str)) for v in value.values()):
+                raise ValueError("option values must be strings, numbers or booleans")
+            continue
+        numeric = int if kinds[name] in (int, "int") else (int, float)
+        if isinstance(value, bool) or not isinstance(value, numeric) or value <= 0:
+            raise ValueError(f"{name} must be a positive number")
+        if value > limits[name]:
+            raise ValueError(f"{name} must be <= {limits[name]}")
+
+    merged = {**current, **data}
+    if merged["base_time"] > merged["max_time"]:
+        raise ValueError("need base_time <= max_time")
+    return {name: _coerce(name, value) for name, value in data.items()}
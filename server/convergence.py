@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class Convergence:
+    """
+    How one position's analysis settles across search iterations.
+    - update(result) counts consecutive iterations whose best move is
+      unchanged and whose eval moved by at most eval_margin (pawns);
+      anything else resets the count and sets `changed`.
+    - `converged` once `iterations` stable iterations were seen in a row
+      (iterations=0 never converges this way) or the result reached
+      target_depth (0: no target).
+    """
+
+    iterations: int = 0
+    eval_margin: float = 0.15
+    target_depth: int = 0
+
+    best: str | None = None
+    eval: float = 0.0
+    stable: int = 0
+    changed: bool = False
+    converged: bool = False
+
+    def update(self, result) -> bool:
+        if not result.lines:
+            return self.converged
+        line = result.lines[0]
+        if self.best is None:
+            self.changed = False
+        else:
+            self.changed = line.move != self.best or abs(line.eval - self.eval) > self.eval_margin
+            self.stable = 0 if self.changed else self.stable + 1
+        self.best = line.move
+        self.eval = line.eval
+
+        if self.iterations and self.stable >= self.iterations:
+            self.converged = True
+        if self.target_depth and result.depth >= self.target_depth:
+            self.converged = True
+        return self.converged
+
+    def next_budget(self, budget: float, step_time: float, max_time: float) -> float:
+        """
+        Grow the per-iteration budget by step_time, twice that while the
+        best line keeps changing.
+        """
+        step = step_time * 2 if self.changed else step_time
+        return min(budget + step, max_time)
@@ -1,213 +1,618 @@
+import hmac
 import json
-import atexit
+import re
+import threading
 import chess
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
 from urllib.parse import urlparse, parse_qs
 
-from server.chess_state import SandboxState
 from server.analysis import StockfishAnalysisEngine
+from server.book import OpeningBook
+from server.cache import PositionCache
+from server.config import load_config, runtime_changes
+from server.pool import EnginePool
+from server.responses import ResponseCache
+from server.sessions import SessionManager
+from server.single_flight import SingleFlight
+from server.store import AnalysisStore
+from server.tablebase import EndgameTablebase
+from server import wire
 
 
 HOST = "0.0.0.0"
 PORT = 8000
-STOCKFISH_PATH = "/opt/homebrew/bin/stockfish"
-
-
-def make_handler(state, engine):
-    last_fen = None
-    last_analysis = None
+KEEPALIVE_TIMEOUT = 15.0  # seconds an idle keep-alive connection stays open
+LONGPOLL_TIMEOUT = 20.0   # default /state?since= wait
+LONGPOLL_MAX = 60.0
+MAX_STREAMS = 64            # concurrent /stream subscribers
+STREAM_HEARTBEAT = 15.0     # seconds between keep-alive comments on /stream
+STREAM_WRITE_TIMEOUT = 5.0  # a subscriber that can't take an event is dropped
+SESSION_IDLE_TIMEOUT = 600.0  # seconds before an unused session is evicted
+MAX_SESSIONS = 1024
+MAX_BATCH = 32  # commands per /batch request
+LISTEN_BACKLOG = 128  # pending connections the listening socket queues
+ANALYSIS_DB_PATH = "analysis.sqlite3"  # persistent analysis, reused across restarts
+ENGINE_IDLE_AFTER = 30.0  # seconds a position is searched after its last watcher left
+
+
+SESSION_ID = re.compile(r"[A-Za-z0-9_.:-]{1,64}")
+
+
+def make_handler(
+    state, engine, idle_timeout=KEEPALIVE_TIMEOUT, sessions=None, cache_responses=True,
+    config_token=None,
+):
+    # requests without a session id use `state`
+    if sessions is None:
+        sessions = SessionManager(default=state)
+
+    # non-live engines: remember results per position, so undo or a
+    # transposition doesn't re-run the engine
+    cache = PositionCache(256)
+    # concurrent requests for a position being analysed wait for that
+    # analysis instead of starting their own
+    flights = SingleFlight()
+    # encoded /state, /snapshot and /stream bodies per state version, so
+    # repeated polls of an unchanged position skip building and encoding
+    responses = ResponseCache() if cache_responses else None
+
+    streams = 0
+    streams_lock = threading.Lock()
+
+    # live engines publish deeper results in the background; each one is a
+    # new state version for the sessions showing that position
+    if hasattr(engine, "add_position_listener"):
+        engine.add_position_listener(sessions.position_changed)
+    elif hasattr(engine, "add_listener"):
+        engine.add_listener(sessions.mark_all_changed)
+
+    # engines that pause when nobody watches learn about clients that are
+    # served without an analyse() call (cached bodies, long-polls, streams)
+    touch = getattr(engine, "touch", None)
+
+    def watching(state):
+        if touch is not None:
+            touch(state.position_key())
+
+    def get_analysis(state, board, key, fresh=False):
+        if getattr(engine, "live", False):
+            return engine.analyse(board)  # live-updating
+
+        entry = cache.get(key)
+        if not fresh and entry is not None:
+            return entry.result
+
+        def compute():
+            analysis = engine.analyse(board)
+            cache.put(key, analysis)
+            return analysis
+
+        analysis = flights.do(key, compute)
+        if entry is not None and analysis != entry.result:
+            state.mark_changed()
+        return analysis
+
+    def snapshot(state, moves=False):
+        # Snapshot the board under the state lock, then analyse outside
+        # of it so a slow engine never blocks commands.
+        with state.lock:
+            index = state.move_index() if moves else None
+            return state.version, state.board.copy(), state.position_key(), index
+
+    def snapshot_response(version, board, analysis, index):
+        # state plus the whole legal-move tree, so a client can walk its
+        # piece and move menus without further requests
+        response = state_response(version, board, analysis)
+        response["type"] = "snapshot"
+        response["moves"] = {sq: "".join(to) for sq, to in index.targets.items()}
+        response["promotions"] = {sq: "".join(to) for sq, to in index.promotions.items()}
+        return response
+
+    def line_json(line):
+        if line.weight is None:
+            return {"move": line.move, "eval": line.eval}
+        return {"move": line.move, "eval": line.eval, "weight": line.weight}
+
+    def state_response(version, board, analysis):
+        checkmate = board.is_checkmate()
+
+        winner = None
+        if checkmate:
+            winner = "white" if not board.turn else "black"
+
+        return {
+            "type": "state",
+            "version": version,
+            "turn": "white" if board.turn else "black",
+            "move_number": board.fullmove_number,
+            "last_move": (board.peek().uci() if board.move_stack else None),
+
+            "game_over": board.is_game_over(),
+            "checkmate": checkmate,
+            "stalemate": board.is_stalemate(),
+            "winner": winner,
+
+            "analysis": {
+                "depth": analysis.depth,
+                "lines": [line_json(l) for l in analysis.lines],
+                "pending": analysis.pending,
+                "stale": analysis.stale,
+                "book": analysis.book,
+                "tablebase": analysis.tablebase,
+                "converged": analysis.converged,
+                "error": analysis.error,
+            },
+        }
+
+    def encoded_state(state, path, binary, fresh=False):
+        """
+        (version, body) of /state or /snapshot in the requested format,
+        served from the response cache while the version holds.
+        """
+        fmt = (path, binary)
+        if responses is not None and not fresh:
+            version = state.version
+            body = responses.get(state, fmt, version)
+            if body is not None:
+                return version, body
+
+        version, board, key, index = snapshot(state, moves=path == "/snapshot")
+        analysis = get_analysis(state, board, key, fresh)
+        if binary and path == "/snapshot":
+            body = wire.encode_snapshot(version, board, analysis, index)
+        elif binary:
+            body = wire.encode_state(version, board, analysis)
+        else:
+            if path == "/snapshot":
+                response = snapshot_response(version, board, analysis, index)
+            else:
+                response = state_response(version, board, analysis)
+            body = json.dumps(response, separators=(",", ":")).encode()
+
+        if responses is not None and not fresh:
+            responses.put(state, fmt, version, body)
+        return version, body
+
+    # POST commands, shared by their own endpoints and /batch; each
+    # returns (status, response)
+    def play_move(state, body):
+        if not body or "move" not in body:
+            return 400, {"type": "error", "reason": "missing_move"}
+        try:
+            state.play(body["move"])
+        except Exception:
+            return 200, {"type": "move_result", "ok": False, "reason": "illegal_move"}
+        return 200, {"type": "move_result", "ok": True}
+
+    def undo(state, body):
+        with state.lock:
+            ok = state.undo()
+        return 200, {"type": "move_result", "ok": ok}
+
+    def reset(state, body):
+        state.reset()
+        return 200, {"type": "move_result", "ok": True}
+
+    def move_list(state, body):
+        if not body or "from" not in body:
+            return 400, {"type": "error", "reason": "missing_from"}
+
+        from_str = body["from"]
+        try:
+            chess.parse_square(from_str)
+        except Exception:
+            return 400, {"type": "error", "reason": "invalid_square"}
+
+        index = state.move_index()
+        return 200, {
+            "type": "move_list",
+            "from": from_str,
+            "moves": index.moves_from(from_str),
+            "promotions": index.promotions_from(from_str),
+        }
+
+    COMMANDS = {
+        "play_move": play_move,
+        "undo": undo,
+        "reset": reset,
+        "move_list": move_list,
+    }
+
+    def run_batch(state, commands, binary=False):
+        """
+        Run `commands` in order under the state lock, so no other client's
+        command lands in between. "state" and "snapshot" commands capture
+        the board at their point in the batch; their analysis is looked
+        up after the lock is released. With binary, those results are
+        wire-encoded bytes.
+        """
+        results = []
+        with state.lock:
+            for cmd in commands:
+                kind = cmd.get("type")
+                if kind in ("state", "snapshot"):
+                    results.append((kind, snapshot(state, moves=kind == "snapshot")))
+                elif kind in COMMANDS:
+                    results.append(COMMANDS[kind](state, cmd)[1])
+                else:
+                    results.append({"type": "error", "reason": "unknown_command"})
+
+        for i, result in enumerate(results):
+            if isinstance(result, tuple):
+                kind, (version, board, key, index) = result
+                analysis = get_analysis(state, board, key)
+                if binary and kind == "snapshot":
+                    results[i] = wire.encode_snapshot(version, board, analysis, index)
+                elif binary:
+                    results[i] = wire.encode_state(version, board, analysis)
+                elif kind == "snapshot":
+                    results[i] = snapshot_response(version, board, analysis, index)
+                else:
+                    results[i] = state_response(version, board, analysis)
+        return results
 
     class Handler(BaseHTTPRequestHandler):
-        def do_GET(self):
-            nonlocal last_fen, last_analysis
+        # HTTP/1.1 keeps connections open between requests; idle
+        # connections are dropped after `timeout` seconds.
+        protocol_version = "HTTP/1.1"
+        timeout = idle_timeout
+        # headers and body go out as separate writes; without this, Nagle
+        # plus delayed ACKs add ~40 ms to every reused-connection response
+        disable_nagle_algorithm = True
+
+        max_streams = MAX_STREAMS
+        stream_heartbeat = STREAM_HEARTBEAT
+        stream_write_timeout = STREAM_WRITE_TIMEOUT
 
+        def do_GET(self):
             parsed = urlparse(self.path)
             path = parsed.path
             qs = parse_qs(parsed.query)
+            state = self._session(qs)
+            if state is None:
+                return
             fresh = qs.get("fresh", ["0"])[0] in ("1", "true", "yes")
-
-            if path == "/state":
-                board = state.board
-
-                if getattr(engine, "live", False):
-                    analysis = engine.analyse(board)  # live-updating
-                else:
-                    fen = board.fen()
-                    if fresh or last_analysis is None or fen != last_fen:
-                        analysis = engine.analyse(board)
-                        last_analysis = analysis
-                        last_fen = fen
-                    else:
-                        analysis = last_analysis
-
-                board = state.board
-
-                game_over = board.is_game_over()
-                checkmate = board.is_checkmate()
-                stalemate = board.is_stalemate()
-
-                winner = None
-                if checkmate:
-                    winner = "white" if not board.turn else "black"
-
-                response = {
-                    "type": "state",
-                    "turn": "white" if board.turn else "black",
-                    "move_number": board.fullmove_number,
-                    "last_move": (board.peek().uci() if board.move_stack else None),
-
-                    "game_over": game_over,
-                    "checkmate": checkmate,
-                    "stalemate": stalemate,
-                    "winner": winner,
-
-                    "analysis": {
-                        "depth": analysis.depth,
-                        "lines": [{"move": l.move, "eval": l.eval} for l in analysis.lines],
-                    },
+            binary = self._wants_binary(qs)
+
+            if path in ("/state", "/snapshot"):
+                watching(state)
+                # each representation gets its own ETag
+                tag = ("" if path == "/state" else "s") + ("b" if binary else "")
+                if "since" in qs:
+                    # long-poll: park until board or analysis moves past
+                    # `since`, answer 304 if nothing happened in time
+                    try:
+                        since = int(qs["since"][0])
+                        timeout = float(qs.get("timeout", [LONGPOLL_TIMEOUT])[0])
+                    except ValueError:
+                        return self._send_json(400, {"type": "error", "reason": "invalid_since"})
+
+                    timeout = max(0.0, min(timeout, LONGPOLL_MAX))
+                    if since > state.version:
+                        # a version from before a restart or a recreated
+                        # session: resync now instead of waiting it out
+                        since = -1
+                    version = state.wait_for_change(since, timeout)
+                    watching(state)
+                    if version <= since:
+                        return self._send_not_modified(f'"{tag}{version}"')
+
+                etag = f'"{tag}{state.version}"'
+                if not fresh and self.headers.get("If-None-Match") == etag:
+                    return self._send_not_modified(etag)
+
+                version, body = encoded_state(state, path, binary, fresh)
+                content_type = wire.CONTENT_TYPE if binary else "application/json"
+                return self._send_body(200, body, content_type, {"ETag": f'"{tag}{version}"'})
+
+            if path == "/stream":
+                return self._stream(state)
+
+            if path == "/stats":
+                stats = {
+                    "type": "stats",
+                    "version": state.version,
+                    "analysis_cache": cache.stats(),
+                    "coalescing": flights.stats(),
+                    "sessions": sessions.stats(),
                 }
-                return self._send_json(200, response)
-
-            if path == "/piece_list":
-                seen = set()
-                pieces = []
-
-                for mv in state.board.legal_moves:
-                    from_sq = chess.square_name(mv.from_square)
-                    if from_sq in seen:
-                        continue
-                    seen.add(from_sq)
+                if responses is not None:
+                    stats["responses"] = responses.stats()
+                if hasattr(engine, "stats"):
+                    stats.update(engine.stats())
+                return self._send_json(200, stats)
 
-                    piece = state.board.piece_at(mv.from_square)
-                    if piece is None:
-                        continue
+            if path == "/config" and hasattr(engine, "settings"):
+                return self._send_json(200, {"type": "config", **engine.settings()})
 
-                    pieces.append(from_sq)
-
-                pieces.sort()
+            if path == "/piece_list":
+                if binary:
+                    return self._send_binary(200, wire.encode_piece_list(state.move_index().squares))
                 return self._send_json(200, {
                     "type": "piece_list",
-                    "pieces": pieces,
+                    "pieces": state.move_index().squares,
                 })
 
-            self.send_response(404)
-            self.end_headers()
+            self._send_empty(404)
 
         def do_POST(self):
-            nonlocal last_fen, last_analysis
-
-            if self.path == "/play_move":
-                body = self.read_json()
-                if not body or "move" not in body:
-                    return self._send_json(400, {"type": "error", "reason": "missing_move"})
-
-                move = body["move"]
-                try:
-                    state.board.push_uci(move)
-                    last_fen = None
-                    last_analysis = None
-                    return self._send_json(200, {"type": "move_result", "ok": True})
-                except Exception:
-                    return self._send_json(
-                        200,
-                        {"type": "move_result", "ok": False, "reason": "illegal_move"},
-                    )
-
-            if self.path == "/undo":
-                ok = state.undo()
-                last_fen = None
-                last_analysis = None
-                return self._send_json(200, {"type": "move_result", "ok": ok})
-
-            if self.path == "/move_list":
-                body = self.read_json()
-                if not body or "from" not in body:
-                    return self._send_json(400, {"type": "error", "reason": "missing_from"})
-
-                from_str = body["from"]
-                try:
-                    from_sq = chess.parse_square(from_str)
-                except Exception:
-                    return self._send_json(400, {"type": "error", "reason": "invalid_square"})
-
-                moves = sorted(
-                    {
-                        chess.square_name(mv.to_square)
-                        for mv in state.board.legal_moves
-                        if mv.from_square == from_sq
-                    }
-                )
-                return self._send_json(200, {"type": "move_list", "from": from_str, "moves": moves})
-
-            if self.path == "/reset":
-                state.board.reset()
-                state.mode = state.ROOT
-                state.cursor = 0
-                state.selected_from = None
-                state.moves = []
-                state.update_pieces()
-
-                last_fen = None
-                last_analysis = None
-
-                return self._send_json(200, {"type": "move_result", "ok": True})
-            
-            
-            self.send_response(404)
-            self.end_headers()
+            # Always consume the body so the next request on a keep-alive
+            # connection starts at a clean boundary.
+            self.body = self._read_body()
+            parsed = urlparse(self.path)
+            path = parsed.path
+            state = self._session(parse_qs(parsed.query))
+            if state is None:
+                return
+
+            if path == "/batch":
+                return self._batch(state, parse_qs(parsed.query))
+            if path == "/config" and hasattr(engine, "reconfigure"):
+                return self._configure()
+
+            command = COMMANDS.get(path[1:])
+            if command is None:
+                return self._send_empty(404)
+
+            body = self.read_json()
+            if path == "/move_list" and self._wants_binary(parse_qs(parsed.query)):
+                with state.lock:
+                    status, response = command(state, body)
+                    if status == 200:
+                        encoded = wire.encode_move_list(state.move_index(), response["from"])
+                if status == 200:
+                    return self._send_binary(200, encoded)
+                return self._send_json(status, response)
+
+            status, response = command(state, body)
+            return self._send_json(status, response)
 
         def log_message(self, *_):
             pass
 
-        def read_json(self):
+        def _session(self, qs):
+            """
+            SandboxState for the request's session (X-Session-Id header or
+            ?session=), or None after sending an error response.
+            """
+            session_id = self.headers.get("X-Session-Id") or qs.get("session", [""])[0]
+            if session_id and not SESSION_ID.fullmatch(session_id):
+                self._send_json(400, {"type": "error", "reason": "invalid_session"})
+                return None
+            state = sessions.get(session_id)
+            if state is None:
+                self._send_json(503, {"type": "error", "reason": "too_many_sessions"})
+            return state
+
+        def _batch(self, state, qs):
+            body = self.read_json()
+            commands = body.get("commands") if isinstance(body, dict) else None
+            if (
+                not isinstance(commands, list)
+                or not all(isinstance(cmd, dict) for cmd in commands)
+            ):
+                return self._send_json(400, {"type": "error", "reason": "invalid_batch"})
+            if len(commands) > MAX_BATCH:
+                return self._send_json(400, {"type": "error", "reason": "batch_too_large"})
+
+            if self._wants_binary(qs) and commands and commands[-1].get("type") in (
+                "state", "snapshot"
+            ):
+                # command plus new state in one round trip: a binary
+                # client gets just the state the batch ends with
+                return self._send_binary(200, run_batch(state, commands, binary=True)[-1])
+            return self._send_json(200, {"type": "batch", "results": run_batch(state, commands)})
+
+        def _configure(self):
+            """
+            Change engine settings for every session; the engine keeps its
+            results. Only with a configured token, sent as a bearer token.
+            """
+            if not config_token:
+                return self._send_json(403, {"type": "error", "reason": "config_disabled"})
+            scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+            if scheme != "Bearer" or not hmac.compare_digest(
+                token.encode(), config_token.encode()
+            ):
+                return self._send_json(401, {"type": "error", "reason": "unauthorized"})
+            try:
+                changes = runtime_changes(self.read_json(), engine.settings())
+                engine.reconfigure(**changes)
+            except ValueError:
+                return self._send_json(400, {"type": "error", "reason": "invalid_config"})
+            return self._send_json(200, {"type": "config", **engine.settings()})
+
+        def _stream(self, state):
+            """
+            Server-sent events: one `state` event per new version, with
+            heartbeat comments in between. Each subscriber only ever gets
+            the latest state (versions it missed are coalesced), and one
+            that can't accept a write within stream_write_timeout is
+            dropped, so nothing is buffered per subscriber.
+            """
+            nonlocal streams
+
+            with streams_lock:
+                if streams >= self.max_streams:
+                    return self._send_json(503, {"type": "error", "reason": "too_many_streams"})
+                streams += 1
+
+            try:
+                # resume after a reconnect instead of resending the same state
+                try:
+                    version = int(self.headers.get("Last-Event-ID", -1))
+                except ValueError:
+                    version = -1
+                if version > state.version:
+                    # an id from before a restart or a recreated session
+                    version = -1
+
+                self.close_connection = True
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.connection.settimeout(self.stream_write_timeout)
+
+                while True:
+                    watching(state)
+                    if state.wait_for_change(version, self.stream_heartbeat) > version:
+                        version, data = encoded_state(state, "/state", False)
+                        event = b"id: %d\nevent: state\ndata: %s\n\n" % (version, data)
+                    else:
+                        event = b": ping\n\n"
+                    self.wfile.write(event)
+            except OSError:
+                pass  # subscriber went away or was too slow
+            finally:
+                with streams_lock:
+                    streams -= 1
+
+        def _read_body(self):
             length = int(self.headers.get("Content-Length", 0))
             if length <= 0:
+                return b""
+            return self.rfile.read(length)
+
+        def read_json(self):
+            if not self.body:
                 return None
-            raw = self.rfile.read(length)
             try:
-                return json.loads(raw)
+                return json.loads(self.body)
             except Exception:
                 return None
 
-        def _send_json(self, code, obj):
-            body = json.dumps(obj).encode()
+        def _send_json(self, code, obj, headers=None):
+            self._send_body(code, json.dumps(obj).encode(), "application/json", headers)
+
+        def _send_body(self, code, body, content_type, headers=None):
             self.send_response(code)
-            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Type", content_type)
             self.send_header("Content-Length", str(len(body)))
+            if content_type == wire.CONTENT_TYPE:
+                self.send_header("Vary", "Accept")
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
             self.end_headers()
             self.wfile.write(body)
 
-        def log_message(self, *_):
-            pass
-
-    return Handler
-
-
-def make_http_server(host, port, state, engine):
-    return HTTPServer((host, port), make_handler(state, engine))
+        def _wants_binary(self, qs):
+            # negotiated per request; errors and commands stay JSON
+            return (
+                wire.CONTENT_TYPE in self.headers.get("Accept", "")
+                or qs.get("format", [""])[0] == "bin"
+            )
 
+        def _send_binary(self, code, body, headers=None):
+            self._send_body(code, body, wire.CONTENT_TYPE, headers)
 
-state = SandboxState()
-engine = StockfishAnalysisEngine(
-    engine_path=STOCKFISH_PATH,
-    base_time=0.10,   # first result latency
-    step_time=0.10,   # add per cycle
-    max_time=1.50,    # cap per cycle
-    interval=1.0,     # update cadence (seconds)
-    multipv=3,
-)
+        def _send_not_modified(self, etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
 
+        def _send_empty(self, code):
+            self.send_response(code)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
 
-@atexit.register
-def shutdown():
-    engine.stop()
+    return Handler
 
 
-def main():
+def make_http_server(
+    host, port, state, engine, threaded=True, idle_timeout=KEEPALIVE_TIMEOUT,
+    sessions=None, cache_responses=True, config_token=None,
+):
+    """
+    Build the HTTP server. By default every request gets its own thread,
+    so a slow analysis never stalls other polls or commands; pass
+    threaded=False for the old one-request-at-a-time behaviour.
+    POST /config is refused unless `config_token` is set.
+    """
+    server_class = ThreadingHTTPServer if threaded else HTTPServer
+    handler = make_handler(
+        state, engine, idle_timeout, sessions, cache_responses, config_token
+    )
+    server = server_class((host, port), handler, bind_and_activate=False)
+    # the default backlog of 5 resets connections when many devices
+    # reconnect at once
+    server.request_queue_size = LISTEN_BACKLOG
+    try:
+        server.server_bind()
+        server.server_activate()
+    except BaseException:
+        server.server_close()
+        raise
+    return server
+
+
+def make_engine(config, store=None, book=None, tablebase=None):
+    """
+    The server's engine for `config`: by default one EnginePool shared by
+    every session, where identical positions share analysis. With
+    single_board, one StockfishAnalysisEngine that follows the last board
+    asked about with a continuous search and pre-analyses the likely
+    replies; sessions on different positions take it away from each
+    other, so it suits a single device.
+    """
+    common = dict(
+        engine_path=config.command(),
+        threads=config.threads,
+        hash_mb=config.hash_mb,
+        options=config.options,
+        base_time=config.base_time,  # first result latency
+        step_time=config.step_time,  # add per slice / cycle
+        max_time=config.max_time,    # cap per slice / cycle
+        multipv=config.multipv,
+        converge_iterations=4,  # stop once the best line held for 4 searches
+        store=store,
+        book=book,
+        tablebase=tablebase,
+    )
+    if config.single_board:
+        return StockfishAnalysisEngine(
+            **common,
+            nonblocking=True,  # /state never waits for the engine
+            continuous=True,   # one streaming search per position
+            speculate=3,       # pre-analyse the top replies once settled
+            idle_after=ENGINE_IDLE_AFTER,
+        )
+    return EnginePool(**common, size=config.pool_size, expire_after=ENGINE_IDLE_AFTER)
+
+
+def main(argv=None):
+    """
+    Serve with engine settings from server_config.json, CHESS_ENGINE_*
+    variables and command-line flags (see server/config.py).
+    """
+    config = load_config(argv)
+    sessions = SessionManager(idle_timeout=SESSION_IDLE_TIMEOUT, max_sessions=MAX_SESSIONS)
+    store = AnalysisStore(ANALYSIS_DB_PATH)
+    book = OpeningBook(config.book_paths) if config.book_paths else None
+    tablebase = EndgameTablebase(config.syzygy_paths) if config.syzygy_paths else None
+    engine = make_engine(config, store, book, tablebase)
+
+    mode = "single board" if config.single_board else f"pool of {config.pool_size}"
+    print(
+        f"Engine {config.engine_path}: {mode}, {config.threads} threads, "
+        f"{config.hash_mb} MB hash each"
+    )
     print(f"Server running on {HOST}:{PORT}")
-    httpd = make_http_server(HOST, PORT, state, engine)
-    httpd.serve_forever()
+    httpd = make_http_server(
+        HOST, PORT, sessions.default, engine, sessions=sessions,
+        config_token=config.config_token,
+    )
+    try:
+        httpd.serve_forever()
+    finally:
+        engine.stop()
+        store.close()
+        if book is not None:
+            book.close()
+        if tablebase is not None:
+            tablebase.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
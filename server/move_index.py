@@ -0,0 +1,56 @@
+from dataclasses import dataclass
+
+import chess
+
+
+@dataclass
+class MoveIndex:
+    """
+    Legal moves of one position, grouped by from-square.
+    - targets: from-square -> sorted to-squares ("e2" -> ["e3", "e4"])
+    - promotions: from-square -> to-squares reached by promoting
+    - squares: sorted from-squares with at least one legal move
+    - labels: "<square> <piece>" per from-square, the piece menu entries
+    """
+
+    targets: dict[str, list[str]]
+    promotions: dict[str, list[str]]
+    squares: list[str]
+    labels: list[str]
+
+    @classmethod
+    def build(cls, board: chess.Board) -> "MoveIndex":
+        targets = {}
+        promotions = {}
+        for move in board.legal_moves:
+            from_sq = chess.square_name(move.from_square)
+            to_sq = chess.square_name(move.to_square)
+            targets.setdefault(from_sq, set()).add(to_sq)
+            if move.promotion:
+                promotions.setdefault(from_sq, set()).add(to_sq)
+
+        squares = sorted(targets)
+        labels = [
+            f"{sq} {board.piece_at(chess.parse_square(sq)).symbol().lower()}"
+            for sq in squares
+        ]
+        return cls(
+            targets={sq: sorted(to) for sq, to in targets.items()},
+            promotions={sq: sorted(to) for sq, to in promotions.items()},
+            squares=squares,
+            labels=labels,
+        )
+
+    def moves_from(self, from_sq: str) -> list[str]:
+        return self.targets.get(from_sq, [])
+
+    def promotions_from(self, from_sq: str) -> list[str]:
+        return self.promotions.get(from_sq, [])
+
+    def uci(self, from_sq: str, to_sq: str, promote: str = "q") -> str:
+        """
+        UCI for a menu move; promotions default to a queen.
+        """
+        if to_sq in self.promotions_from(from_sq):
+            return from_sq + to_sq + promote
+        return from_sq + to_sq
@@ -0,0 +1,529 @@
+from dataclasses import dataclass, replace
+import logging
+import os
+import threading
+import time
+
+import chess
+import chess.engine
+
+from server.analysis import AnalysisResult, info_to_result, placeholder, uci_options
+from server.cache import PositionCache, position_key
+from server.convergence import Convergence
+
+log = logging.getLogger(__name__)
+
+ACTIVE = 0       # a client polled the position recently
+BACKGROUND = 1   # submitted or no longer polled
+
+
+def default_pool_size(threads_per_engine: int = 1) -> int:
+    """
+    One engine process per `threads_per_engine` cores.
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, threads_per_engine))
+
+
+@dataclass
+class PoolTask:
+    board: chess.Board
+    budget: float
+    seen_at: float     # last analyse() or submit(); for expiry
+    queued_at: float   # since when it has been waiting for a slice
+    polled_at: float = float("-inf")  # last analyse()
+    latest: AnalysisResult | None = None
+    search: object = None   # in-flight AnalysisResult from python-chess
+    running: bool = False
+    guarded: bool = False   # picked by the starvation guard; not preemptible
+    preempted: bool = False
+    started_at: float = 0.0
+    slices: int = 0
+    convergence: Convergence | None = None
+    converged: bool = False  # settled; not scheduled again
+
+
+class EnginePool:
+    """
+    N engine processes shared by every position being analysed.
+    - analyse(board) marks the position as actively polled and returns
+      its latest result (or a pending placeholder) without searching on
+      the caller's thread.
+    - submit(board) queues a position at background priority.
+    - Each worker owns one process and repeatedly takes the most urgent
+      position for one time slice (base_time, growing by step_time up to
+      max_time, like the single-engine cycle mode).
+    - converge_iterations=N: a position whose best move and eval held for
+      N slices (or that reached target_depth) is published as
+      `converged` and gets no more slices; while its best line keeps
+      changing, its budget grows twice as fast.
+    - Scheduling: actively polled positions first, then background ones,
+      oldest first. A position that has waited starvation_time is served
+      next regardless of priority. An active position that finds every
+      worker busy preempts a background slice.
+    - Positions not polled (analyse() or touch()) for expire_after seconds
+      are dropped, so with no client watching the workers go idle; their
+      results stay in the cache for when a client comes back.
+    - With a `book` (OpeningBook), positions without a result yet are
+      answered with book moves while they are searched.
+    - With a `tablebase` (EndgameTablebase), covered endgames are answered
+      exactly and never queued.
+    - Results go into a shared PositionCache, so identical positions from
+      different boards share one task and one result; listeners are
+      called on every publish.
+    - A worker whose engine fails to start, or dies while running, logs
+      why and exits; the error is reported in stats() and on pending
+      results, and start() (called by every analyse()) brings up missing
+      workers again at most every retry_after seconds.
+    - threads, hash_mb and options are each process's UCI options;
+      reconfigure() changes them and the time controls while running,
+      each worker applying them between slices. The pool size is fixed.
+    """
+
+    live = True
+
+    def __init__(
+        self,
+        engine_path,
+        size: int | None = None,
+        threads: int = 1,
+        base_time: float = 0.10,
+        step_time: float = 0.10,
+        max_time: float = 1.50,
+        multipv: int = 3,
+        cache_size: int = 4096,
+        store=None,
+        active_window: float = 2.0,
+        starvation_time: float = 2.0,
+        expire_after: float = 30.0,
+        book=None,
+        tablebase=None,
+        converge_iterations: int = 0,
+        eval_margin: float = 0.15,
+        target_depth: int = 0,
+        hash_mb: int = 0,
+        options=None,
+        retry_after: float = 5.0,
+    ):
+        self.engine_path = engine_path
+        self.size = size or default_pool_size(threads)
+        self.threads = threads
+        self.hash_mb = hash_mb
+        self.options = dict(options or {})
+        self.retry_after = retry_after
+        self.base_time = base_time
+        self.step_time = step_time
+        self.max_time = max_time
+        self.multipv = multipv
+        self.cache = PositionCache(cache_size, store=store)
+        self.active_window = active_window
+        self.starvation_time = starvation_time
+        self.expire_after = expire_after
+        self.book = book
+        self.tablebase = tablebase
+        self.converge_iterations = converge_iterations
+        self.eval_margin = eval_margin
+        self.target_depth = target_depth
+
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._tasks = {}  # position_key -> PoolTask
+        self._engines = []
+        self._threads = []
+        self._stop = threading.Event()
+        self._listeners = []
+        self._position_listeners = []
+        self._config_version = 0  # bumped by reconfigure(); workers catch up
+        self.error = None  # why the last engine failed to start
+        self.start_failures = 0
+        self._failed_at = float("-inf")
+
+        self._ready = []  # when each worker's engine came up
+        self._busy = 0
+        self._busy_time = 0.0
+        self.slices = 0
+        self.preemptions = 0
+        self.starvation_picks = 0
+
+    def start(self):
+        with self._lock:
+            missing = self.size - len(self._threads)
+            if missing <= 0 or time.monotonic() - self._failed_at < self.retry_after:
+                return
+            for _ in range(missing):
+                t = threading.Thread(target=self._worker, daemon=True)
+                self._threads.append(t)
+                t.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._work.notify_all()
+            for task in self._tasks.values():
+                if task.search is not None:
+                    task.search.stop()
+        for t in list(self._threads):
+            t.join(timeout=2.0)
+        self._threads = []
+
+        for engine in self._engines:
+            try:
+                engine.quit()
+            except Exception:
+                # died already; the rest of shutdown must still run
+                engine.close()
+        self._engines = []
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def add_position_listener(self, fn):
+        """
+        Like add_listener(), but `fn` gets the position_key() of the
+        position whose analysis was published.
+        """
+        self._position_listeners.append(fn)
+
+    def _notify(self, key):
+        for fn in self._listeners:
+            fn()
+        for fn in self._position_listeners:
+            fn(key)
+
+    def _load(self, key: int):
+        """
+        Pull a new position's result from the store into the memory cache
+        before taking the pool lock, so _task() never waits on disk.
+        """
+        if key not in self._tasks:
+            self.cache.get(key)
+
+    def _task(self, board: chess.Board, key: int, now: float):
+        task = self._tasks.get(key)
+        if task is None:
+            entry = self.cache.peek(key)
+            task = PoolTask(
+                board=board.copy(),
+                budget=entry.budget if entry is not None else self.base_time,
+                seen_at=now,
+                queued_at=now,
+                latest=entry.result if entry is not None else None,
+                convergence=Convergence(self.converge_iterations, self.eval_margin, self.target_depth),
+                converged=entry is not None and entry.result.converged,
+            )
+            self._tasks[key] = task
+            self._work.notify()
+        task.seen_at = now
+        return task
+
+    def submit(self, board: chess.Board):
+        """
+        Queue `board` at background priority.
+        """
+        if self.tablebase is not None and self.tablebase.lookup(board) is not None:
+            return
+        self.start()
+        key = position_key(board)
+        self._load(key)
+        with self._lock:
+            self._task(board, key, time.monotonic())
+
+    def analyse(self, board: chess.Board) -> AnalysisResult:
+        if board.is_game_over():
+            return AnalysisResult(depth=0, lines=[])
+        if self.tablebase is not None:
+            exact = self.tablebase.lookup(board)
+            if exact is not None:
+                return exact
+        self.start()
+        key = position_key(board)
+        self._load(key)
+        now = time.monotonic()
+        with self._lock:
+            task = self._task(board, key, now)
+            task.polled_at = now
+            if not task.running:
+                self._preempt_for(now)
+            latest = task.latest
+
+        if latest is not None:
+            return latest
+        if self.book is not None:
+            found = self.book.lookup(board)
+            if found is not None:
+                return found
+        pending = placeholder(self.cache, board)
+        with self._lock:
+            if not self._engines:
+                pending.error = self.error
+        return pending
+
+    def touch(self, key: int):
+        """
+        A client is still watching position `key` without calling
+        analyse() (a parked long-poll, a cached response): keep its task
+        alive at active priority.
+        """
+        now = time.monotonic()
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None:
+                task.seen_at = task.polled_at = now
+
+    def _priority(self, task: PoolTask, now: float) -> int:
+        return ACTIVE if now - task.polled_at <= self.active_window else BACKGROUND
+
+    def _waiting(self):
+        return [t for t in self._tasks.values() if not t.running and not t.converged]
+
+    def _preempt_for(self, now: float):
+        # called with _lock held, for an active task that isn't running
+        if self._busy < self.size:
+            return
+        running = [
+            t for t in self._tasks.values()
+            if t.running and not t.guarded and not t.preempted
+            and self._priority(t, now) == BACKGROUND
+        ]
+        if running:
+            victim = min(running, key=lambda t: t.started_at)
+            victim.preempted = True
+            self.preemptions += 1
+            if victim.search is not None:
+                victim.search.stop()
+
+    def _pick(self, now: float):
+        """
+        Most urgent waiting task, or None. Called with _lock held.
+        """
+        for key, task in list(self._tasks.items()):
+            if not task.running and now - task.seen_at > self.expire_after:
+                del self._tasks[key]
+
+        waiting = self._waiting()
+        if not waiting:
+            return None
+
+        oldest = min(waiting, key=lambda t: t.queued_at)
+        if now - oldest.queued_at >= self.starvation_time:
+            if self._priority(oldest, now) != ACTIVE:
+                self.starvation_picks += 1
+            oldest.guarded = True
+            return oldest
+
+        return min(waiting, key=lambda t: (self._priority(t, now), t.queued_at))
+
+    def settings(self) -> dict:
+        with self._lock:
+            return {
+                "engine_path": self.engine_path,
+                "pool_size": self.size,
+                "threads": self.threads,
+                "hash_mb": self.hash_mb,
+                "multipv": self.multipv,
+                "base_time": self.base_time,
+                "step_time": self.step_time,
+                "max_time": self.max_time,
+                "options": dict(self.options),
+            }
+
+    def reconfigure(self, **changes):
+        """
+        Change threads, hash_mb, options (merged), multipv or the time
+        controls while running. Running slices finish with the old
+        settings; results and queued positions are kept. Raises ValueError
+        for option values the engine rejects, checked against a running
+        engine or, before the pool has one, a short-lived probe process.
+        """
+        with self._lock:
+            if "options" in changes:
+                changes["options"] = {**self.options, **changes["options"]}
+            check = (
+                changes.get("threads", self.threads),
+                changes.get("hash_mb", self.hash_mb),
+                changes.get("options", self.options),
+            )
+            engine = self._engines[0] if self._engines else None
+
+        if engine is not None:
+            uci_options(engine, *check)
+        else:
+            try:
+                probe = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+            except Exception as e:
+                raise ValueError(f"engine unavailable to check options: {e}") from None
+            try:
+                uci_options(probe, *check)
+            finally:
+                probe.quit()
+
+        with self._lock:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self._config_version += 1
+            self._work.notify_all()
+
+    def _configure(self, engine) -> int:
+        """
+        Send the current UCI options to a worker's engine; returns the
+        config version applied. A rejected setting is logged and the
+        engine keeps its previous ones, so the worker carries on.
+        """
+        with self._lock:
+            version = self._config_version
+            wanted = (self.threads, self.hash_mb, self.options)
+        try:
+            settings = uci_options(engine, *wanted)
+            if settings:
+                engine.configure(settings)
+        except Exception as e:
+            log.error("engine %s rejected options: %s", self.engine_path, e)
+        return version
+
+    def _start_engine(self):
+        """
+        Launch and configure this worker's engine. If it can't start,
+        record why, drop the worker and return None.
+        """
+        engine = None
+        try:
+            engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+            applied = self._configure(engine)
+        except Exception as e:
+            log.error("engine %s failed to start: %s", self.engine_path, e)
+            if engine is not None:
+                engine.close()
+            self._drop_worker(e)
+            return None
+
+        with self._lock:
+            self.error = None
+            self._engines.append(engine)
+            self._ready.append(time.monotonic())
+        return engine, applied
+
+    def _drop_worker(self, error, engine=None):
+        """
+        Record why this worker's engine is gone and remove the worker (and
+        the engine, if it had come up) so start() replaces it.
+        """
+        with self._lock:
+            self.error = f"{type(error).__name__}: {error}"
+            self.start_failures += 1
+            self._failed_at = time.monotonic()
+            self._threads.remove(threading.current_thread())
+            if engine in self._engines:
+                del self._ready[self._engines.index(engine)]
+                self._engines.remove(engine)
+
+    def _worker(self):
+        started = self._start_engine()
+        if started is None:
+            return
+        engine, applied = started
+
+        while not self._stop.is_set():
+            if applied != self._config_version:
+                applied = self._configure(engine)
+            with self._lock:
+                task = self._pick(time.monotonic())
+                if task is None:
+                    # wake up now and then to expire tasks
+                    self._work.wait(self.expire_after)
+                    continue
+                task.running = True
+                task.preempted = False
+                task.started_at = time.monotonic()
+                self._busy += 1
+                budget = task.budget
+
+            info = None
+            died = None
+            try:
+                with engine.analysis(
+                    task.board, chess.engine.Limit(time=budget), multipv=self.multipv
+                ) as search:
+                    with self._lock:
+                        task.search = search
+                        if task.preempted or self._stop.is_set():
+                            search.stop()
+                    search.wait()
+                    info = search.multipv
+            except chess.engine.EngineTerminatedError as e:
+                died = e
+            except Exception:
+                # keep the pool alive even if one engine hiccups
+                self._stop.wait(0.2)
+            finally:
+                now = time.monotonic()
+                with self._lock:
+                    task.search = None
+                    task.running = False
+                    task.guarded = False
+                    task.queued_at = now
+                    task.slices += 1
+                    self._busy -= 1
+                    self._busy_time += now - task.started_at
+                    self.slices += 1
+                    self._work.notify()
+
+            if died is not None:
+                log.error("engine %s died: %s", self.engine_path, died)
+                engine.close()
+                self._drop_worker(died, engine)
+                return
+            if info is not None:
+                self._publish(task, info_to_result(info), budget)
+
+    def _publish(self, task: PoolTask, result: AnalysisResult, budget: float):
+        if not result.lines:
+            return
+        with self._lock:
+            # a preempted slice didn't use its budget; don't grow it, and
+            # don't judge convergence by it
+            if not task.preempted:
+                if task.convergence.update(result):
+                    result.converged = task.converged = True
+                task.budget = task.convergence.next_budget(budget, self.step_time, self.max_time)
+            published = task.latest is None or result.depth >= task.latest.depth
+            if published:
+                task.latest = result
+            elif result.converged:
+                # settled below a deeper earlier result: keep that one
+                result = task.latest = replace(task.latest, converged=True)
+                published = True
+            budget = task.budget
+        key = position_key(task.board)
+        self.cache.put(key, result, budget)
+        if published:
+            self._notify(key)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            busy_time = self._busy_time + sum(
+                now - t.started_at for t in self._tasks.values() if t.running
+            )
+            capacity = sum(now - ready for ready in self._ready)
+            waiting = self._waiting()
+            pool = {
+                "size": self.size,
+                "busy": self._busy,
+                "queue_depth": len(waiting),
+                "queued_active": sum(1 for t in waiting if self._priority(t, now) == ACTIVE),
+                "tasks": len(self._tasks),
+                "utilisation": busy_time / capacity if capacity > 0 else 0.0,
+                "slices": self.slices,
+                "preemptions": self.preemptions,
+                "starvation_picks": self.starvation_picks,
+                "converged": sum(1 for t in self._tasks.values() if t.converged),
+                "search_seconds": busy_time,
+                "engines": len(self._engines),
+                "start_failures": self.start_failures,
+                "error": self.error,
+            }
+        stats = {"analysis_cache": self.cache.stats(), "pool": pool}
+        if self.book is not None:
+            stats["book"] = self.book.stats()
+        if self.tablebase is not None:
+            stats["tablebase"] = self.tablebase.stats()
+        return stats
@@ -0,0 +1,42 @@
+import threading
+import weakref
+
+
+class ResponseCache:
+    """
+    Encoded response bodies per (state, format), each valid for a single
+    state version. Every board change and analysis publish bumps the
+    version, so a lookup with the current version never returns stale
+    bytes, and a newer put() replaces the older body. Keyed weakly by
+    state, so evicted sessions drop their entries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bodies = weakref.WeakKeyDictionary()  # state -> {fmt: (version, body)}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, state, fmt, version: int):
+        with self._lock:
+            entry = self._bodies.get(state, {}).get(fmt)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, state, fmt, version: int, body: bytes):
+        with self._lock:
+            bodies = self._bodies.setdefault(state, {})
+            entry = bodies.get(fmt)
+            if entry is None or entry[0] <= version:
+                bodies[fmt] = (version, body)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "states": len(self._bodies),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
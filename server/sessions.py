@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+import threading
+import time
+
+from server.chess_state import SandboxState
+
+
+@dataclass
+class Session:
+    id: str
+    state: SandboxState
+    last_seen: float
+
+
+class SessionManager:
+    """
+    One SandboxState (board, menu, version) per session/device id.
+    - get(id) creates the session on first use and marks it as seen.
+    - Requests without an id share the `default` session, which is never
+      evicted (so single-device clients keep working unchanged).
+    - Sessions not seen for idle_timeout seconds are evicted; the sweep
+      runs from get() at most every sweep_interval.
+    - Analysis is keyed by position, not session, so sessions on the same
+      position share it; position_changed(key) bumps the version of every
+      session currently on that position.
+    """
+
+    DEFAULT = ""
+
+    def __init__(
+        self,
+        idle_timeout: float = 600.0,
+        max_sessions: int = 1024,
+        sweep_interval: float = 10.0,
+        default: SandboxState | None = None,
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self.default = default if default is not None else SandboxState()
+
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._last_sweep = time.monotonic()
+        self.created = 0
+        self.evicted = 0
+
+    def get(self, session_id: str) -> SandboxState:
+        """
+        State for `session_id`; None if the session table is full.
+        """
+        if session_id == self.DEFAULT:
+            return self.default
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now)
+
+            session = self._sessions.get(session_id)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    self._sweep(now)
+                    if len(self._sessions) >= self.max_sessions:
+                        return None
+                session = Session(session_id, SandboxState(), now)
+                self._sessions[session_id] = session
+                self.created += 1
+            session.last_seen = now
+            return session.state
+
+    def _sweep(self, now: float):
+        self._last_sweep = now
+        idle = [
+            sid for sid, s in self._sessions.items()
+            if now - s.last_seen > self.idle_timeout
+        ]
+        for sid in idle:
+            del self._sessions[sid]
+        self.evicted += len(idle)
+
+    def states(self):
+        with self._lock:
+            return [self.default] + [s.state for s in self._sessions.values()]
+
+    def position_changed(self, key: int):
+        """
+        New analysis for position `key`: bump every session showing it.
+        """
+        for state in self.states():
+            if state.position_key() == key:
+                state.mark_changed()
+
+    def mark_all_changed(self):
+        for state in self.states():
+            state.mark_changed()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_timeout": self.idle_timeout,
+                "created": self.created,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,50 @@
+from concurrent.futures import Future
+import threading
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key.
+    - do(key, fn): the first caller runs fn(); callers arriving while it
+      runs wait on the same future and get its result (or exception)
+      instead of running fn() again.
+    - Nothing is remembered once the call finishes; caching results is
+      up to the caller.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> Future
+        self.calls = 0      # fn() actually run
+        self.coalesced = 0  # callers that shared another caller's run
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = self._flights[key] = Future()
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._flights[key]
+        return future.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+            }
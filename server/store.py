@@ -0,0 +1,160 @@
+import json
+import sqlite3
+import threading
+
+from server.analysis import AnalysisLine, AnalysisResult
+
+
+class AnalysisStore:
+    """
+    On-disk analysis results keyed by Zobrist hash (SQLite).
+
+    - get() / put() mirror PositionCache, which uses the store as a
+      second level behind its in-memory LRU.
+    - put() only overwrites a stored result with a deeper (or equal) one.
+    - Size is bounded by max_entries: every read or write stamps a row
+      with an increasing sequence number, and rows not stamped within the
+      last max_entries stamps are evicted.
+    - compact() evicts and VACUUMs; eviction also runs every
+      evict_every writes.
+    """
+
+    def __init__(self, path, max_entries: int = 1_000_000, evict_every: int = 1000):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+
+        self._lock = threading.Lock()
+        self._db = None
+        self._seq = 0
+        self._touched = {}
+        self._writes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self):
+        # opened lazily so importing/constructing never touches the disk
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis ("
+                " key INTEGER PRIMARY KEY,"
+                " depth INTEGER NOT NULL,"
+                " budget REAL NOT NULL,"
+                " lines TEXT NOT NULL,"
+                " used INTEGER NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS analysis_used ON analysis (used)")
+            db.commit()
+            self._seq = db.execute("SELECT COALESCE(MAX(used), 0) FROM analysis").fetchone()[0]
+            self._db = db
+        return self._db
+
+    @staticmethod
+    def _sql_key(key: int) -> int:
+        # Zobrist hashes are unsigned 64-bit; SQLite integers are signed
+        return key - (1 << 64) if key >= (1 << 63) else key
+
+    def get(self, key):
+        """
+        Return (AnalysisResult, budget) or None.
+        """
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT depth, budget, lines FROM analysis WHERE key = ?",
+                (self._sql_key(key),),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._seq += 1
+            self._touched[self._sql_key(key)] = self._seq
+
+        depth, budget, lines = row
+        result = AnalysisResult(
+            depth=depth,
+            lines=[AnalysisLine(move=m, eval=e) for m, e in json.loads(lines)],
+        )
+        return result, budget
+
+    _UPSERT = (
+        "INSERT INTO analysis (key, depth, budget, lines, used) VALUES (?, ?, ?, ?, ?)"
+        " ON CONFLICT (key) DO UPDATE SET"
+        "  depth = excluded.depth, lines = excluded.lines,"
+        "  budget = MAX(budget, excluded.budget), used = excluded.used"
+        " WHERE excluded.depth >= analysis.depth"
+    )
+
+    def _row(self, key, result, budget):
+        self._seq += 1
+        lines = json.dumps([[l.move, l.eval] for l in result.lines], separators=(",", ":"))
+        return (self._sql_key(key), result.depth, budget, lines, self._seq)
+
+    def put(self, key, result, budget: float = 0.0):
+        self.put_many([(key, result, budget)])
+
+    def put_many(self, items):
+        """
+        Write (key, result, budget) tuples in one transaction.
+        """
+        with self._lock:
+            db = self._conn()
+            rows = [self._row(key, result, budget) for key, result, budget in items]
+            db.executemany(self._UPSERT, rows)
+            self._flush_touched()
+            db.commit()
+
+            before = self._writes
+            self._writes += len(rows)
+            if self._writes // self.evict_every != before // self.evict_every:
+                self._evict()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany(
+                "UPDATE analysis SET used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self):
+        self._db.execute(
+            "DELETE FROM analysis WHERE used <= ?", (self._seq - self.max_entries,)
+        )
+        self._db.commit()
+        self._db.execute("PRAGMA incremental_vacuum")
+
+    def compact(self):
+        """
+        Evict stale rows and rebuild the file.
+        """
+        with self._lock:
+            self._conn()
+            self._flush_touched()
+            self._evict()
+            self._db.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._flush_touched()
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn().execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
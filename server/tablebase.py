@@ -0,0 +1,154 @@
+from collections import OrderedDict
+import threading
+
+import chess
+import chess.syzygy
+
+from server.analysis import AnalysisLine, AnalysisResult
+from server.cache import position_key
+
+MATE = 100.0    # eval of a mating move, as the engine reports mate (10000 cp)
+TB_WIN = 90.0   # tablebase win, minus a hundredth per ply to the next zeroing move
+CURSED = 0.05   # won (lost) but drawn under the 50-move rule
+
+
+def _move_eval(wdl: int, dtz: int | None) -> float:
+    """
+    Eval of a move for the side making it, from the resulting WDL/DTZ
+    seen from that side.
+    """
+    if wdl == 0:
+        return 0.0
+    if abs(wdl) == 1:
+        return CURSED if wdl > 0 else -CURSED
+    value = TB_WIN - min(abs(dtz), 100) / 100.0 if dtz is not None else TB_WIN
+    return value if wdl > 0 else -value
+
+
+class EndgameTablebase:
+    """
+    Local Syzygy tables, probed through chess.syzygy.
+    - python-chess opens table files on first use and keeps up to
+      max_fds of them open (LRU), so probes reuse the mapped handles.
+    - lookup(board) ranks every legal move by the WDL/DTZ of the position
+      it leads to and returns the exact result: lines with evals of
+      MATE for a mate, TB_WIN minus the DTZ in hundredths for a win,
+      CURSED for a 50-move-rule draw, 0.0 for a draw (negated for the
+      losing side; white's point of view, as engine evals), flagged
+      `tablebase`. None when the position has castling rights, more
+      pieces than the tables cover, or a table is missing.
+    - Results are kept per position_key() in a bounded LRU.
+    """
+
+    def __init__(
+        self, paths, max_lines: int = 3, max_fds: int = 128, cache_size: int = 4096
+    ):
+        if isinstance(paths, (str, bytes)) or hasattr(paths, "__fspath__"):
+            paths = [paths]
+        self.paths = [str(p) for p in paths]
+        self.max_lines = max_lines
+        self.cache_size = cache_size
+
+        self._tables = chess.syzygy.open_tablebase(self.paths[0], max_fds=max_fds)
+        for path in self.paths[1:]:
+            self._tables.add_directory(path)
+        # "KRvK" covers 3 pieces
+        self.max_pieces = max((len(name) - 1 for name in self._tables.wdl), default=0)
+
+        self._lock = threading.Lock()
+        self._results = OrderedDict()  # position_key -> AnalysisResult | None
+        self.hits = 0
+        self.misses = 0
+        self.probes = 0
+
+    def close(self):
+        self._tables.close()
+
+    def covers(self, board: chess.Board) -> bool:
+        """
+        Cheap pre-check: few enough pieces and no castling rights.
+        """
+        return (
+            chess.popcount(board.occupied) <= self.max_pieces
+            and not board.castling_rights
+        )
+
+    def lookup(self, board: chess.Board) -> AnalysisResult | None:
+        if not self.covers(board):
+            return None
+
+        key = position_key(board)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                result = self._results[key]
+                if result is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                return result
+
+        result = self._probe(board.copy(stack=False))
+
+        with self._lock:
+            if result is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._results[key] = result
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        return result
+
+    def _probe(self, board: chess.Board) -> AnalysisResult | None:
+        scored = []
+        probes = 0
+        try:
+            for move in list(board.legal_moves):
+                board.push(move)
+                try:
+                    if board.is_checkmate():
+                        value = MATE
+                    else:
+                        # the child is seen from the opponent's side
+                        wdl = -self._tables.probe_wdl(board)
+                        probes += 1
+                        try:
+                            dtz = -self._tables.probe_dtz(board)
+                            probes += 1
+                        except KeyError:  # WDL tables only
+                            dtz = None
+                        value = _move_eval(wdl, dtz)
+                finally:
+                    board.pop()
+                scored.append((value, move.uci()))
+        except KeyError:  # MissingTableError
+            return None
+        finally:
+            with self._lock:
+                self.probes += probes
+
+        if not scored:
+            return None
+
+        scored.sort(key=lambda vm: (-vm[0], vm[1]))
+        sign = 1 if board.turn == chess.WHITE else -1
+        return AnalysisResult(
+            depth=0,
+            lines=[
+                AnalysisLine(move=move, eval=sign * value)
+                for value, move in scored[: self.max_lines]
+            ],
+            tablebase=True,
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tables": len(self._tables.wdl) + len(self._tables.dtz),
+                "max_pieces": self.max_pieces,
+                "cached": len(self._results),
+                "hits": self.hits,
+                "misses": self.misses,
+                "probes": self.probes,
+            }
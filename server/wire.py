@@ -0,0 +1,131 @@
+"""
+Compact binary encoding of /state, /snapshot, /piece_list and /move_list
+for MicroPython clients (Content-Type application/x-chess-bin).
+
+All integers are little-endian. Squares are bytes 0-63 (a1=0, h8=63).
+Moves are 16 bits: from | to << 6 | promotion << 12, with promotion 0
+(none) or 1-4 (n, b, r, q); 0xFFFF means "no move". Evals are int16
+centipawns from white's point of view.
+
+state (kind 1) / snapshot (kind 4):
+    u8 kind, u8 flags, u32 version, u16 move_number, u16 last_move,
+    u8 depth, u8 n_lines, n_lines * (u16 move, i16 eval)
+  snapshot adds:
+    u8 n_from, n_from * (u8 from, u8 n, n * u8 to)
+    (to has bit 7 set when the move promotes)
+piece_list (kind 2):
+    u8 kind, u8 n, n * u8 square
+move_list (kind 3):
+    u8 kind, u8 from, u8 n, n * u8 to (bit 7 = promotes)
+"""
+
+import struct
+
+import chess
+
+CONTENT_TYPE = "application/x-chess-bin"
+
+KIND_STATE = 1
+KIND_PIECE_LIST = 2
+KIND_MOVE_LIST = 3
+KIND_SNAPSHOT = 4
+
+BLACK_TO_MOVE = 0x01
+GAME_OVER = 0x02
+CHECKMATE = 0x04
+STALEMATE = 0x08
+PENDING = 0x10
+STALE = 0x20
+BOOK = 0x40
+TABLEBASE = 0x80
+
+NO_MOVE = 0xFFFF
+PROMOTES = 0x80
+
+_SQUARE = {name: sq for sq, name in enumerate(chess.SQUARE_NAMES)}
+_HEADER = struct.Struct("<BBIHHBB")
+_LINE = struct.Struct("<Hh")
+
+
+def pack_move(move: chess.Move) -> int:
+    promotion = move.promotion - 1 if move.promotion else 0
+    return move.from_square | move.to_square << 6 | promotion << 12
+
+
+def unpack_move(packed: int) -> chess.Move:
+    promotion = packed >> 12
+    return chess.Move(
+        packed & 0x3F, packed >> 6 & 0x3F, promotion + 1 if promotion else None
+    )
+
+
+def eval_cp(value: float) -> int:
+    return max(-32767, min(32767, round(value * 100)))
+
+
+def _state(kind, version, board, analysis) -> bytearray:
+    flags = 0
+    if board.turn == chess.BLACK:
+        flags |= BLACK_TO_MOVE
+    if board.is_game_over():
+        flags |= GAME_OVER
+    if board.is_checkmate():
+        flags |= CHECKMATE
+    if board.is_stalemate():
+        flags |= STALEMATE
+    if analysis.pending:
+        flags |= PENDING
+    if analysis.stale:
+        flags |= STALE
+    if analysis.book:
+        flags |= BOOK
+    if analysis.tablebase:
+        flags |= TABLEBASE
+
+    lines = analysis.lines[:255]
+    out = bytearray(_HEADER.pack(
+        kind,
+        flags,
+        version & 0xFFFFFFFF,
+        min(board.fullmove_number, 0xFFFF),
+        pack_move(board.peek()) if board.move_stack else NO_MOVE,
+        min(analysis.depth, 255),
+        len(lines),
+    ))
+    for line in lines:
+        out += _LINE.pack(pack_move(chess.Move.from_uci(line.move)), eval_cp(line.eval))
+    return out
+
+
+def _targets(index, from_sq: str) -> bytes:
+    promotions = index.promotions_from(from_sq)
+    if not promotions:
+        return bytes([_SQUARE[to] for to in index.moves_from(from_sq)])
+    return bytes([
+        _SQUARE[to] | (PROMOTES if to in promotions else 0)
+        for to in index.moves_from(from_sq)
+    ])
+
+
+def encode_state(version, board, analysis) -> bytes:
+    return bytes(_state(KIND_STATE, version, board, analysis))
+
+
+def encode_snapshot(version, board, analysis, index) -> bytes:
+    out = _state(KIND_SNAPSHOT, version, board, analysis)
+    out.append(len(index.squares))
+    for from_sq in index.squares:
+        targets = _targets(index, from_sq)
+        out.append(_SQUARE[from_sq])
+        out.append(len(targets))
+        out += targets
+    return bytes(out)
+
+
+def encode_piece_list(squares) -> bytes:
+    return bytes([KIND_PIECE_LIST, len(squares)] + [_SQUARE[sq] for sq in squares])
+
+
+def encode_move_list(index, from_sq: str) -> bytes:
+    targets = _targets(index, from_sq)
+    return bytes([KIND_MOVE_LIST, _SQUARE[from_sq], len(targets)]) + targets
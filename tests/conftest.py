@@ -1,6 +1,29 @@
 import sys
+import time
 from pathlib import Path
 
 # Add project root to PYTHONPATH for tests
 ROOT = Path(__file__).resolve().parents[1]
-sys.path.insert(0, str(ROOT))
\ No newline at end of file
+sys.path.insert(0, str(ROOT))
+
+import pytest
+
+
+@pytest.fixture
+def fake_uci():
+    """
+    Command line for the fake UCI engine (usable as engine_path).
+    """
+    return [sys.executable, str(ROOT / "tests" / "fake_uci.py"), "--depth-time", "0.01"]
+
+
+def wait_for(predicate, timeout=5.0):
+    """
+    Poll `predicate` until it is true (returns True) or timeout (False).
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
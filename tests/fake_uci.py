@@ -0,0 +1,139 @@
+"""
+Minimal fake UCI engine for tests.
+
+Speaks enough UCI for python-chess: deepens one ply every --depth-time
+seconds, printing one `info` line per MultiPV line, until the movetime or
+depth limit is hit or `stop` arrives. Evals are deterministic so results
+can be compared across runs.
+
+    python tests/fake_uci.py --depth-time 0.01
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+import chess
+
+
+def send(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+class FakeEngine:
+    def __init__(self, depth_time):
+        self.depth_time = depth_time
+        self.board = chess.Board()
+        self.options = {"MultiPV": 1, "Threads": 1, "Hash": 16}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def position(self, args):
+        if args[0] == "startpos":
+            self.board = chess.Board()
+            rest = args[1:]
+        else:
+            idx = args.index("moves") if "moves" in args else len(args)
+            self.board = chess.Board(" ".join(args[1:idx]))
+            rest = args[idx:]
+        if rest and rest[0] == "moves":
+            for uci in rest[1:]:
+                self.board.push_uci(uci)
+
+    def go(self, args):
+        movetime = None
+        depth = None
+        if "movetime" in args:
+            movetime = int(args[args.index("movetime") + 1]) / 1000.0
+        if "depth" in args:
+            depth = int(args[args.index("depth") + 1])
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self.search, args=(self.board.copy(), movetime, depth), daemon=True
+        )
+        self.thread.start()
+
+    def search(self, board, movetime, depth_limit):
+        start = time.monotonic()
+        moves = sorted(board.legal_moves, key=lambda m: m.uci())
+        multipv = max(1, int(self.options.get("MultiPV", 1)))
+        threads = max(1, int(self.options.get("Threads", 1)))
+
+        if not moves:
+            send("info depth 0 score mate 0" if board.is_check() else "info depth 0 score cp 0")
+            send("bestmove (none)")
+            return
+
+        depth = 0
+        nodes = 0
+        while True:
+            depth += 1
+            nodes += 1000 * threads * depth
+            elapsed = max(time.monotonic() - start, 1e-6)
+            for k, move in enumerate(moves[:multipv], 1):
+                cp = 30 - 10 * k + (depth % 3)
+                send(
+                    f"info depth {depth} seldepth {depth} multipv {k} score cp {cp} "
+                    f"nodes {nodes} nps {int(nodes / elapsed)} "
+                    f"time {int(elapsed * 1000)} pv {move.uci()}"
+                )
+
+            if depth_limit is not None and depth >= depth_limit:
+                break
+            if self.stop_event.wait(self.depth_time):
+                break
+            if movetime is not None and time.monotonic() - start >= movetime:
+                break
+
+        send(f"bestmove {moves[0].uci()}")
+
+    def wait_search(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        for raw in sys.stdin:
+            parts = raw.split()
+            if not parts:
+                continue
+            cmd, args = parts[0], parts[1:]
+
+            if cmd == "uci":
+                send("id name FakeFish")
+                send("option name MultiPV type spin default 1 min 1 max 500")
+                send("option name Threads type spin default 1 min 1 max 512")
+                send("option name Hash type spin default 16 min 1 max 33554432")
+                send("uciok")
+            elif cmd == "isready":
+                send("readyok")
+            elif cmd == "setoption":
+                name = args[args.index("name") + 1]
+                value = args[args.index("value") + 1] if "value" in args else None
+                self.options[name] = value
+            elif cmd == "position":
+                self.position(args)
+            elif cmd == "go":
+                self.wait_search()
+                self.go(args)
+            elif cmd == "stop":
+                self.stop_event.set()
+                self.wait_search()
+            elif cmd == "quit":
+                self.stop_event.set()
+                self.wait_search()
+                return
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--depth-time", type=float, default=0.01)
+    args = ap.parse_args()
+    FakeEngine(args.depth_time).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import chess
+
+from server.analysis import StockfishAnalysisEngine
+from conftest import wait_for
+
+
+def make_engine(fake_uci, **kwargs):
+    options = dict(base_time=0.5, interval=0.05, continuous=True, publish_interval=0.05)
+    options.update(kwargs)
+    return StockfishAnalysisEngine(fake_uci, **options)
+
+
+def test_continuous_search_keeps_deepening(fake_uci):
+    engine = make_engine(fake_uci)
+    try:
+        board = chess.Board()
+        first = engine.analyse(board)
+        assert first.depth > 0
+        assert len(first.lines) == 3
+
+        assert wait_for(lambda: engine.analyse(board).depth >= first.depth + 10)
+    finally:
+        engine.stop()
+
+
+def test_publishes_are_throttled(fake_uci):
+    engine = make_engine(fake_uci)
+    publishes = []
+    engine.add_listener(lambda: publishes.append(time.monotonic()))
+    try:
+        engine.analyse(chess.Board())
+        time.sleep(0.5)
+        # the fake engine reports a new depth every 10 ms
+        assert 3 <= len(publishes) <= 12
+    finally:
+        engine.stop()
+
+
+def test_position_change_restarts_search(fake_uci):
+    engine = make_engine(fake_uci)
+    try:
+        board = chess.Board()
+        engine.analyse(board)
+        assert wait_for(lambda: engine.analyse(board).depth >= 20)
+
+        board.push_uci("e2e4")
+        changed = threading.Event()
+        engine.add_listener(changed.set)
+
+        t0 = time.monotonic()
+        result = engine.analyse(board)
+        assert time.monotonic() - t0 < 0.5
+        # black's replies, not white's
+        assert result.lines[0].move in {m.uci() for m in board.legal_moves}
+        assert result.depth < 20
+    finally:
+        engine.stop()
+
+
+def test_game_over_position_is_not_searched(fake_uci):
+    engine = make_engine(fake_uci, base_time=0.1, interval=0.25)
+    starts = []
+    publishes = []
+    try:
+        engine.start()
+        real = engine.engine.analysis
+        engine.engine.analysis = lambda *a, **kw: starts.append(1) or real(*a, **kw)
+        engine.add_listener(lambda: publishes.append(1))
+
+        for fen in (
+            "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1",  # stalemate
+            "k7/2K5/8/8/8/8/8/Q7 b - - 0 1",   # checkmate
+        ):
+            result = engine.analyse(chess.Board(fen))
+            assert (result.depth, result.lines, result.pending) == (0, [], False)
+        time.sleep(0.6)
+        # nothing to restart or republish every interval
+        assert starts == [] and publishes == []
+    finally:
+        engine.stop()
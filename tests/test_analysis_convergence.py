@@ -0,0 +1,117 @@
+import time
+
+import chess
+
+from server.analysis import AnalysisLine, AnalysisResult, StockfishAnalysisEngine
+from server.convergence import Convergence
+from server.pool import EnginePool
+from conftest import wait_for
+
+
+def result(depth, move, eval):
+    return AnalysisResult(depth=depth, lines=[AnalysisLine(move=move, eval=eval)])
+
+
+def test_stable_iterations_converge():
+    c = Convergence(iterations=2, eval_margin=0.1)
+    assert not c.update(result(5, "e2e4", 0.30))
+    assert not c.update(result(6, "e2e4", 0.35))
+    assert c.update(result(7, "e2e4", 0.28))
+    assert c.stable == 2
+
+
+def test_changed_best_line_resets_and_speeds_up_budget():
+    c = Convergence(iterations=2, eval_margin=0.1)
+    c.update(result(5, "e2e4", 0.30))
+    c.update(result(6, "e2e4", 0.30))
+    assert c.next_budget(0.5, 0.1, 1.5) == 0.6
+
+    c.update(result(7, "d2d4", 0.30))
+    assert c.changed and c.stable == 0
+    assert c.next_budget(0.5, 0.1, 1.5) == 0.7
+    c.update(result(8, "d2d4", 0.60))
+    assert c.changed and c.stable == 0
+    assert c.next_budget(1.4, 0.1, 1.5) == 1.5
+
+
+def test_target_depth_converges_and_zero_iterations_never_do():
+    c = Convergence(iterations=0, target_depth=20)
+    for depth in range(10, 20):
+        assert not c.update(result(depth, "e2e4", 0.3))
+    assert c.update(result(20, "e2e4", 0.3))
+
+
+def test_engine_stops_searching_converged_position(fake_uci):
+    engine = StockfishAnalysisEngine(
+        fake_uci, base_time=0.05, step_time=0.05, max_time=0.2, interval=0.01,
+        converge_iterations=3,
+    )
+    try:
+        board = chess.Board()
+        engine.analyse(board)
+        assert wait_for(lambda: engine.analyse(board).converged)
+
+        spent = engine.stats()["search_seconds"]
+        time.sleep(0.4)
+        assert engine.stats()["search_seconds"] == spent
+
+        # a new position is searched again
+        board.push_uci("e2e4")
+        engine.analyse(board)
+        assert wait_for(lambda: engine.stats()["search_seconds"] > spent)
+    finally:
+        engine.stop()
+
+
+def test_converged_result_is_remembered_for_the_position(fake_uci):
+    engine = StockfishAnalysisEngine(
+        fake_uci, base_time=0.05, step_time=0.05, max_time=0.2, interval=0.01,
+        converge_iterations=2,
+    )
+    try:
+        board = chess.Board()
+        engine.analyse(board)
+        assert wait_for(lambda: engine.analyse(board).converged)
+
+        board.push_uci("e2e4")
+        engine.analyse(board)
+        board.pop()
+        assert engine.analyse(board).converged
+    finally:
+        engine.stop()
+
+
+def test_continuous_search_stops_at_target_depth(fake_uci):
+    engine = StockfishAnalysisEngine(
+        fake_uci, base_time=0.5, interval=0.05, continuous=True,
+        publish_interval=0.02, target_depth=15,
+    )
+    try:
+        board = chess.Board()
+        engine.analyse(board)
+        assert wait_for(lambda: engine.analyse(board).converged)
+        depth = engine.analyse(board).depth
+        assert depth >= 15
+
+        time.sleep(0.3)
+        assert engine.analyse(board).depth == depth
+    finally:
+        engine.stop()
+
+
+def test_pool_stops_scheduling_converged_positions(fake_uci):
+    pool = EnginePool(
+        fake_uci, size=1, base_time=0.05, step_time=0.05, max_time=0.2,
+        converge_iterations=2,
+    )
+    try:
+        board = chess.Board()
+        pool.analyse(board)
+        assert wait_for(lambda: pool.analyse(board).converged)
+
+        stats = pool.stats()["pool"]
+        assert stats["converged"] == 1
+        time.sleep(0.3)
+        assert pool.stats()["pool"]["slices"] == stats["slices"]
+    finally:
+        pool.stop()
@@ -0,0 +1,63 @@
+import chess
+
+from server.analysis import StockfishAnalysisEngine
+from conftest import wait_for
+
+
+def make_engine(fake_uci, **kwargs):
+    return StockfishAnalysisEngine(
+        fake_uci, base_time=0.2, step_time=0.1, max_time=0.5, interval=0.01, **kwargs
+    )
+
+
+def test_first_call_returns_placeholder_without_searching(fake_uci):
+    engine = make_engine(fake_uci, nonblocking=True)
+    try:
+        board = chess.Board()
+
+        first = engine.analyse(board)
+        # no one-shot search on the caller's thread
+        assert engine.stats()["coalescing"]["calls"] == 0
+
+        assert first.pending is True
+        assert first.depth == 0
+        assert first.lines == []
+
+        published = []
+        engine.add_listener(lambda: published.append(True))
+        assert wait_for(lambda: published)
+
+        real = engine.analyse(board)
+        assert real.pending is False
+        assert real.depth > 0
+        assert len(real.lines) == 3
+    finally:
+        engine.stop()
+
+
+def test_placeholder_uses_parent_result_marked_stale(fake_uci):
+    engine = make_engine(fake_uci, nonblocking=True)
+    try:
+        board = chess.Board()
+        engine.analyse(board)
+        assert wait_for(lambda: not engine.analyse(board).pending)
+        parent = engine.analyse(board)
+
+        board.push_uci("e2e4")
+        placeholder = engine.analyse(board)
+
+        assert placeholder.pending is True
+        assert placeholder.stale is True
+        assert placeholder.lines == parent.lines
+    finally:
+        engine.stop()
+
+
+def test_blocking_mode_still_returns_real_first_result(fake_uci):
+    engine = make_engine(fake_uci)
+    try:
+        first = engine.analyse(chess.Board())
+        assert first.pending is False
+        assert first.depth > 0
+    finally:
+        engine.stop()
@@ -0,0 +1,64 @@
+
+import chess
+
+from server.analysis import StockfishAnalysisEngine, AnalysisLine, AnalysisResult
+from server.cache import PositionCache, position_key
+from conftest import wait_for
+
+
+def result(depth):
+    return AnalysisResult(depth=depth, lines=[AnalysisLine(move="e2e4", eval=0.1)])
+
+
+def test_cache_keeps_deepest_result():
+    cache = PositionCache()
+    cache.put(1, result(10), budget=0.5)
+    cache.put(1, result(4), budget=0.1)
+
+    entry = cache.get(1)
+    assert entry.result.depth == 10
+    assert entry.budget == 0.5
+
+
+def test_cache_evicts_least_recently_used():
+    cache = PositionCache(max_entries=2)
+    cache.put(1, result(1))
+    cache.put(2, result(1))
+    cache.get(1)
+    cache.put(3, result(1))
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.get(3) is not None
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_position_key_ignores_move_counters():
+    a = chess.Board()
+    for mv in ("g1f3", "g8f6", "f3g1", "f6g8"):
+        a.push_uci(mv)
+    assert position_key(a) == position_key(chess.Board())
+
+
+def test_returning_to_position_resumes_deepening(fake_uci):
+    engine = StockfishAnalysisEngine(
+        fake_uci, base_time=0.02, step_time=0.05, max_time=0.3, interval=0.01
+    )
+    try:
+        start = chess.Board()
+        engine.analyse(start)
+        assert wait_for(lambda: engine._budget >= 0.2)
+        deep = engine.analyse(start)
+
+        after = start.copy()
+        after.push_uci("e2e4")
+        engine.analyse(after)
+        assert engine._budget < 0.2
+
+        back = engine.analyse(start)
+        assert back.depth >= deep.depth
+        assert engine._budget >= 0.2
+        assert engine.cache.hits >= 1
+    finally:
+        engine.stop()
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import chess
+
+from server.analysis import StockfishAnalysisEngine
+from server.cache import position_key
+from conftest import wait_for
+
+
+def make_engine(fake_uci, **kwargs):
+    options = dict(
+        base_time=0.5, interval=0.05, continuous=True, publish_interval=0.05,
+        speculate=2, speculate_depth=10, speculate_time=0.2,
+    )
+    options.update(kwargs)
+    return StockfishAnalysisEngine(fake_uci, **options)
+
+
+def children(board, result, n):
+    for line in result.lines[:n]:
+        child = board.copy()
+        child.push_uci(line.move)
+        yield child
+
+
+def test_top_replies_are_pre_analysed(fake_uci):
+    engine = make_engine(fake_uci)
+    try:
+        board = chess.Board()
+        result = engine.analyse(board)
+        kids = list(children(board, result, 2))
+
+        assert wait_for(lambda: all(engine.cache.peek(position_key(c)) for c in kids))
+        for child in kids:
+            entry = engine.cache.peek(position_key(child))
+            assert entry.speculative
+            assert entry.result.depth > 0
+        assert engine.stats()["speculation"]["searches"] >= 2
+    finally:
+        engine.stop()
+
+
+def test_played_reply_starts_from_speculative_result(fake_uci):
+    engine = make_engine(fake_uci)
+    try:
+        board = chess.Board()
+        result = engine.analyse(board)
+        child = next(children(board, result, 1))
+        assert wait_for(lambda: engine.cache.peek(position_key(child)) is not None)
+        cached = engine.cache.peek(position_key(child)).result.depth
+
+        # answered from the speculative result, not a fresh search
+        reply = engine.analyse(child)
+        assert not reply.pending
+        assert reply.depth >= cached
+        assert engine.stats()["speculation"]["hits"] == 1
+    finally:
+        engine.stop()
+
+
+def test_main_position_keeps_deepening_after_speculation(fake_uci):
+    engine = make_engine(fake_uci)
+    try:
+        board = chess.Board()
+        result = engine.analyse(board)
+        kids = list(children(board, result, 2))
+        assert wait_for(lambda: all(engine.cache.peek(position_key(c)) for c in kids))
+
+        depth = engine.analyse(board).depth
+        assert wait_for(lambda: engine.analyse(board).depth > depth + 5)
+    finally:
+        engine.stop()
+
+
+def test_mating_top_lines_are_not_speculated(fake_uci):
+    # the fake engine's top lines, Qa1# and Qa2#, end the game
+    engine = make_engine(fake_uci)
+    try:
+        board = chess.Board("k7/2K5/8/8/8/8/8/1Q6 w - - 0 1")
+        engine.analyse(board)
+        assert wait_for(lambda: engine.analyse(board).depth > engine.speculate_depth + 5)
+        assert engine.stats()["speculation"]["searches"] == 0
+    finally:
+        engine.stop()
+
+
+def test_position_change_cancels_speculation(fake_uci):
+    # long speculative searches, so the move lands in the middle of one
+    engine = make_engine(fake_uci, speculate_time=60.0)
+    try:
+        board = chess.Board()
+        engine.analyse(board)
+        assert wait_for(lambda: engine.analyse(board).depth >= engine.speculate_depth)
+        time.sleep(0.2)  # now inside the first speculative search
+
+        board.push_uci("h2h4")  # not a top line of the fake engine
+        changed = threading.Event()
+        engine.add_listener(changed.set)
+        engine.analyse(board)
+        # far sooner than the speculative search would have ended
+        assert changed.wait(10.0)
+        assert engine.stats()["speculation"]["searches"] == 0
+    finally:
+        engine.stop()
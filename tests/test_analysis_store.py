@@ -0,0 +1,109 @@
+import time
+
+import chess
+
+from server.analysis import AnalysisLine, AnalysisResult, StockfishAnalysisEngine
+from server.cache import PositionCache, position_key
+from server.pool import EnginePool
+from server.store import AnalysisStore
+
+
+def result(depth, move="e2e4"):
+    return AnalysisResult(depth=depth, lines=[AnalysisLine(move=move, eval=0.25)])
+
+
+def test_put_get_round_trip_with_high_bit_key(tmp_path):
+    store = AnalysisStore(tmp_path / "a.sqlite3")
+    key = (1 << 64) - 5
+
+    store.put(key, result(12), budget=0.7)
+    got, budget = store.get(key)
+
+    assert got == result(12)
+    assert budget == 0.7
+    assert store.get(123) is None
+    assert store.stats()["hits"] == 1
+    assert store.stats()["misses"] == 1
+    store.close()
+
+
+def test_only_deeper_results_overwrite(tmp_path):
+    store = AnalysisStore(tmp_path / "a.sqlite3")
+    store.put(1, result(20, "d2d4"), budget=1.5)
+    store.put(1, result(8, "e2e4"), budget=0.1)
+    assert store.get(1)[0].lines[0].move == "d2d4"
+
+    store.put(1, result(22, "c2c4"), budget=1.5)
+    assert store.get(1)[0].depth == 22
+    store.close()
+
+
+def test_results_survive_reopen(tmp_path):
+    path = tmp_path / "a.sqlite3"
+    board = chess.Board()
+    board.push_uci("e2e4")
+
+    store = AnalysisStore(path)
+    PositionCache(store=store).put(position_key(board), result(18), budget=1.0)
+    store.close()
+
+    cache = PositionCache(store=AnalysisStore(path))
+    entry = cache.get(position_key(board))
+    assert entry.result.depth == 18
+    assert entry.budget == 1.0
+    assert cache.stats()["hits"] == 1
+
+
+def test_size_is_bounded_and_recent_reads_are_kept(tmp_path):
+    store = AnalysisStore(tmp_path / "a.sqlite3", max_entries=50, evict_every=10)
+    store.put(0, result(1))
+    for key in range(1, 200):
+        store.get(0)  # keep key 0 hot
+        store.put(key, result(1))
+    store.compact()
+
+    assert len(store) <= 50
+    assert store.get(0) is not None
+    assert store.get(1) is None
+    store.close()
+
+
+class SlowStore:
+    """
+    Store whose reads take a while and record whether the engine's lock
+    was held at the time.
+    """
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.reads_under_lock = 0
+
+    def get(self, key):
+        if self.lock.locked():
+            self.reads_under_lock += 1
+        time.sleep(0.05)
+        return (result(9), 0.4)
+
+    def put(self, key, result, budget):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def test_store_is_read_outside_engine_locks(fake_uci):
+    pool = EnginePool(fake_uci, size=1, base_time=0.05)
+    pool.cache.store = store = SlowStore(pool._lock)
+    engine = StockfishAnalysisEngine(fake_uci, nonblocking=True, interval=0.01)
+    engine.cache.store = engine_store = SlowStore(engine._lock)
+    try:
+        board = chess.Board()
+        for uci in ("e2e4", "e7e5", "g1f3"):
+            board.push_uci(uci)
+            assert pool.analyse(board).depth >= 9  # from the store
+            assert engine.analyse(board).depth >= 9
+        assert store.reads_under_lock == 0
+        assert engine_store.reads_under_lock == 0
+    finally:
+        pool.stop()
+        engine.stop()
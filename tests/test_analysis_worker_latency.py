@@ -0,0 +1,72 @@
+import threading
+
+import chess
+
+from server.analysis import StockfishAnalysisEngine
+from conftest import wait_for
+
+# timings (move -> first result) are measured by bench/worker_latency.py;
+# these tests check the behaviour behind them
+
+
+def searched_boards(engine):
+    """
+    Record the board of every search the worker starts.
+    """
+    boards = []
+    engine.start()
+    real = engine.engine.analysis
+    engine.engine.analysis = lambda board, *a, **kw: (
+        boards.append(board.copy()) or real(board, *a, **kw)
+    )
+    return boards
+
+
+def test_move_to_first_background_result_is_not_gated_by_interval(fake_uci):
+    # an interval far beyond the wait below: only a worker woken by the
+    # new position can publish in time
+    engine = StockfishAnalysisEngine(
+        fake_uci, base_time=0.05, step_time=0.05, max_time=1.0, interval=60.0, nonblocking=True
+    )
+    try:
+        published = threading.Event()
+        engine.add_listener(published.set)
+        board = chess.Board()
+        engine.analyse(board)
+        assert published.wait(10.0)
+
+        board.push_uci("e2e4")
+        published.clear()
+        engine.analyse(board)
+        assert published.wait(10.0)
+        assert engine.analyse(board).lines[0].move in {m.uci() for m in board.legal_moves}
+    finally:
+        engine.stop()
+
+
+def test_position_change_cancels_long_search(fake_uci):
+    engine = StockfishAnalysisEngine(fake_uci, base_time=60.0, interval=0.1, nonblocking=True)
+    try:
+        boards = searched_boards(engine)
+        board = chess.Board()
+        engine.analyse(board)
+        assert wait_for(lambda: boards)  # worker is now inside a 60 s search
+
+        board.push_uci("d2d4")
+        engine.analyse(board)
+        # the old search was cut short and the new position's one started
+        assert wait_for(lambda: boards[-1] == board, timeout=10.0)
+        assert 0 < engine.search_seconds < 60.0
+    finally:
+        engine.stop()
+
+
+def test_idle_worker_stops_promptly(fake_uci):
+    engine = StockfishAnalysisEngine(fake_uci, interval=60.0, nonblocking=True)
+    engine.analyse(chess.Board())
+    assert wait_for(lambda: engine.engine is not None)
+    worker = engine._thread
+
+    engine.stop()
+    # woken by stop(), not left sleeping out the interval
+    assert not worker.is_alive()
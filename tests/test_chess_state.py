@@ -83,6 +83,26 @@ def test_undo_reverts_last_move():
     assert state.board.move_stack == []
     assert state.mode == state.ROOT
     assert state.selected_from is None
+
+
+def test_position_key_follows_board_changes():
+    import chess.polyglot
+
+    state = SandboxState()
+    start = state.position_key()
+    assert start == chess.polyglot.zobrist_hash(state.board)
+
+    state.play("g1f3")
+    state.play("g8f6")
+    state.play("f3g1")
+    state.play("f6g8")
+    # same position, different move counters: same key
+    assert state.position_key() == start
+
+    state.undo()
+    assert state.position_key() == chess.polyglot.zobrist_hash(state.board)
+    state.reset()
+    assert state.position_key() == start
     
 from server.analysis import StubAnalysisEngine
 
@@ -0,0 +1,224 @@
+import json
+import threading
+from http.client import HTTPConnection
+
+import chess
+import pytest
+
+from server.analysis import StockfishAnalysisEngine
+from server.chess_state import SandboxState
+from server.config import (
+    MAX_HASH_MB, EngineConfig, auto_size, load_config, machine_cores, runtime_changes,
+)
+from server.http_server import make_engine, make_http_server
+from server.pool import EnginePool
+from conftest import wait_for
+
+GB = 1 << 30
+
+
+def test_file_then_env_then_flags(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"threads": 2, "hash_mb": 64, "multipv": 2, "max_time": 3.0}))
+    env = {"CHESS_ENGINE_HASH_MB": "128", "CHESS_ENGINE_MULTIPV": "4", "CHESS_ENGINE_PATH": "sf"}
+
+    config = load_config(
+        ["--config", str(path), "--multipv", "5", "--option", "EvalFile=nn.nnue"],
+        env=env, cores=8, memory=16 * GB,
+    )
+    assert config.threads == 2
+    assert config.hash_mb == 128
+    assert config.multipv == 5
+    assert config.max_time == 3.0
+    assert config.engine_path == "sf"
+    assert config.options == {"EvalFile": "nn.nnue"}
+    assert config.pool_size == 4  # 8 cores / 2 threads
+
+
+def test_bad_values_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        load_config(["--multipv", "0"], env={})
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"thread": 2}))
+    with pytest.raises(ValueError):
+        load_config(["--config", str(path)], env={})
+
+
+def test_auto_size_splits_cores_and_memory():
+    config = auto_size(EngineConfig(), cores=8, memory=16 * GB)
+    assert (config.pool_size, config.threads) == (8, 1)
+    assert config.hash_mb == 512  # a quarter of 16 GB over 8 engines
+
+    config = auto_size(EngineConfig(pool_size=2), cores=8, memory=2 * GB)
+    assert (config.pool_size, config.threads) == (2, 4)
+    assert config.hash_mb == 256
+
+    config = auto_size(EngineConfig(), cores=64, memory=1 * GB)
+    assert config.hash_mb == 16  # never below the minimum
+
+
+def test_single_board_keeps_continuous_search_and_speculation():
+    config = load_config(["--single-board"], env={}, cores=8, memory=16 * GB)
+    assert (config.pool_size, config.threads) == (1, 8)
+    engine = make_engine(config)
+    assert isinstance(engine, StockfishAnalysisEngine)
+    assert engine.continuous and engine.nonblocking and engine.speculate == 3
+
+    config = load_config([], env={"CHESS_ENGINE_SINGLE_BOARD": "0"}, cores=8, memory=16 * GB)
+    pool = make_engine(config)
+    assert isinstance(pool, EnginePool) and pool.size == 8
+
+
+def test_runtime_changes_are_validated():
+    current = {"base_time": 0.1, "max_time": 1.5}
+    cores = machine_cores()
+    assert runtime_changes({"threads": cores, "max_time": 2}, current) == {
+        "threads": cores, "max_time": 2.0,
+    }
+    assert runtime_changes({"options": {"Skill Level": 5}}, current)
+    for body in (None, {}, {"pool_size": 2}, {"threads": 1.5}, {"hash_mb": 0},
+                 {"base_time": 2.0}, {"options": "x"},
+                 {"options": {"Debug Log File": "/etc/passwd"}},
+                 {"options": {"EvalFile": "x.nnue"}}, {"options": {"Skill Level": [1]}},
+                 {"threads": cores + 1}, {"hash_mb": MAX_HASH_MB + 1},
+                 {"multipv": 500}, {"max_time": 1e9}):
+        with pytest.raises(ValueError):
+            runtime_changes(body, current)
+
+
+def test_engine_options_are_applied_and_reconfigured(fake_uci):
+    engine = StockfishAnalysisEngine(
+        fake_uci, base_time=0.05, step_time=0.05, max_time=0.1, interval=0.01,
+        threads=2, hash_mb=32, options={"UnknownOption": 1},
+    )
+    try:
+        board = chess.Board()
+        engine.analyse(board)
+        assert engine.engine.protocol.config["Threads"] == 2
+        assert engine.engine.protocol.config["Hash"] == 32
+
+        depth = engine.analyse(board).depth
+        engine.reconfigure(threads=3, hash_mb=64)
+        assert wait_for(lambda: engine.engine.protocol.config["Threads"] == 3)
+        assert engine.engine.protocol.config["Hash"] == 64
+        # the position's analysis survives the change
+        assert engine.analyse(board).depth >= depth
+
+        with pytest.raises(ValueError):
+            engine.reconfigure(threads=1000)  # above the engine's max
+        assert engine.settings()["threads"] == 3
+    finally:
+        engine.stop()
+
+
+def test_continuous_search_restarts_with_new_options(fake_uci):
+    engine = StockfishAnalysisEngine(
+        fake_uci, base_time=0.5, interval=5.0, continuous=True, publish_interval=0.02,
+    )
+    try:
+        board = chess.Board()
+        engine.analyse(board)
+        assert wait_for(lambda: engine.analyse(board).depth > 3)
+        engine.reconfigure(threads=4)
+        assert wait_for(lambda: engine.engine.protocol.config["Threads"] == 4, timeout=2.0)
+    finally:
+        engine.stop()
+
+
+def test_pool_workers_pick_up_new_options(fake_uci):
+    pool = EnginePool(fake_uci, size=2, base_time=0.05, threads=1)
+    try:
+        board = chess.Board()
+        pool.analyse(board)
+        assert wait_for(lambda: len(pool._engines) == 2)
+
+        pool.reconfigure(threads=2, multipv=2, options={"Hash": 48})
+        assert wait_for(
+            lambda: all(e.protocol.config["Threads"] == 2 for e in pool._engines)
+        )
+        assert all(e.protocol.config["Hash"] == 48 for e in pool._engines)
+        assert pool.settings()["multipv"] == 2
+    finally:
+        pool.stop()
+
+
+def test_pool_checks_options_before_any_engine_runs(fake_uci):
+    pool = EnginePool(fake_uci, size=1, base_time=0.05)
+    try:
+        with pytest.raises(ValueError):
+            pool.reconfigure(options={"Hash": "lots"})
+        assert "Hash" not in pool.settings()["options"]
+
+        board = chess.Board()
+        pool.analyse(board)
+        assert wait_for(lambda: pool.analyse(board).depth > 0)
+    finally:
+        pool.stop()
+
+
+def test_pool_worker_survives_rejected_options(fake_uci):
+    pool = EnginePool(fake_uci, size=1, base_time=0.05)
+    try:
+        # slipped past validation, e.g. set directly
+        pool.options = {"Hash": "lots"}
+        pool._config_version += 1
+        board = chess.Board()
+        pool.analyse(board)
+        assert wait_for(lambda: pool.analyse(board).depth > 0)
+        assert all(t.is_alive() for t in pool._threads)
+    finally:
+        pool.stop()
+
+
+def test_http_config_endpoint(fake_uci):
+    pool = EnginePool(fake_uci, size=1, base_time=0.05)
+    server = make_http_server("127.0.0.1", 0, SandboxState(), pool, config_token="s3cret")
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = HTTPConnection(host, port, timeout=5)
+
+        def request(method, body=None, token="s3cret"):
+            headers = {"Authorization": f"Bearer {token}"} if token else {}
+            body = None if body is None else json.dumps(body)
+            conn.request(method, "/config", body=body, headers=headers)
+            resp = conn.getresponse()
+            return resp.status, json.loads(resp.read())
+
+        status, config = request("GET", token=None)
+        assert status == 200
+        assert config["type"] == "config" and config["pool_size"] == 1
+
+        for token in (None, "wrong"):
+            status, error = request("POST", {"max_time": 1.0}, token=token)
+            assert status == 401 and error["reason"] == "unauthorized"
+        assert pool.settings()["max_time"] == 1.5
+
+        status, config = request("POST", {"threads": 1, "max_time": 1.0})
+        assert status == 200
+        assert (config["threads"], config["max_time"]) == (1, 1.0)
+
+        status, error = request("POST", {"pool_size": 4})
+        assert status == 400 and error["reason"] == "invalid_config"
+        assert pool.settings()["pool_size"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        pool.stop()
+
+
+def test_http_config_changes_disabled_without_token(fake_uci):
+    pool = EnginePool(fake_uci, size=1, base_time=0.05)
+    server = make_http_server("127.0.0.1", 0, SandboxState(), pool)
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = HTTPConnection(host, port, timeout=5)
+        conn.request("POST", "/config", body=json.dumps({"options": {"Hash": "lots"}}))
+        resp = conn.getresponse()
+        assert resp.status == 403 and json.loads(resp.read())["reason"] == "config_disabled"
+        assert pool.settings()["options"] == {}
+    finally:
+        server.shutdown()
+        server.server_close()
+        pool.stop()
@@ -0,0 +1,131 @@
+import threading
+import time
+from http.client import HTTPConnection
+
+import chess
+
+from server.analysis import AnalysisLine, AnalysisResult, StockfishAnalysisEngine
+from server.cache import position_key
+from server.chess_state import SandboxState
+from server.http_server import make_http_server
+from server.pool import EnginePool
+from conftest import wait_for
+
+
+def idle(engine):
+    return engine.stats()["idle"]
+
+
+def test_worker_suspends_without_clients_and_resumes(fake_uci):
+    engine = StockfishAnalysisEngine(
+        fake_uci, base_time=0.05, step_time=0.05, max_time=0.1, interval=0.01,
+        idle_after=0.3,
+    )
+    try:
+        board = chess.Board()
+        engine.analyse(board)
+        assert wait_for(lambda: idle(engine)["suspended"])
+
+        # analyse() wakes it; it goes idle again and stays there
+        suspensions = idle(engine)["suspensions"]
+        depth = engine.analyse(board).depth
+        assert depth > 0
+        assert wait_for(lambda: idle(engine)["suspensions"] > suspensions)
+        spent = engine.search_seconds
+        time.sleep(0.3)
+        assert engine.search_seconds == spent
+
+        # the result survives suspension and a touch resumes deepening
+        engine.touch()
+        assert wait_for(lambda: engine.search_seconds > spent)
+        assert engine.analyse(board).depth >= depth
+        assert idle(engine)["suspensions"] >= 2
+    finally:
+        engine.stop()
+
+
+def test_continuous_search_is_stopped_when_idle(fake_uci):
+    engine = StockfishAnalysisEngine(
+        fake_uci, base_time=0.5, interval=0.05, continuous=True,
+        publish_interval=0.02, idle_after=0.3,
+    )
+    try:
+        board = chess.Board()
+        # watched until the search has reported, however slow the machine
+        assert wait_for(lambda: engine.analyse(board).depth > 0)
+        assert wait_for(lambda: idle(engine)["suspended"], timeout=10.0)
+        # parked: the search was stopped and its time is counted
+        spent = engine.search_seconds
+        suspensions = idle(engine)["suspensions"]
+        assert spent > 0
+
+        time.sleep(0.2)
+        assert idle(engine)["suspended"]
+        assert idle(engine)["suspensions"] == suspensions
+        assert engine.search_seconds == spent
+    finally:
+        engine.stop()
+
+
+def test_pool_touch_keeps_position_alive(fake_uci):
+    pool = EnginePool(fake_uci, size=1, base_time=0.05, expire_after=0.3)
+    try:
+        board = chess.Board()
+        pool.analyse(board)
+        key = position_key(board)
+
+        deadline = time.monotonic() + 0.8
+        while time.monotonic() < deadline:
+            pool.touch(key)
+            time.sleep(0.05)
+        assert pool.stats()["pool"]["tasks"] == 1
+
+        # unwatched: dropped, the result stays cached
+        assert wait_for(lambda: pool.stats()["pool"]["tasks"] == 0)
+        assert pool.cache.peek(key) is not None
+        assert not pool.analyse(board).pending
+    finally:
+        pool.stop()
+
+
+class WatchedEngine:
+    live = True
+
+    def __init__(self):
+        self.touched = []
+
+    def touch(self, key):
+        self.touched.append(key)
+
+    def analyse(self, board):
+        return AnalysisResult(depth=1, lines=[AnalysisLine(move="e2e4", eval=0.2)])
+
+
+def test_cached_and_parked_requests_count_as_activity():
+    engine = WatchedEngine()
+    state = SandboxState()
+    server = make_http_server("127.0.0.1", 0, state, engine)
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = HTTPConnection(host, port, timeout=5)
+        conn.request("GET", "/state")
+        resp = conn.getresponse()
+        resp.read()
+        etag = resp.getheader("ETag")
+
+        engine.touched.clear()
+        conn.request("GET", "/state", headers={"If-None-Match": etag})
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.status == 304
+        conn.request("GET", f"/state?since={state.version}&timeout=0.1")
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.status == 304
+
+        key = position_key(chess.Board())
+        assert engine.touched == [key, key, key]
+    finally:
+        server.shutdown()
+        server.server_close()
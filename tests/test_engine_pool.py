@@ -0,0 +1,208 @@
+import os
+import signal
+import threading
+import time
+
+import chess
+
+from server.analysis import AnalysisResult
+from server.cache import position_key
+from server.pool import EnginePool, default_pool_size
+from conftest import wait_for
+
+
+def make_pool(fake_uci, **kwargs):
+    options = dict(base_time=0.1, step_time=0.05, max_time=0.3, starvation_time=1.0)
+    options.update(kwargs)
+    return EnginePool(fake_uci, **options)
+
+
+def positions(n):
+    boards = []
+    for uci in ["a2a3", "b2b3", "c2c3", "d2d3", "e2e3", "f2f3", "g2g3", "h2h3"][:n]:
+        board = chess.Board()
+        board.push_uci(uci)
+        boards.append(board)
+    return boards
+
+
+def analysed(pool, board):
+    entry = pool.cache.peek(position_key(board))
+    return entry is not None and entry.result.depth > 0
+
+
+def test_default_size_follows_cores():
+    assert default_pool_size() >= 1
+    assert default_pool_size(threads_per_engine=1) >= default_pool_size(threads_per_engine=4)
+
+
+def test_positions_are_analysed_in_parallel(fake_uci):
+    pool = make_pool(fake_uci, size=3)
+    try:
+        boards = positions(3)
+        for board in boards:
+            assert pool.analyse(board).pending
+
+        assert wait_for(lambda: all(analysed(pool, b) for b in boards))
+        for board in boards:
+            result = pool.analyse(board)
+            assert not result.pending
+            assert result.lines[0].move in {m.uci() for m in board.legal_moves}
+        assert pool.stats()["pool"]["size"] == 3
+    finally:
+        pool.stop()
+
+
+def test_polled_position_preempts_background_work(fake_uci):
+    pool = make_pool(fake_uci, size=1, starvation_time=10.0)
+    try:
+        background = positions(4)
+        for board in background:
+            # deep enough already that each background slice is 2 s long
+            pool.cache.put(position_key(board), AnalysisResult(depth=1, lines=[]), 2.0)
+            pool.submit(board)
+        assert wait_for(lambda: pool.stats()["pool"]["busy"] == 1)
+
+        active = chess.Board()
+        t0 = time.monotonic()
+        pool.analyse(active)
+        assert wait_for(lambda: analysed(pool, active), timeout=1.0)
+        assert time.monotonic() - t0 < 1.0
+        assert pool.stats()["pool"]["preemptions"] == 1
+    finally:
+        pool.stop()
+
+
+def test_background_position_is_not_starved(fake_uci):
+    pool = make_pool(fake_uci, size=1, active_window=10.0, starvation_time=0.5)
+    try:
+        active = positions(2)
+        waiting = chess.Board()
+        for board in active:
+            pool.analyse(board)
+        pool.submit(waiting)
+
+        stop = threading.Event()
+
+        def poll():
+            while not stop.is_set():
+                for board in active:
+                    pool.analyse(board)
+                time.sleep(0.02)
+
+        poller = threading.Thread(target=poll, daemon=True)
+        poller.start()
+        try:
+            assert wait_for(lambda: analysed(pool, waiting), timeout=3.0)
+        finally:
+            stop.set()
+            poller.join()
+        assert pool.stats()["pool"]["starvation_picks"] >= 1
+    finally:
+        pool.stop()
+
+
+def test_stats_report_queue_depth_and_utilisation(fake_uci):
+    pool = make_pool(fake_uci, size=2)
+    try:
+        stats = pool.stats()["pool"]
+        assert stats["queue_depth"] == 0
+        assert stats["utilisation"] == 0.0
+
+        for board in positions(5):
+            pool.analyse(board)
+        assert wait_for(lambda: pool.stats()["pool"]["busy"] == 2)
+
+        stats = pool.stats()["pool"]
+        assert stats["tasks"] == 5
+        assert stats["queue_depth"] == 3
+        assert stats["queued_active"] == 3
+        time.sleep(0.3)
+        assert pool.stats()["pool"]["utilisation"] > 0.8
+    finally:
+        pool.stop()
+
+
+def test_unpolled_positions_expire(fake_uci):
+    pool = make_pool(fake_uci, size=1, expire_after=0.3)
+    try:
+        pool.analyse(chess.Board())
+        assert pool.stats()["pool"]["tasks"] == 1
+        assert wait_for(lambda: pool.stats()["pool"]["tasks"] == 0, timeout=2.0)
+        assert wait_for(lambda: pool.stats()["pool"]["busy"] == 0)
+    finally:
+        pool.stop()
+
+
+def test_game_over_position_is_not_queued(fake_uci):
+    pool = make_pool(fake_uci, size=1)
+    try:
+        stalemate = chess.Board("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+        result = pool.analyse(stalemate)
+        assert not result.pending
+        assert result.lines == []
+        assert pool.stats()["pool"]["tasks"] == 0
+    finally:
+        pool.stop()
+
+
+def test_engine_start_failure_is_reported_and_retried(fake_uci, tmp_path):
+    pool = EnginePool([str(tmp_path / "missing-engine")], size=2, retry_after=0.2)
+    try:
+        board = chess.Board()
+        pool.analyse(board)
+        assert wait_for(lambda: pool.stats()["pool"]["start_failures"] == 2)
+        result = pool.analyse(board)
+        assert result.pending
+        assert "missing-engine" in result.error
+        assert pool.stats()["pool"]["error"] == result.error
+
+        # retried once retry_after has passed, e.g. after fixing the path
+        pool.engine_path = fake_uci
+        time.sleep(0.25)
+        pool.analyse(board)
+        assert wait_for(lambda: pool.stats()["pool"]["engines"] == 2)
+        assert wait_for(lambda: not pool.analyse(board).pending)
+        assert pool.analyse(board).error is None
+        assert pool.stats()["pool"]["error"] is None
+    finally:
+        pool.stop()
+
+
+def kill(engine):
+    os.kill(engine.transport.get_pid(), signal.SIGKILL)
+
+
+def test_engine_that_dies_is_reported_and_replaced(fake_uci):
+    pool = EnginePool(fake_uci, size=1, base_time=0.05, retry_after=0.2)
+    try:
+        board = chess.Board()
+        pool.analyse(board)
+        assert wait_for(lambda: pool.stats()["pool"]["engines"] == 1)
+        kill(pool._engines[0])
+
+        assert wait_for(lambda: pool.stats()["pool"]["engines"] == 0)
+        assert pool.stats()["pool"]["error"] is not None
+        board.push_uci("e2e4")  # a new position, so its result is fresh
+        assert pool.analyse(board).error == pool.stats()["pool"]["error"]
+
+        time.sleep(0.25)
+        pool.analyse(board)
+        assert wait_for(lambda: not pool.analyse(board).pending)
+        assert pool.stats()["pool"]["engines"] == 1
+        assert pool.stats()["pool"]["error"] is None
+    finally:
+        pool.stop()
+
+
+def test_stop_survives_a_dead_engine(fake_uci):
+    # with nothing to analyse, the worker doesn't notice its engine died
+    pool = EnginePool(fake_uci, size=1, base_time=0.05)
+    pool.start()
+    assert wait_for(lambda: pool.stats()["pool"]["engines"] == 1)
+    engine = pool._engines[0]
+    kill(engine)
+    assert wait_for(lambda: engine.protocol.returncode.done())
+    assert pool.stats()["pool"]["engines"] == 1
+    pool.stop()
+    assert pool.stats()["pool"]["engines"] == 0
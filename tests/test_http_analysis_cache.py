@@ -87,7 +87,7 @@ def test_cache_invalidates_after_play_move(http_server):
     assert engine.calls == 2
 
 
-def test_cache_invalidates_after_undo(http_server):
+def test_cache_survives_undo(http_server):
     host, port, _state, engine = http_server
     conn = HTTPConnection(host, port)
 
@@ -99,5 +99,47 @@ def test_cache_invalidates_after_undo(http_server):
     conn.request("POST", "/undo")
     conn.getresponse().read()
 
+    # back in the start position: served from the position cache
     get_state(conn)
-    assert engine.calls == 3
\ No newline at end of file
+    assert engine.calls == 2
+
+    # and the position after e2e4 is still cached too
+    post_json(conn, "/play_move", {"move": "e2e4"})
+    get_state(conn)
+    assert engine.calls == 2
+
+
+def test_transposition_hits_cache(http_server):
+    host, port, _state, engine = http_server
+    conn = HTTPConnection(host, port)
+
+    for mv in ("g1f3", "g8f6", "b1c3"):
+        post_json(conn, "/play_move", {"move": mv})
+    get_state(conn)
+    assert engine.calls == 1
+
+    conn.request("POST", "/reset")
+    conn.getresponse().read()
+    for mv in ("b1c3", "g8f6", "g1f3"):
+        post_json(conn, "/play_move", {"move": mv})
+    get_state(conn)
+    assert engine.calls == 1
+
+
+def test_stats_reports_cache_counters(http_server):
+    host, port, state, _engine = http_server
+    conn = HTTPConnection(host, port)
+
+    get_state(conn)
+    # new version, same position: the encoded body is rebuilt, the
+    # analysis comes from the cache
+    state.mark_changed()
+    get_state(conn)
+
+    conn.request("GET", "/stats")
+    resp = conn.getresponse()
+    stats = json.loads(resp.read())["analysis_cache"]
+
+    assert stats["size"] == 1
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
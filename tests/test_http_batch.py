@@ -0,0 +1,205 @@
+import importlib.util
+import json
+import threading
+import time
+from http.client import HTTPConnection
+from pathlib import Path
+
+import chess
+import pytest
+
+from server.analysis import StubAnalysisEngine
+from server.chess_state import SandboxState
+from server.http_server import MAX_BATCH, make_http_server
+
+# pico/protocol.py, loaded by path (the repo root also has a protocol/ dir)
+_spec = importlib.util.spec_from_file_location(
+    "pico_protocol", Path(__file__).resolve().parents[1] / "pico" / "protocol.py"
+)
+protocol = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(protocol)
+
+
+@pytest.fixture
+def http_server():
+    state = SandboxState()
+    server = make_http_server("127.0.0.1", 0, state, StubAnalysisEngine())
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield host, port, state
+
+    server.shutdown()
+    server.server_close()
+
+
+def post(conn, path, payload):
+    conn.request("POST", path, body=json.dumps(payload).encode())
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read())
+
+
+def test_batch_runs_commands_in_order(http_server):
+    host, port, state = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    status, r = post(conn, "/batch", {"commands": [
+        {"type": "play_move", "move": "e2e4"},
+        {"type": "state"},
+        {"type": "play_move", "move": "e7e5"},
+        {"type": "move_list", "from": "g1"},
+        {"type": "snapshot"},
+    ]})
+
+    assert status == 200
+    assert r["type"] == "batch"
+    moved, mid, _, moves, snap = r["results"]
+    assert moved == {"type": "move_result", "ok": True}
+    assert mid["type"] == "state"
+    assert mid["last_move"] == "e2e4" and mid["turn"] == "black"
+    assert moves["moves"] == ["e2", "f3", "h3"]
+    assert snap["type"] == "snapshot"
+    assert snap["last_move"] == "e7e5" and snap["version"] > mid["version"]
+    assert "e1" in snap["moves"]
+    assert [m.uci() for m in state.board.move_stack] == ["e2e4", "e7e5"]
+
+
+def test_batch_state_matches_state_endpoint(http_server):
+    host, port, _ = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    _, r = post(conn, "/batch", {"commands": [{"type": "reset"}, {"type": "state"}]})
+    conn.request("GET", "/state")
+    st = json.loads(conn.getresponse().read())
+
+    assert r["results"][1] == st
+
+
+def test_batch_failures_do_not_stop_it(http_server):
+    host, port, state = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    _, r = post(conn, "/batch", {"commands": [
+        {"type": "play_move", "move": "e2e5"},
+        {"type": "undo"},
+        {"type": "move_list"},
+        {"type": "castle"},
+        {"type": "play_move", "move": "d2d4"},
+    ]})
+
+    illegal, undo, missing, unknown, played = r["results"]
+    assert illegal["ok"] is False and illegal["reason"] == "illegal_move"
+    assert undo == {"type": "move_result", "ok": False}
+    assert missing == {"type": "error", "reason": "missing_from"}
+    assert unknown == {"type": "error", "reason": "unknown_command"}
+    assert played["ok"] is True
+    assert state.board.peek() == chess.Move.from_uci("d2d4")
+
+
+@pytest.mark.parametrize("payload", [
+    None,
+    {"commands": "undo"},
+    {"commands": ["undo"]},
+])
+def test_batch_rejects_malformed_body(http_server, payload):
+    host, port, _ = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    status, r = post(conn, "/batch", payload)
+    assert status == 400
+    assert r["reason"] == "invalid_batch"
+
+
+def test_batch_size_is_limited(http_server):
+    host, port, state = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    status, r = post(conn, "/batch", {"commands": [{"type": "state"}] * (MAX_BATCH + 1)})
+    assert status == 400
+    assert r["reason"] == "batch_too_large"
+
+
+def test_batch_is_atomic(http_server):
+    # a concurrent client's move never lands between one batch's commands
+    host, port, state = http_server
+    stop = threading.Event()
+
+    def other():
+        conn = HTTPConnection(host, port, timeout=5)
+        while not stop.is_set():
+            post(conn, "/reset", {})
+
+    t = threading.Thread(target=other)
+    t.start()
+    try:
+        conn = HTTPConnection(host, port, timeout=5)
+        for _ in range(20):
+            _, r = post(conn, "/batch", {"commands": [
+                {"type": "reset"},
+                {"type": "play_move", "move": "e2e4"},
+                {"type": "play_move", "move": "e7e5"},
+                {"type": "state"},
+            ]})
+            assert [x.get("ok") for x in r["results"][:3]] == [True, True, True]
+            assert r["results"][3]["move_number"] == 2
+    finally:
+        stop.set()
+        t.join()
+
+
+def test_pico_client_runs_command_with_state(http_server):
+    host, port, state = http_server
+    client = protocol.ServerClient(host, port, snapshot=True)
+
+    st = client.run({"type": "play_move", "move": "g1f3"})
+    assert st is client.state
+    assert st["type"] == "snapshot" and st["last_move"] == "g1f3"
+    assert client.local_moves("g8")[0] == ["f6", "h6"]
+
+    results = client.batch([{"type": "undo"}, {"type": "undo"}])
+    assert [r["ok"] for r in results] == [True, False]
+    assert not state.board.move_stack
+    client.conn.close()
+
+
+class SlowEngine(StubAnalysisEngine):
+    def analyse(self, board):
+        time.sleep(0.5)
+        return super().analyse(board)
+
+
+def test_pico_client_does_not_resend_timed_out_command():
+    state = SandboxState()
+    state.board.push_uci("e2e4")
+    state.board.push_uci("e7e5")
+    server = make_http_server("127.0.0.1", 0, state, SlowEngine(), cache_responses=False)
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = protocol.ServerClient(host, port, timeout=0.2)
+        client.conn.request("GET", "/piece_list")  # connection is now reused
+        assert client.run({"type": "undo"}) is None  # timed out
+        time.sleep(0.6)
+        assert len(state.board.move_stack) == 1
+    finally:
+        client.conn.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_pico_client_retries_on_dropped_idle_connection():
+    state = SandboxState()
+    server = make_http_server("127.0.0.1", 0, state, StubAnalysisEngine(), idle_timeout=0.1)
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = protocol.KeepAliveConnection(host, port)
+        assert conn.request("GET", "/piece_list")[0] == 200
+        time.sleep(0.3)  # the server closes the idle connection
+        status, _, _ = conn.request("POST", "/play_move", json.dumps({"move": "e2e4"}).encode())
+        assert status == 200
+        assert len(state.board.move_stack) == 1
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+from http.client import HTTPConnection
+
+import pytest
+
+from server.http_server import make_http_server
+from server.chess_state import SandboxState
+from server.analysis import AnalysisLine, AnalysisResult
+
+
+class BlockingEngine:
+    """
+    Engine whose analyse() blocks until the test releases it.
+    """
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def analyse(self, board):
+        self.calls += 1
+        self.entered.set()
+        self.release.wait(timeout=5)
+        return AnalysisResult(
+            depth=1,
+            lines=[AnalysisLine(move="e2e4", eval=0.0)],
+        )
+
+
+@pytest.fixture
+def http_server():
+    state = SandboxState()
+    engine = BlockingEngine()
+
+    server = make_http_server("127.0.0.1", 0, state, engine)
+    host, port = server.server_address
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield host, port, state, engine
+
+    engine.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+def test_slow_state_does_not_block_commands(http_server):
+    host, port, state, engine = http_server
+
+    slow = {}
+
+    def slow_state():
+        conn = HTTPConnection(host, port, timeout=5)
+        conn.request("GET", "/state")
+        resp = conn.getresponse()
+        slow["data"] = json.loads(resp.read())
+
+    t = threading.Thread(target=slow_state)
+    t.start()
+    assert engine.entered.wait(timeout=2)
+
+    conn = HTTPConnection(host, port, timeout=2)
+    conn.request(
+        "POST",
+        "/play_move",
+        body=json.dumps({"move": "e2e4"}),
+        headers={"Content-Type": "application/json"},
+    )
+    resp = conn.getresponse()
+    data = json.loads(resp.read())
+    assert data["ok"] is True
+
+    conn.request("GET", "/piece_list")
+    resp = conn.getresponse()
+    assert resp.status == 200
+    resp.read()
+
+    engine.release.set()
+    t.join(timeout=5)
+
+    # the parked /state answers for the position it snapshotted
+    assert slow["data"]["last_move"] is None
+    assert state.board.peek().uci() == "e2e4"
+
+
+def test_concurrent_requests_share_one_analysis(http_server):
+    host, port, state, engine = http_server
+    results = []
+
+    def get_state():
+        conn = HTTPConnection(host, port, timeout=5)
+        conn.request("GET", "/state")
+        results.append(json.loads(conn.getresponse().read()))
+
+    threads = [threading.Thread(target=get_state) for _ in range(6)]
+    for t in threads:
+        t.start()
+    assert engine.entered.wait(timeout=2)
+
+    # wait until the other five are parked on the running analysis
+    conn = HTTPConnection(host, port, timeout=2)
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        conn.request("GET", "/stats")
+        coalescing = json.loads(conn.getresponse().read())["coalescing"]
+        if coalescing["coalesced"] == 5:
+            break
+        time.sleep(0.01)
+
+    engine.release.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert engine.calls == 1
+    assert coalescing == {"calls": 1, "coalesced": 5, "in_flight": 1}
+    assert len(results) == 6
+    assert all(r["analysis"] == results[0]["analysis"] for r in results)
@@ -0,0 +1,98 @@
+import json
+import socket
+import threading
+import time
+from http.client import HTTPConnection
+
+import pytest
+
+from server.http_server import make_http_server
+from server.chess_state import SandboxState
+from server.analysis import StubAnalysisEngine
+
+
+@pytest.fixture
+def http_server():
+    state = SandboxState()
+    engine = StubAnalysisEngine()
+
+    server = make_http_server("127.0.0.1", 0, state, engine, idle_timeout=0.3)
+    host, port = server.server_address
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield host, port
+
+    server.shutdown()
+    server.server_close()
+
+
+def read_response(f):
+    status = int(f.readline().split()[1])
+    length = 0
+    while True:
+        line = f.readline()
+        if line in (b"\r\n", b""):
+            break
+        k, _, v = line.decode().partition(":")
+        if k.lower() == "content-length":
+            length = int(v)
+    return status, f.read(length)
+
+
+def test_requests_reuse_one_connection(http_server):
+    host, port = http_server
+    conn = HTTPConnection(host, port)
+
+    conn.request("GET", "/state")
+    resp = conn.getresponse()
+    resp.read()
+    assert resp.version == 11
+    sock = conn.sock
+
+    conn.request("POST", "/undo")
+    conn.getresponse().read()
+    conn.request("GET", "/nope")
+    resp = conn.getresponse()
+    resp.read()
+    assert resp.status == 404
+
+    conn.request("GET", "/piece_list")
+    conn.getresponse().read()
+
+    assert conn.sock is sock
+
+
+def test_pipelined_requests_answered_in_order(http_server):
+    host, port = http_server
+
+    body = json.dumps({"from": "e2"}).encode()
+    requests = (
+        b"GET /piece_list HTTP/1.1\r\nHost: x\r\n\r\n"
+        + b"POST /move_list HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n" % len(body)
+        + body
+        + b"POST /undo HTTP/1.1\r\nHost: x\r\nContent-Length: 0\r\n\r\n"
+    )
+
+    with socket.create_connection((host, port), timeout=2) as s:
+        s.sendall(requests)
+        f = s.makefile("rb")
+        results = [read_response(f) for _ in range(3)]
+
+    assert [status for status, _ in results] == [200, 200, 200]
+    assert json.loads(results[0][1])["type"] == "piece_list"
+    assert json.loads(results[1][1])["moves"] == ["e3", "e4"]
+    assert json.loads(results[2][1])["type"] == "move_result"
+
+
+def test_idle_connection_is_closed(http_server):
+    host, port = http_server
+
+    with socket.create_connection((host, port), timeout=2) as s:
+        s.sendall(b"GET /state HTTP/1.1\r\nHost: x\r\n\r\n")
+        f = s.makefile("rb")
+        assert read_response(f)[0] == 200
+
+        time.sleep(0.6)
+        assert f.read() == b""
@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+from http.client import HTTPConnection
+
+import pytest
+
+from server.http_server import make_http_server
+from server.chess_state import SandboxState
+from server.analysis import StubAnalysisEngine
+
+
+@pytest.fixture
+def http_server():
+    state = SandboxState()
+    engine = StubAnalysisEngine()
+
+    server = make_http_server("127.0.0.1", 0, state, engine)
+    host, port = server.server_address
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield host, port, state
+
+    server.shutdown()
+    server.server_close()
+
+
+def long_poll(host, port, since, timeout):
+    conn = HTTPConnection(host, port, timeout=timeout + 5)
+    conn.request("GET", f"/state?since={since}&timeout={timeout}")
+    resp = conn.getresponse()
+    return resp.status, resp.read()
+
+
+def test_long_poll_times_out_with_304(http_server):
+    host, port, state = http_server
+
+    t0 = time.monotonic()
+    status, body = long_poll(host, port, state.version, 0.3)
+
+    assert status == 304
+    assert body == b""
+    assert time.monotonic() - t0 >= 0.25
+
+
+def test_long_poll_returns_immediately_when_behind(http_server):
+    host, port, state = http_server
+    state.play("e2e4")
+
+    t0 = time.monotonic()
+    status, body = long_poll(host, port, 0, 5)
+
+    assert status == 200
+    assert json.loads(body)["last_move"] == "e2e4"
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_long_poll_ahead_of_server_answers_now(http_server):
+    # e.g. a client that kept its version across a server restart
+    host, port, state = http_server
+
+    t0 = time.monotonic()
+    status, body = long_poll(host, port, state.version + 57, 5)
+
+    assert status == 200
+    assert json.loads(body)["version"] == state.version
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_parked_requests_wake_on_change(http_server):
+    host, port, state = http_server
+    since = state.version
+
+    results = []
+
+    def park():
+        results.append(long_poll(host, port, since, 10))
+
+    threads = [threading.Thread(target=park) for _ in range(20)]
+    for t in threads:
+        t.start()
+    time.sleep(0.3)
+
+    t0 = time.monotonic()
+    state.play("e2e4")
+    for t in threads:
+        t.join(timeout=5)
+
+    assert time.monotonic() - t0 < 2.0
+    assert len(results) == 20
+    for status, body in results:
+        assert status == 200
+        data = json.loads(body)
+        assert data["version"] > since
+        assert data["last_move"] == "e2e4"
+
+
+def test_long_poll_bad_since_returns_400(http_server):
+    host, port, _ = http_server
+    status, _ = long_poll(host, port, "abc", 1)
+    assert status == 400
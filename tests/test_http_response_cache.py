@@ -0,0 +1,113 @@
+import gc
+import json
+import threading
+from http.client import HTTPConnection
+
+import pytest
+
+from server.analysis import AnalysisLine, AnalysisResult
+from server.chess_state import SandboxState
+from server.http_server import make_http_server
+from server.responses import ResponseCache
+from server import wire
+
+
+class CountingEngine:
+    live = True  # no position cache in front: every build calls analyse()
+
+    def __init__(self):
+        self.calls = 0
+
+    def analyse(self, board):
+        self.calls += 1
+        return AnalysisResult(depth=self.calls, lines=[AnalysisLine(move="e2e4", eval=0.1)])
+
+
+@pytest.fixture
+def http_server():
+    state = SandboxState()
+    engine = CountingEngine()
+    server = make_http_server("127.0.0.1", 0, state, engine)
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield HTTPConnection(host, port, timeout=5), state, engine
+
+    server.shutdown()
+    server.server_close()
+
+
+def get(conn, path, headers=None):
+    conn.request("GET", path, headers=headers or {})
+    resp = conn.getresponse()
+    return resp, resp.read()
+
+
+def test_unchanged_state_is_served_from_cache(http_server):
+    conn, _, engine = http_server
+
+    _, first = get(conn, "/state")
+    _, second = get(conn, "/state")
+
+    assert second == first
+    assert engine.calls == 1
+    _, stats = get(conn, "/stats")
+    assert json.loads(stats)["responses"]["hits"] == 1
+
+
+def test_board_and_analysis_changes_invalidate(http_server):
+    conn, state, engine = http_server
+
+    _, first = get(conn, "/state")
+    state.play("e2e4")
+    _, moved = get(conn, "/state")
+    assert json.loads(moved)["last_move"] == "e2e4"
+
+    # an analysis publish bumps the version without touching the board
+    state.mark_changed()
+    _, published = get(conn, "/state")
+    assert json.loads(published)["version"] == state.version
+    assert json.loads(published)["analysis"]["depth"] == engine.calls == 3
+
+
+def test_each_format_is_cached_separately(http_server):
+    conn, _, engine = http_server
+
+    bodies = {}
+    for path, headers in (
+        ("/state", {}),
+        ("/state", {"Accept": wire.CONTENT_TYPE}),
+        ("/snapshot", {}),
+        ("/snapshot", {"Accept": wire.CONTENT_TYPE}),
+    ):
+        for _ in range(2):
+            resp, body = get(conn, path, headers)
+            bodies.setdefault((path, bool(headers)), set()).add(body)
+
+    assert all(len(b) == 1 for b in bodies.values())
+    assert len({next(iter(b)) for b in bodies.values()}) == 4
+    assert engine.calls == 4
+
+
+def test_fresh_bypasses_cache(http_server):
+    conn, _, engine = http_server
+
+    get(conn, "/state")
+    get(conn, "/state?fresh=1")
+    assert engine.calls == 2
+
+
+def test_entries_go_away_with_their_state():
+    cache = ResponseCache()
+    state = SandboxState()
+    cache.put(state, "/state", 3, b"body")
+    assert cache.get(state, "/state", 3) == b"body"
+    assert cache.get(state, "/state", 4) is None
+
+    # an older version never replaces a newer body
+    cache.put(state, "/state", 2, b"old")
+    assert cache.get(state, "/state", 3) == b"body"
+
+    del state
+    gc.collect()
+    assert cache.stats()["states"] == 0
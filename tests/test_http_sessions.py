@@ -0,0 +1,173 @@
+import json
+import threading
+import time
+from http.client import HTTPConnection
+
+import chess
+import pytest
+
+from server.analysis import StubAnalysisEngine
+from server.http_server import make_http_server
+from server.pool import EnginePool
+from server.sessions import SessionManager
+
+
+def serve(engine, sessions):
+    server = make_http_server("127.0.0.1", 0, sessions.default, engine, sessions=sessions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def http_server():
+    sessions = SessionManager(max_sessions=64)
+    server = serve(StubAnalysisEngine(), sessions)
+    host, port = server.server_address
+
+    yield host, port, sessions
+
+    server.shutdown()
+    server.server_close()
+
+
+def request(conn, method, path, session=None, body=None):
+    headers = {"Content-Type": "application/json"}
+    if session is not None:
+        headers["X-Session-Id"] = session
+    payload = json.dumps(body) if body is not None else None
+    conn.request(method, path, body=payload, headers=headers)
+    resp = conn.getresponse()
+    data = resp.read()
+    return resp.status, (json.loads(data) if data else None)
+
+
+def test_sessions_have_independent_boards(http_server):
+    host, port, sessions = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    request(conn, "POST", "/play_move", "pico-a", {"move": "e2e4"})
+    request(conn, "POST", "/play_move", "pico-b", {"move": "d2d4"})
+
+    _, a = request(conn, "GET", "/state", "pico-a")
+    _, b = request(conn, "GET", "/state", "pico-b")
+    _, default = request(conn, "GET", "/state")
+
+    assert a["last_move"] == "e2e4"
+    assert b["last_move"] == "d2d4"
+    assert default["last_move"] is None
+    assert len(sessions) == 2
+
+
+def test_session_can_be_given_in_query(http_server):
+    host, port, _ = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    request(conn, "POST", "/play_move?session=pico-q", body={"move": "g1f3"})
+    _, data = request(conn, "GET", "/state", "pico-q")
+    assert data["last_move"] == "g1f3"
+
+
+def test_invalid_session_id_is_rejected(http_server):
+    host, port, _ = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    status, data = request(conn, "GET", "/state", "bad id!")
+    assert status == 400
+    assert data["reason"] == "invalid_session"
+
+
+def test_session_table_is_bounded(http_server):
+    host, port, sessions = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    for i in range(sessions.max_sessions):
+        assert request(conn, "GET", "/piece_list", f"s{i}")[0] == 200
+    status, data = request(conn, "GET", "/piece_list", "one-too-many")
+    assert status == 503
+    assert data["reason"] == "too_many_sessions"
+
+
+def test_idle_sessions_are_evicted():
+    sessions = SessionManager(idle_timeout=0.1, sweep_interval=0.0)
+    a = sessions.get("a")
+    a.play("e2e4")
+    assert sessions.get("a") is a
+
+    time.sleep(0.2)
+    sessions.get("b")
+    assert len(sessions) == 1
+    # a fresh game if the device comes back later
+    assert sessions.get("a").board.move_stack == []
+    assert sessions.stats()["evicted"] == 1
+
+
+def test_identical_positions_share_analysis(fake_uci):
+    engine = EnginePool(fake_uci, size=1, base_time=0.05, step_time=0.05, max_time=0.2)
+    sessions = SessionManager()
+    server = serve(engine, sessions)
+    host, port = server.server_address
+    try:
+        conn = HTTPConnection(host, port, timeout=5)
+        for sid in ("a", "b"):
+            request(conn, "POST", "/play_move", sid, {"move": "e2e4"})
+            request(conn, "GET", "/state", sid)
+        assert engine.stats()["pool"]["tasks"] == 1
+
+        # a publish for the shared position bumps both sessions
+        since = {sid: sessions.get(sid).version for sid in ("a", "b")}
+        for sid in ("a", "b"):
+            status, data = request(conn, "GET", f"/state?since={since[sid]}&timeout=5", sid)
+            assert status == 200
+            assert data["analysis"]["lines"]
+
+        # ...but not one on another position
+        other = sessions.get("c")
+        version = other.version
+        time.sleep(0.3)
+        assert other.version == version
+    finally:
+        server.shutdown()
+        server.server_close()
+        engine.stop()
+
+
+def test_dozens_of_sessions_play_at_once(fake_uci):
+    # latency under this load is measured by bench/sessions_load.py
+    engine = EnginePool(fake_uci, size=2, base_time=0.05, step_time=0.05, max_time=0.2)
+    sessions = SessionManager()
+    server = serve(engine, sessions)
+    host, port = server.server_address
+    errors = []
+
+    def device(n):
+        conn = HTTPConnection(host, port, timeout=5)
+        board = chess.Board()
+        try:
+            for _ in range(6):
+                move = sorted(board.legal_moves, key=lambda m: m.uci())[n % board.legal_moves.count()]
+                for method, path, body in (
+                    ("POST", "/play_move", {"move": move.uci()}),
+                    ("GET", "/state", None),
+                    ("GET", "/piece_list", None),
+                ):
+                    status, _ = request(conn, method, path, f"device-{n}", body)
+                    assert status == 200
+                board.push(move)
+            _, data = request(conn, "GET", "/state", f"device-{n}")
+            assert data["last_move"] == board.peek().uci()
+        except Exception as exc:
+            errors.append(exc)
+
+    try:
+        threads = [threading.Thread(target=device, args=(n,)) for n in range(32)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert not errors
+        assert len(sessions) == 32
+    finally:
+        server.shutdown()
+        server.server_close()
+        engine.stop()
@@ -0,0 +1,112 @@
+import json
+import threading
+from http.client import HTTPConnection
+
+import chess
+import pytest
+
+from server.analysis import StubAnalysisEngine
+from server.chess_state import SandboxState
+from server.http_server import make_http_server
+
+
+@pytest.fixture
+def http_server():
+    state = SandboxState()
+    server = make_http_server("127.0.0.1", 0, state, StubAnalysisEngine())
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield host, port, state
+
+    server.shutdown()
+    server.server_close()
+
+
+def get(conn, path, headers=None):
+    conn.request("GET", path, headers=headers or {})
+    resp = conn.getresponse()
+    body = resp.read()
+    return resp, (json.loads(body) if body else None)
+
+
+def unpack(packed):
+    return [packed[i:i + 2] for i in range(0, len(packed), 2)]
+
+
+def test_snapshot_has_state_analysis_and_move_tree(http_server):
+    host, port, _ = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    _, snap = get(conn, "/snapshot")
+    _, st = get(conn, "/state")
+    _, pieces = get(conn, "/piece_list")
+
+    assert snap["type"] == "snapshot"
+    for field in ("version", "turn", "move_number", "last_move", "game_over", "analysis"):
+        assert snap[field] == st[field]
+
+    assert sorted(snap["moves"]) == pieces["pieces"]
+    assert unpack(snap["moves"]["e2"]) == ["e3", "e4"]
+    assert unpack(snap["moves"]["g1"]) == ["f3", "h3"]
+    assert snap["promotions"] == {}
+
+
+def test_snapshot_move_tree_matches_move_list(http_server):
+    host, port, state = http_server
+    state.play("e2e4")
+    state.play("d7d5")
+    conn = HTTPConnection(host, port, timeout=5)
+
+    _, snap = get(conn, "/snapshot")
+    for from_sq, packed in snap["moves"].items():
+        conn.request(
+            "POST", "/move_list",
+            body=json.dumps({"from": from_sq}),
+            headers={"Content-Type": "application/json"},
+        )
+        listed = json.loads(conn.getresponse().read())
+        assert unpack(packed) == listed["moves"]
+
+
+def test_snapshot_reports_promotions(http_server):
+    host, port, state = http_server
+    state.board = chess.Board("1n6/P7/8/8/8/8/8/k6K w - - 0 1")
+    conn = HTTPConnection(host, port, timeout=5)
+
+    _, snap = get(conn, "/snapshot")
+    assert unpack(snap["promotions"]["a7"]) == ["a8", "b8"]
+
+
+def test_snapshot_etag_is_separate_from_state(http_server):
+    host, port, state = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    resp, _ = get(conn, "/snapshot")
+    etag = resp.getheader("ETag")
+    assert etag == f'"s{state.version}"'
+
+    resp, _ = get(conn, "/snapshot", {"If-None-Match": etag})
+    assert resp.status == 304
+    resp, body = get(conn, "/state", {"If-None-Match": etag})
+    assert resp.status == 200
+    assert body["type"] == "state"
+
+
+def test_snapshot_long_poll_returns_new_tree(http_server):
+    host, port, state = http_server
+    since = state.version
+    result = {}
+
+    def park():
+        conn = HTTPConnection(host, port, timeout=10)
+        result["snap"] = get(conn, f"/snapshot?since={since}&timeout=5")[1]
+
+    t = threading.Thread(target=park)
+    t.start()
+    state.play("e2e4")
+    t.join(timeout=5)
+
+    snap = result["snap"]
+    assert snap["last_move"] == "e2e4"
+    assert unpack(snap["moves"]["e7"]) == ["e5", "e6"]
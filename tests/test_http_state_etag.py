@@ -0,0 +1,125 @@
+import json
+import threading
+from http.client import HTTPConnection
+
+import pytest
+
+from server.http_server import make_http_server
+from server.chess_state import SandboxState
+from server.analysis import AnalysisLine, AnalysisResult, StubAnalysisEngine
+
+
+class PublishingEngine:
+    """
+    Live engine stand-in: the test decides when a deeper result appears.
+    """
+
+    live = True
+
+    def __init__(self):
+        self.depth = 1
+        self._listeners = []
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def publish(self, depth):
+        self.depth = depth
+        for fn in self._listeners:
+            fn()
+
+    def analyse(self, board):
+        return AnalysisResult(
+            depth=self.depth,
+            lines=[AnalysisLine(move="e2e4", eval=0.2)],
+        )
+
+
+def start(engine):
+    state = SandboxState()
+    server = make_http_server("127.0.0.1", 0, state, engine)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+@pytest.fixture
+def stub_server():
+    server, state = start(StubAnalysisEngine())
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def live_server():
+    engine = PublishingEngine()
+    server, state = start(engine)
+    yield server.server_address, engine
+    server.shutdown()
+    server.server_close()
+
+
+def get_state(conn, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    conn.request("GET", "/state", headers=headers)
+    resp = conn.getresponse()
+    body = resp.read()
+    return resp.status, resp.getheader("ETag"), body
+
+
+def test_unchanged_state_returns_304(stub_server):
+    conn = HTTPConnection(*stub_server)
+
+    status, etag, body = get_state(conn)
+    assert status == 200
+    assert etag
+    assert json.loads(body)["version"] == int(etag.strip('"'))
+
+    status, etag2, body = get_state(conn, etag)
+    assert status == 304
+    assert etag2 == etag
+    assert body == b""
+
+
+def test_move_changes_etag(stub_server):
+    conn = HTTPConnection(*stub_server)
+
+    _, etag, _ = get_state(conn)
+
+    conn.request(
+        "POST",
+        "/play_move",
+        body=json.dumps({"move": "e2e4"}),
+        headers={"Content-Type": "application/json"},
+    )
+    conn.getresponse().read()
+
+    status, etag2, body = get_state(conn, etag)
+    assert status == 200
+    assert int(etag2.strip('"')) > int(etag.strip('"'))
+    assert json.loads(body)["last_move"] == "e2e4"
+
+
+def test_fresh_ignores_if_none_match(stub_server):
+    conn = HTTPConnection(*stub_server)
+
+    _, etag, _ = get_state(conn)
+    conn.request("GET", "/state?fresh=1", headers={"If-None-Match": etag})
+    resp = conn.getresponse()
+    resp.read()
+    assert resp.status == 200
+
+
+def test_published_analysis_changes_etag(live_server):
+    address, engine = live_server
+    conn = HTTPConnection(*address)
+
+    _, etag, _ = get_state(conn)
+    assert get_state(conn, etag)[0] == 304
+
+    engine.publish(depth=12)
+
+    status, etag2, body = get_state(conn, etag)
+    assert status == 200
+    assert etag2 != etag
+    assert json.loads(body)["analysis"]["depth"] == 12
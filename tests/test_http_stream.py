@@ -0,0 +1,147 @@
+import json
+import socket
+import threading
+import time
+from http.client import HTTPConnection
+
+import pytest
+
+from server.http_server import make_http_server
+from server.chess_state import SandboxState
+from server.analysis import StubAnalysisEngine
+
+
+@pytest.fixture
+def http_server():
+    state = SandboxState()
+    engine = StubAnalysisEngine()
+
+    server = make_http_server("127.0.0.1", 0, state, engine)
+    server.RequestHandlerClass.stream_heartbeat = 0.1
+    host, port = server.server_address
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server, host, port, state
+
+    server.shutdown()
+    server.server_close()
+
+
+def open_stream(host, port, headers=b""):
+    s = socket.create_connection((host, port), timeout=2)
+    s.sendall(b"GET /stream HTTP/1.1\r\nHost: x\r\n" + headers + b"\r\n")
+    f = s.makefile("rb")
+    status = int(f.readline().split()[1])
+    while f.readline() not in (b"\r\n", b""):
+        pass
+    return s, f, status
+
+
+def next_event(f):
+    """
+    Return the next state event's data, skipping heartbeats.
+    """
+    while True:
+        data = None
+        while True:
+            line = f.readline()
+            assert line, "stream closed"
+            if line == b"\n":
+                break
+            if line.startswith(b"data: "):
+                data = json.loads(line[6:])
+        if data is not None:
+            return data
+
+
+def test_stream_sends_current_state_then_changes(http_server):
+    _, host, port, state = http_server
+    s, f, status = open_stream(host, port)
+    try:
+        assert status == 200
+
+        first = next_event(f)
+        assert first["type"] == "state"
+        assert first["last_move"] is None
+
+        state.play("e2e4")
+        second = next_event(f)
+        assert second["version"] > first["version"]
+        assert second["last_move"] == "e2e4"
+    finally:
+        f.close()
+        s.close()
+
+
+def test_stream_resumes_from_last_event_id(http_server):
+    _, host, port, state = http_server
+    state.play("e2e4")
+
+    # up to date: nothing until the next change
+    s, f, _ = open_stream(host, port, b"Last-Event-ID: %d\r\n" % state.version)
+    try:
+        state.play("e7e5")
+        assert next_event(f)["last_move"] == "e7e5"
+    finally:
+        f.close()
+        s.close()
+
+    # an id from before a server restart: the current state right away
+    s, f, _ = open_stream(host, port, b"Last-Event-ID: %d\r\n" % (state.version + 57))
+    try:
+        event = next_event(f)
+        assert event["version"] == state.version
+        assert event["last_move"] == "e7e5"
+    finally:
+        f.close()
+        s.close()
+
+
+def test_stream_many_subscribers_see_same_change(http_server):
+    _, host, port, state = http_server
+    subs = [open_stream(host, port) for _ in range(10)]
+    try:
+        for _, f, _ in subs:
+            next_event(f)
+
+        state.play("d2d4")
+        for _, f, _ in subs:
+            assert next_event(f)["last_move"] == "d2d4"
+    finally:
+        for s, f, _ in subs:
+            f.close()
+            s.close()
+
+
+def test_stream_limit_and_slot_release(http_server):
+    server, host, port, _ = http_server
+    server.RequestHandlerClass.max_streams = 1
+
+    s, f, status = open_stream(host, port)
+    assert status == 200
+    next_event(f)
+
+    conn = HTTPConnection(host, port, timeout=2)
+    conn.request("GET", "/stream")
+    resp = conn.getresponse()
+    resp.read()
+    assert resp.status == 503
+
+    # the closed subscriber is noticed on the next heartbeat write
+    f.close()
+    s.close()
+    deadline = time.monotonic() + 2
+    while True:
+        s2, f2, status = open_stream(host, port)
+        if status == 200 or time.monotonic() > deadline:
+            break
+        f2.close()
+        s2.close()
+        time.sleep(0.1)
+    try:
+        assert status == 200
+    finally:
+        f2.close()
+        s2.close()
@@ -0,0 +1,91 @@
+import json
+import threading
+from http.client import HTTPConnection
+
+import chess
+
+from server.analysis import StubAnalysisEngine
+from server.chess_state import SandboxState
+from server.http_server import make_http_server
+from server.move_index import MoveIndex
+
+
+def test_index_groups_moves_by_square():
+    index = MoveIndex.build(chess.Board())
+
+    assert index.squares == ["a2", "b1", "b2", "c2", "d2", "e2", "f2", "g1", "g2", "h2"]
+    assert index.moves_from("e2") == ["e3", "e4"]
+    assert index.moves_from("g1") == ["f3", "h3"]
+    assert index.moves_from("e4") == []
+    assert "g1 n" in index.labels
+
+
+def test_index_records_promotions():
+    board = chess.Board("1n6/P7/8/8/8/8/8/k6K w - - 0 1")
+    index = MoveIndex.build(board)
+
+    # straight push and capture, four pieces each, one entry per square
+    assert index.moves_from("a7") == ["a8", "b8"]
+    assert index.promotions_from("a7") == ["a8", "b8"]
+    assert index.uci("a7", "b8") == "a7b8q"
+    assert index.uci("h1", "h2") == "h1h2"
+
+
+def test_index_is_built_once_per_board_change():
+    state = SandboxState()
+    index = state.move_index()
+    assert state.move_index() is index
+
+    state.mark_changed()  # analysis publish, same board
+    assert state.move_index() is index
+
+    state.play("e2e4")
+    after = state.move_index()
+    assert after is not index
+    assert after.moves_from("e7") == ["e5", "e6"]
+
+    state.undo()
+    assert state.move_index().moves_from("e2") == ["e3", "e4"]
+
+    # pushes made directly on the board are noticed too
+    state.board.push_uci("d2d4")
+    assert state.move_index().moves_from("d2") == []
+
+    state.board = chess.Board("8/P7/8/8/8/8/8/k6K w - - 0 1")
+    assert state.move_index().promotions_from("a7") == ["a8"]
+
+
+def test_menu_select_promotes_to_queen():
+    state = SandboxState()
+    state.board = chess.Board("8/P7/8/8/8/8/8/k6K w - - 0 1")
+    state.update_pieces()
+
+    state.select()  # -> pieces
+    state.cursor = state.pieces.index("a7 p")
+    state.select()  # -> moves
+    state.cursor = state.moves.index("a8")
+    state.select()
+
+    assert state.board.peek().uci() == "a7a8q"
+
+
+def test_move_list_reports_promotions():
+    state = SandboxState()
+    state.board = chess.Board("8/P7/8/8/8/8/8/k6K w - - 0 1")
+    httpd = make_http_server("127.0.0.1", 0, state, StubAnalysisEngine())
+    host, port = httpd.server_address
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    try:
+        conn = HTTPConnection(host, port, timeout=5)
+        conn.request(
+            "POST", "/move_list",
+            body=json.dumps({"from": "a7"}),
+            headers={"Content-Type": "application/json"},
+        )
+        data = json.loads(conn.getresponse().read())
+        assert data["moves"] == ["a8"]
+        assert data["promotions"] == ["a8"]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
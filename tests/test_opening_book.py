@@ -0,0 +1,160 @@
+import json
+import struct
+import threading
+from http.client import HTTPConnection
+
+import chess
+import chess.polyglot
+import pytest
+
+from server.analysis import StockfishAnalysisEngine
+from server.book import OpeningBook
+from server.chess_state import SandboxState
+from server.http_server import make_http_server
+from server.pool import EnginePool
+from server import wire
+from conftest import wait_for
+
+
+ENTRY = struct.Struct(">QHHI")
+CASTLE_FEN = "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 0 1"
+
+
+def write_book(path, positions):
+    """
+    Polyglot file from [(board, [(uci, weight), ...]), ...], sorted by key.
+    """
+    entries = []
+    for board, moves in positions:
+        key = chess.polyglot.zobrist_hash(board)
+        for uci, weight in moves:
+            move = chess.Move.from_uci(uci)
+            entries.append((key, move.to_square | move.from_square << 6, weight, 0))
+    path.write_bytes(b"".join(ENTRY.pack(*e) for e in sorted(entries)))
+    return path
+
+
+def board_after(*moves):
+    board = chess.Board()
+    for uci in moves:
+        board.push_uci(uci)
+    return board
+
+
+@pytest.fixture
+def book_path(tmp_path):
+    return write_book(tmp_path / "book.bin", [
+        (chess.Board(), [("e2e4", 50), ("d2d4", 30), ("c2c4", 15), ("g1f3", 5)]),
+        (board_after("e2e4"), [("c7c5", 10), ("e7e5", 10)]),
+        # polyglot writes castling as king-takes-rook
+        (chess.Board(CASTLE_FEN), [("e1h1", 1)]),
+    ])
+
+
+def test_lookup_maps_weights_to_lines(book_path):
+    book = OpeningBook(book_path)
+    try:
+        result = book.lookup(chess.Board())
+        assert result.book and result.pending and result.depth == 0
+        assert [(l.move, l.eval, l.weight) for l in result.lines] == [
+            ("e2e4", 0.0, 0.5),
+            ("d2d4", 0.0, 0.3),
+            ("c2c4", 0.0, 0.15),
+        ]
+
+        assert [l.move for l in book.lookup(board_after("e2e4")).lines] == ["c7c5", "e7e5"]
+        assert book.lookup(board_after("a2a3")) is None
+        assert book.stats() == {"files": 1, "entries": 7, "hits": 2, "misses": 1}
+    finally:
+        book.close()
+
+
+def test_castling_entries_become_legal_moves(book_path):
+    book = OpeningBook(book_path)
+    try:
+        board = chess.Board(CASTLE_FEN)
+        assert [l.move for l in book.lookup(board).lines] == ["e1g1"]
+    finally:
+        book.close()
+
+
+def test_books_are_merged_and_light_moves_dropped(book_path, tmp_path):
+    extra = write_book(tmp_path / "extra.bin", [(chess.Board(), [("d2d4", 40), ("b2b3", 1)])])
+    book = OpeningBook([book_path, extra], max_lines=5, min_weight=2)
+    try:
+        lines = book.lookup(chess.Board()).lines
+        assert [l.move for l in lines] == ["d2d4", "e2e4", "c2c4", "g1f3"]
+        assert lines[0].weight == 0.5
+    finally:
+        book.close()
+
+
+def test_pool_answers_from_book_until_searched(fake_uci, book_path):
+    book = OpeningBook(book_path)
+    pool = EnginePool(fake_uci, size=1, base_time=0.1, book=book)
+    try:
+        first = pool.analyse(chess.Board())
+        assert first.book and first.lines[0].move == "e2e4"
+
+        assert wait_for(lambda: not pool.analyse(chess.Board()).pending)
+        assert not pool.analyse(chess.Board()).book
+        assert pool.stats()["book"]["hits"] >= 1
+
+        # outside the book: the usual placeholder
+        assert not pool.analyse(board_after("h2h4")).book
+    finally:
+        pool.stop()
+        book.close()
+
+
+def test_blocking_engine_skips_one_shot_for_book_positions(fake_uci, book_path):
+    book = OpeningBook(book_path)
+    engine = StockfishAnalysisEngine(fake_uci, base_time=0.2, interval=0.01, book=book)
+    try:
+        first = engine.analyse(chess.Board())
+        assert first.book
+        # answered from the book, without a one-shot search
+        assert engine.stats()["coalescing"]["calls"] == 0
+
+        published = threading.Event()
+        engine.add_listener(published.set)
+        assert published.wait(timeout=5)
+        assert not engine.analyse(chess.Board()).book
+    finally:
+        engine.stop()
+        book.close()
+
+
+class BookOnlyEngine:
+    """
+    Engine that never finishes a search, so every answer is the book's.
+    """
+
+    live = True
+
+    def __init__(self, book):
+        self.book = book
+
+    def analyse(self, board):
+        return self.book.lookup(board)
+
+
+def test_state_reports_book_moves(book_path):
+    book = OpeningBook(book_path)
+    server = make_http_server("127.0.0.1", 0, SandboxState(), BookOnlyEngine(book))
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = HTTPConnection(host, port, timeout=5)
+        conn.request("GET", "/state")
+        analysis = json.loads(conn.getresponse().read())["analysis"]
+        assert analysis["book"] is True
+        assert analysis["lines"][0] == {"move": "e2e4", "eval": 0.0, "weight": 0.5}
+
+        conn.request("GET", "/state?format=bin")
+        body = conn.getresponse().read()
+        assert body[1] & wire.BOOK
+    finally:
+        server.shutdown()
+        server.server_close()
+        book.close()
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from server.single_flight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, n):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do(key, fn)))
+        for _ in range(n)
+    ]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return "result"
+
+    threads, results = run_concurrently(flight, "k", fn, 1)
+    assert started.wait(timeout=2)
+    more, more_results = run_concurrently(flight, "k", fn, 4)
+    while flight.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for t in threads + more:
+        t.join(timeout=5)
+
+    assert len(calls) == 1
+    assert results + more_results == ["result"] * 5
+    assert flight.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_different_keys_and_later_calls_run_separately():
+    flight = SingleFlight()
+
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.do("a", lambda: 3) == 3
+    assert flight.stats() == {"calls": 3, "coalesced": 0, "in_flight": 0}
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def fn():
+        started.set()
+        release.wait(timeout=5)
+        raise RuntimeError("engine died")
+
+    def call():
+        try:
+            flight.do("k", fn)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert started.wait(timeout=2)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    while flight.stats()["coalesced"] < 1:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert errors == ["engine died", "engine died"]
+    # the failed flight is gone; the next call runs again
+    assert flight.do("k", lambda: "ok") == "ok"
+
+
+def test_leader_sees_its_own_exception():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: int("x"))
+    assert flight.stats()["in_flight"] == 0
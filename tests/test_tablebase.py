@@ -0,0 +1,143 @@
+import threading
+
+import chess
+import chess.syzygy
+import pytest
+
+from server.analysis import StockfishAnalysisEngine
+from server.pool import EnginePool
+from server import tablebase as tb
+from server.tablebase import EndgameTablebase
+
+# white: Kb6 Qa1, black: Kb8; Qh8 mates
+KQK = "1k6/8/1K6/8/8/8/8/Q7 w - - 0 1"
+
+
+class FakeTables:
+    """
+    Stand-in for chess.syzygy.Tablebase with only KQvK and KvK: the queen
+    side wins unless the queen hangs, DTZ is the king distance; anything
+    else is missing.
+    """
+
+    def __init__(self, dtz=True):
+        self.wdl = {"KQvK": None, "KvK": None}
+        self.dtz = dict(self.wdl) if dtz else {}
+        self.probed = 0
+
+    def add_directory(self, path):
+        return 0
+
+    def close(self):
+        pass
+
+    def _wdl(self, board):
+        queens = board.pieces(chess.QUEEN, chess.WHITE)
+        if board.occupied != board.kings | int(queens) or len(queens) > 1:
+            raise chess.syzygy.MissingTableError("no table")
+        self.probed += 1
+        if not queens or board.is_stalemate():
+            return 0
+        if board.turn == chess.BLACK and board.is_attacked_by(chess.BLACK, queens.pop()):
+            return 0
+        return 2 if board.turn == chess.WHITE else -2
+
+    def probe_wdl(self, board):
+        return self._wdl(board)
+
+    def probe_dtz(self, board):
+        if not self.dtz:
+            raise chess.syzygy.MissingTableError("no dtz")
+        wdl = self._wdl(board)
+        kings = chess.square_distance(board.king(chess.WHITE), board.king(chess.BLACK))
+        return 0 if wdl == 0 else (kings + 1) * (1 if wdl > 0 else -1)
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    fake = FakeTables()
+    monkeypatch.setattr(chess.syzygy, "open_tablebase", lambda path, **kw: fake)
+    return fake
+
+
+def test_moves_are_ranked_by_wdl_and_dtz(tables):
+    table = EndgameTablebase("/syzygy", max_lines=40)
+    result = table.lookup(chess.Board(KQK))
+
+    assert result.tablebase and not result.pending
+    evals = {l.move: l.eval for l in result.lines}
+    assert result.lines[0].move == "a1h8"
+    assert evals["a1h8"] == tb.MATE
+    # the queen is lost to Kxa8: a draw
+    assert evals["a1a8"] == 0.0
+    # winning moves: TB_WIN less the remaining DTZ
+    assert tb.TB_WIN - 1 < evals["a1a2"] < tb.TB_WIN
+    assert [l.eval for l in result.lines] == sorted(evals.values(), reverse=True)
+
+
+def test_evals_are_from_whites_point_of_view(tables):
+    table = EndgameTablebase("/syzygy")
+    board = chess.Board(KQK)
+    board.push_uci("a1a2")
+
+    # black to move and lost: still positive for white
+    result = table.lookup(board)
+    assert all(l.eval > 80 for l in result.lines)
+
+
+def test_wdl_only_tables_still_answer(monkeypatch):
+    monkeypatch.setattr(chess.syzygy, "open_tablebase", lambda path, **kw: FakeTables(dtz=False))
+    result = EndgameTablebase("/syzygy", max_lines=40).lookup(chess.Board(KQK))
+    assert {l.move: l.eval for l in result.lines}["a1a2"] == tb.TB_WIN
+
+
+def test_uncovered_positions_are_not_probed(tables):
+    table = EndgameTablebase("/syzygy")
+    assert table.max_pieces == 3
+
+    assert table.lookup(chess.Board()) is None
+    assert table.lookup(chess.Board("4k3/8/8/8/8/8/8/4K2R w K - 0 1")) is None
+    assert tables.probed == 0
+    # 3 pieces, but a table is missing
+    assert table.lookup(chess.Board("4k3/8/8/8/8/8/8/4K2R w - - 0 1")) is None
+
+
+def test_results_are_cached(tables):
+    table = EndgameTablebase("/syzygy")
+    first = table.lookup(chess.Board(KQK))
+    probed = tables.probed
+
+    assert table.lookup(chess.Board(KQK)) is first
+    assert tables.probed == probed
+    stats = table.stats()
+    assert stats["hits"] == 2 and stats["cached"] == 1
+
+
+def test_pool_does_not_search_tablebase_positions(fake_uci, tables):
+    pool = EnginePool(fake_uci, size=1, tablebase=EndgameTablebase("/syzygy"))
+    try:
+        board = chess.Board(KQK)
+        assert pool.analyse(board).tablebase
+        pool.submit(board)
+        stats = pool.stats()
+        assert stats["pool"]["tasks"] == 0
+        assert stats["tablebase"]["hits"] == 2
+    finally:
+        pool.stop()
+
+
+def test_engine_worker_idles_on_tablebase_positions(fake_uci, tables):
+    engine = StockfishAnalysisEngine(
+        fake_uci, base_time=0.05, interval=0.01, tablebase=EndgameTablebase("/syzygy")
+    )
+    published = threading.Event()
+    engine.add_listener(published.set)
+    try:
+        assert engine.analyse(chess.Board(KQK)).tablebase
+        assert not published.wait(timeout=0.3)
+
+        # leaving the tablebase wakes the worker again
+        engine.analyse(chess.Board())
+        assert published.wait(timeout=5)
+    finally:
+        engine.stop()
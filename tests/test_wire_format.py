@@ -0,0 +1,227 @@
+import importlib.util
+import json
+import threading
+from http.client import HTTPConnection
+from pathlib import Path
+
+import chess
+import pytest
+
+from server.analysis import AnalysisLine, AnalysisResult, StubAnalysisEngine
+from server.chess_state import SandboxState
+from server.http_server import make_http_server
+from server.move_index import MoveIndex
+from server import wire
+from conftest import wait_for
+
+# pico/protocol.py, loaded by path (the repo root also has a protocol/ dir)
+_spec = importlib.util.spec_from_file_location(
+    "pico_protocol", Path(__file__).resolve().parents[1] / "pico" / "protocol.py"
+)
+protocol = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(protocol)
+
+
+@pytest.fixture
+def http_server():
+    state = SandboxState()
+    server = make_http_server("127.0.0.1", 0, state, StubAnalysisEngine())
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield host, port, state
+
+    server.shutdown()
+    server.server_close()
+
+
+def decode_state(body, **kwargs):
+    out = protocol.BinaryState(**kwargs)
+    out.buf[: len(body)] = body
+    return out.decode(len(body))
+
+
+def test_move_packing_round_trips():
+    for uci in ("e2e4", "a7a8q", "h2h1n", "e1g1", "b7c8r"):
+        move = chess.Move.from_uci(uci)
+        packed = wire.pack_move(move)
+        assert packed < 0x10000
+        assert wire.unpack_move(packed) == move
+        assert protocol.move_uci(packed) == uci
+    assert protocol.move_uci(wire.NO_MOVE) is None
+
+
+def test_state_decodes_into_preallocated_buffers():
+    board = chess.Board()
+    board.push_uci("e2e4")
+    analysis = AnalysisResult(
+        depth=300,
+        lines=[AnalysisLine("e7e5", -0.25), AnalysisLine("c7c5", 100.0), AnalysisLine("g8f6", -400.0)],
+        pending=True,
+    )
+    body = wire.encode_state(70000, board, analysis)
+    assert len(body) == 12 + 3 * 4
+
+    out = decode_state(body, max_lines=2)
+    line_moves = out.line_moves
+    assert out.kind == wire.KIND_STATE
+    assert out.version == 70000
+    assert out.move_number == 1
+    assert out.black_to_move()
+    assert out.flags & protocol.PENDING
+    assert not out.flags & protocol.STALE
+    assert protocol.move_uci(out.last_move) == "e2e4"
+    assert out.depth == 255  # clamped
+    # only as many lines as were preallocated
+    assert out.n_lines == 2
+    assert out.line_moves is line_moves
+    assert [protocol.move_uci(m) for m in out.line_moves] == ["e7e5", "c7c5"]
+    assert list(out.line_evals) == [-25, 10000]
+
+
+def test_eval_is_clamped_to_int16():
+    assert wire.eval_cp(400.0) == 32767
+    assert wire.eval_cp(-400.0) == -32767
+    assert wire.eval_cp(0.314) == 31
+
+
+def test_snapshot_tree_matches_move_index():
+    board = chess.Board("1n6/P7/8/8/8/8/8/k6K w - - 0 1")
+    index = MoveIndex.build(board)
+    body = wire.encode_snapshot(3, board, AnalysisResult(depth=0, lines=[]), index)
+
+    out = decode_state(body)
+    assert out.kind == wire.KIND_SNAPSHOT
+    assert out.n_from == len(index.squares)
+
+    targets = bytearray(64)
+    for from_sq in index.squares:
+        n = out.targets_into(chess.parse_square(from_sq), targets)
+        names = [protocol.SQUARES[t & 0x3F] for t in targets[:n]]
+        promotes = [protocol.SQUARES[t & 0x3F] for t in targets[:n] if t & protocol.PROMOTES]
+        assert names == index.moves_from(from_sq)
+        assert promotes == index.promotions_from(from_sq)
+    assert out.targets_into(chess.E4, targets) == 0
+
+
+def test_binary_is_negotiated_per_request(http_server):
+    host, port, state = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+
+    conn.request("GET", "/state", headers={"Accept": wire.CONTENT_TYPE})
+    resp = conn.getresponse()
+    body = resp.read()
+    assert resp.getheader("Content-Type") == wire.CONTENT_TYPE
+    assert resp.getheader("ETag") == f'"b{state.version}"'
+    assert body[0] == wire.KIND_STATE
+
+    conn.request("GET", "/state?format=bin")
+    assert conn.getresponse().read() == body
+
+    conn.request("GET", "/state")
+    resp = conn.getresponse()
+    assert resp.getheader("Content-Type") == "application/json"
+    json_body = resp.read()
+    assert len(body) < len(json_body) / 4
+    assert json.loads(json_body)["version"] == state.version
+
+
+def test_pico_client_reads_binary_endpoints(http_server):
+    host, port, state = http_server
+    state.play("e2e4")
+    client = protocol.ServerClient(host, port)
+
+    out = protocol.BinaryState()
+    assert client.get_state_bin(out) is out
+    assert out.version == state.version
+    assert protocol.move_uci(out.last_move) == "e2e4"
+    assert out.n_lines == 3
+    # unchanged: 304, buffers untouched
+    assert client.get_state_bin(out) is None
+    assert out.version == state.version
+
+    client.state_path = "/snapshot"
+    client.etag = None
+    assert client.get_state_bin(out).kind == protocol.KIND_SNAPSHOT
+    targets = bytearray(64)
+    n = out.targets_into(chess.G8, targets)
+    assert [protocol.SQUARES[t] for t in targets[:n]] == ["f6", "h6"]
+
+    squares = protocol.BinarySquares()
+    assert client.piece_list_bin(squares).kind == protocol.KIND_PIECE_LIST
+    assert squares.n == len(state.move_index().squares)
+
+    assert client.move_list_bin("b8", squares).from_sq == chess.B8
+    assert [protocol.SQUARES[s] for s in squares.squares[: squares.n]] == ["a6", "c6"]
+    client.conn.close()
+
+
+def test_pico_client_polls_and_runs_commands_in_binary(http_server):
+    host, port, state = http_server
+    client = protocol.ServerClient(host, port, snapshot=True)
+    out = protocol.BinaryState()
+
+    # first arm answers at once (version -1), the next parks
+    assert client.poll_watch_bin(out) is None
+    assert wait_for(lambda: client.poll_watch_bin(out) is out)
+    assert out.version == state.version and out.kind == protocol.KIND_SNAPSHOT
+    assert client.poll_watch_bin(out) is None
+
+    paths = []
+    request = client.conn.request
+    client.conn.request = lambda method, path, *a, **kw: (
+        paths.append(path) or request(method, path, *a, **kw)
+    )
+    assert client.run_bin({"type": "play_move", "move": "e2e4"}, out) is out
+    assert paths == ["/batch"]  # command and new state in one round trip
+    assert out.kind == protocol.KIND_SNAPSHOT
+    assert protocol.move_uci(out.last_move) == "e2e4" and out.black_to_move()
+
+    # local menus from the binary snapshot match the JSON ones
+    json_client = protocol.ServerClient(host, port, snapshot=True)
+    json_client.get_state()
+    assert out.from_squares() == json_client.local_pieces()
+    for sq in json_client.local_pieces():
+        assert out.moves_from(sq) == json_client.local_moves(sq)
+
+    state.play("e7e5")
+    assert wait_for(
+        lambda: client.poll_watch_bin(out) and protocol.move_uci(out.last_move) == "e7e5"
+    )
+
+    for c in (client, json_client):
+        c.conn.close()
+        c.watch.close()
+
+
+def test_binary_batch_answers_with_its_final_state(http_server):
+    host, port, state = http_server
+    conn = HTTPConnection(host, port, timeout=5)
+    commands = [{"type": "play_move", "move": "e2e4"}, {"type": "snapshot"}]
+    conn.request(
+        "POST", "/batch", body=json.dumps({"commands": commands}),
+        headers={"Accept": wire.CONTENT_TYPE},
+    )
+    resp = conn.getresponse()
+    assert resp.getheader("Content-Type") == wire.CONTENT_TYPE
+    out = decode_state(resp.read())
+    assert out.kind == protocol.KIND_SNAPSHOT and out.version == state.version
+    assert protocol.move_uci(out.last_move) == "e2e4"
+
+    # without a final state or snapshot the batch stays JSON
+    conn.request(
+        "POST", "/batch", body=json.dumps({"commands": [{"type": "undo"}]}),
+        headers={"Accept": wire.CONTENT_TYPE},
+    )
+    resp = conn.getresponse()
+    assert json.loads(resp.read())["results"] == [{"type": "move_result", "ok": True}]
+    conn.close()
+
+
+def test_binary_snapshot_lists_promotions():
+    board = chess.Board("8/P6k/8/8/8/8/8/K7 w - - 0 1")
+    body = wire.encode_snapshot(3, board, AnalysisResult(depth=0, lines=[]), MoveIndex.build(board))
+    out = decode_state(body)
+    to, promo = out.moves_from("a7")
+    assert to == ["a8"] and promo == ["a8"]
+    assert "a7" in out.from_squares()